@@ -0,0 +1,304 @@
+# backend/advice_engine.py
+"""
+基于账户数据的投资建议
+
+- 风险画像：近 12 个月的月度收支（NumPy bincount 聚合）算出现金流波动、余额可支撑月数，
+  加上用户各账户的持仓分布，映射到 保守型 / 稳健型 / 平衡型 / 进取型
+- 产品表：启动时从 rag/knowledge_base/banking_products.md 解析一次，
+  每个风险等级对应的配置权重预先算成矩阵，生成配置只需一次向量乘法
+- 画像按账户缓存；记账引擎提交新流水后按用户失效，其他 worker 的写入最多延迟 TTL 可见
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+from ledger_rollups import INTERNAL_CATEGORIES
+from ledger_store import LedgerStore, ledger_store, from_minor
+from posting_engine import posting_engine
+
+PROFILE_CACHE_SIZE = int(os.getenv('ADVICE_CACHE_SIZE', 10000))
+PROFILE_CACHE_TTL_SECONDS = float(os.getenv('ADVICE_CACHE_TTL', 300))
+LOOKBACK_MONTHS = 12
+MIN_HISTORY_MONTHS = 3
+# 预留的应急资金：月均支出的倍数
+RESERVE_MONTHS = 6
+# 现金流波动系数阈值
+HIGH_VOLATILITY = 0.5
+LOW_VOLATILITY = 0.1
+INVESTMENT_ACCOUNT_TYPE = '理财账户'
+
+PRODUCTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rag', 'knowledge_base',
+                             'banking_products.md')
+
+RISK_TIERS = ['保守型', '稳健型', '平衡型', '进取型']
+# 各风险等级在 存款/货币类、债券类、权益类 之间的比例
+TIER_CLASS_MIX = np.array([
+    [0.80, 0.20, 0.00],
+    [0.60, 0.30, 0.10],
+    [0.40, 0.35, 0.25],
+    [0.20, 0.30, 0.50],
+])
+
+# 知识库中的产品名 -> (中文名, 资产类别, 可随时支取, 适合一次性投入)
+PRODUCT_ATTRIBUTES = {
+    'Demand Deposit': ('活期存款', 0, True, True),
+    'Time Deposit (Lump-Sum Deposit and Withdrawal)': ('整存整取定期存款', 0, False, True),
+    'Installment Savings Deposit': ('零存整取', 0, False, False),
+    'Money Market Fund': ('货币基金', 0, True, True),
+    'Bond Fund': ('债券基金', 1, False, True),
+    'Equity Fund': ('股票基金', 2, False, True),
+}
+
+_PRODUCT_LINE = re.compile(r'^- \*\*(.+?)\*\*:\s*(.+)$', re.M)
+_PERCENT = re.compile(r'(\d+(?:\.\d+)?)%')
+
+
+class ProductTable:
+    """知识库产品的收益区间与各风险等级的预计算配置权重"""
+
+    def __init__(self, path: str = PRODUCTS_PATH):
+        self.names: List[str] = []
+        low, high, classes, liquid, lump_sum = [], [], [], [], []
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except OSError as e:
+            print(f"⚠️ 产品知识库读取失败，投资建议不含具体产品: {e}")
+            text = ''
+        for name, description in _PRODUCT_LINE.findall(text):
+            if name not in PRODUCT_ATTRIBUTES or PRODUCT_ATTRIBUTES[name][0] in self.names:
+                continue
+            rates = [float(r) for r in _PERCENT.findall(description)]
+            if not rates:
+                continue
+            zh_name, asset_class, is_liquid, is_lump_sum = PRODUCT_ATTRIBUTES[name]
+            self.names.append(zh_name)
+            low.append(min(rates))
+            high.append(max(rates))
+            classes.append(asset_class)
+            liquid.append(is_liquid)
+            lump_sum.append(is_lump_sum)
+
+        self.low = np.array(low)
+        self.high = np.array(high)
+        self.mid = (self.low + self.high) / 2
+        classes = np.array(classes, dtype=int)
+        liquid = np.array(liquid, dtype=bool)
+        lump_sum = np.array(lump_sum, dtype=bool)
+        self.installment = [name for name, ok in zip(self.names, lump_sum) if not ok]
+
+        # 应急资金全部放收益最高的可随时支取产品
+        self.reserve_weights = np.zeros(len(self.names))
+        if liquid.any():
+            self.reserve_weights[np.flatnonzero(liquid)[np.argmax(self.mid[liquid])]] = 1.0
+
+        # 其余资金：同一类别内按收益中值分配（可随时支取的产品只放应急资金）；
+        # 知识库缺少的类别并入应急资金产品
+        in_class = np.zeros((TIER_CLASS_MIX.shape[1], len(self.names)))
+        for asset_class in range(in_class.shape[0]):
+            members = (classes == asset_class) & lump_sum & ~liquid
+            if members.any():
+                in_class[asset_class, members] = self.mid[members] / self.mid[members].sum()
+        weights = (TIER_CLASS_MIX * in_class.any(axis=1)) @ in_class
+        self.tier_weights = weights + (1 - weights.sum(axis=1))[:, None] * self.reserve_weights
+
+    def allocate(self, tier: int, reserve_minor: int, investable_minor: int) -> np.ndarray:
+        """各产品的配置金额（分）"""
+        return reserve_minor * self.reserve_weights + investable_minor * self.tier_weights[tier]
+
+
+class AdviceEngine:
+
+    def __init__(self, ledger: Optional[LedgerStore] = None, products: Optional[ProductTable] = None):
+        self.ledger = ledger or ledger_store
+        self.products = products or ProductTable()
+        self._cache: "OrderedDict[int, tuple]" = OrderedDict()
+        self._generations: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    # ---------- 缓存 ----------
+
+    def invalidate(self, user_ids: Set[int]):
+        """这些用户有新流水（注册为记账引擎的回调）：只递增版本号，旧画像在读取时判定过期"""
+        with self._lock:
+            for user_id in user_ids:
+                self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            self.stats["invalidations"] += len(user_ids)
+
+    def _cache_get(self, account_id: int, user_id: int) -> Optional[Dict]:
+        with self._lock:
+            entry = self._cache.get(account_id)
+            if entry is None:
+                return None
+            expires_at, generation, value = entry
+            if expires_at <= time.monotonic() or generation != self._generations.get(user_id, 0):
+                del self._cache[account_id]
+                return None
+            self._cache.move_to_end(account_id)
+            return value
+
+    def _cache_put(self, account_id: int, user_id: int, generation: int, entry: Dict):
+        with self._lock:
+            # 计算期间有新流水提交：结果可能已过期，不缓存
+            if self._generations.get(user_id, 0) != generation:
+                return
+            self._cache[account_id] = (time.monotonic() + PROFILE_CACHE_TTL_SECONDS, generation, entry)
+            self._cache.move_to_end(account_id)
+            while len(self._cache) > PROFILE_CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    # ---------- 画像 ----------
+
+    def get(self, account_id: int, user_id: int, today: Optional[date] = None) -> Dict:
+        """
+        账户的风险画像与产品配置（缓存）
+
+        Returns:
+            {"profile": 精简画像（金额单位：元）, "advice": 已生成的建议文字或 None}；
+            调用方生成建议后写回 entry["advice"]，随画像一起失效
+        """
+        entry = self._cache_get(account_id, user_id)
+        if entry is not None:
+            self.stats["hits"] += 1
+            return entry
+        self.stats["misses"] += 1
+        with self._lock:
+            generation = self._generations.get(user_id, 0)
+        entry = {"profile": self.compute(account_id, user_id, today), "advice": None}
+        self._cache_put(account_id, user_id, generation, entry)
+        return entry
+
+    def _load(self, account_id: int, user_id: int, since: str):
+        with self.ledger.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            accounts = cursor.execute(
+                'SELECT id, type, balance_minor FROM accounts WHERE user_id = ?', (user_id,)
+            ).fetchall()
+            rows = cursor.execute(
+                'SELECT date, amount_minor FROM transactions WHERE account_id = ? AND date >= ? '
+                f"AND COALESCE(category, '') NOT IN ({','.join('?' * len(INTERNAL_CATEGORIES))})",
+                (account_id, since, *INTERNAL_CATEGORIES)
+            ).fetchall()
+        return accounts, rows
+
+    def compute(self, account_id: int, user_id: int, today: Optional[date] = None) -> Dict:
+        today = np.datetime64(today or date.today(), 'M')
+        # 最近 12 个完整月（不含本月）
+        start = today - LOOKBACK_MONTHS
+        accounts, rows = self._load(account_id, user_id, str(start) + '-01')
+
+        balances = {row[0]: row[2] for row in accounts}
+        balance = max(balances.get(account_id, 0), 0)
+        holdings: Dict[str, int] = {}
+        for _, account_type, amount in accounts:
+            holdings[account_type] = holdings.get(account_type, 0) + max(amount, 0)
+        total = sum(holdings.values())
+
+        if rows:
+            dates, amounts = zip(*rows)
+            months = (np.array(dates, dtype='datetime64[D]').astype('datetime64[M]') - start).astype(int)
+            amounts = np.array(amounts, dtype=np.int64)
+        else:
+            months, amounts = np.zeros(0, dtype=int), np.zeros(0, dtype=np.int64)
+        past = months < LOOKBACK_MONTHS
+        months, amounts = months[past], amounts[past]
+        income = np.bincount(months, weights=np.clip(amounts, 0, None), minlength=LOOKBACK_MONTHS)
+        expense = np.bincount(months, weights=np.clip(-amounts, 0, None), minlength=LOOKBACK_MONTHS)
+        # 只统计第一笔流水之后的月份
+        active = slice(int(months.min()), LOOKBACK_MONTHS) if len(months) else slice(LOOKBACK_MONTHS, None)
+        income, expense = income[active], expense[active]
+        history_months = len(income)
+
+        avg_income = float(income.mean()) if history_months else 0.0
+        avg_expense = float(expense.mean()) if history_months else 0.0
+        # 月度净现金流的标准差 / 月均收支总额
+        gross = avg_income + avg_expense
+        volatility = (float((income - expense).std() / gross)
+                      if history_months >= MIN_HISTORY_MONTHS and gross else None)
+        runway = balance / avg_expense if avg_expense else None
+        investment_share = holdings.get(INVESTMENT_ACCOUNT_TYPE, 0) / total if total else 0.0
+
+        tier = self._tier(history_months, runway, volatility)
+        reserve = int(min(balance, RESERVE_MONTHS * avg_expense))
+        allocation = self.products.allocate(tier, reserve, balance - reserve)
+        expected_return = float(allocation @ self.products.mid) / 100
+
+        return {
+            "risk_tier": RISK_TIERS[tier],
+            "history_months": history_months,
+            "balance": from_minor(balance),
+            "avg_monthly_income": from_minor(round(avg_income)),
+            "avg_monthly_expense": from_minor(round(avg_expense)),
+            "avg_monthly_surplus": from_minor(round(avg_income - avg_expense)),
+            "cash_flow_volatility": round(volatility, 2) if volatility is not None else None,
+            "runway_months": round(runway, 1) if runway is not None else None,
+            "holdings": {name: round(amount / total, 3) for name, amount in holdings.items()} if total else {},
+            "investment_share": round(investment_share, 3),
+            "reserve": from_minor(reserve),
+            "allocation": [
+                {"product": name, "amount": from_minor(round(amount)), "rate": f"{low:g}%–{high:g}%"}
+                for name, amount, low, high in zip(self.products.names, allocation, self.products.low,
+                                                   self.products.high)
+                if amount >= 1
+            ],
+            "expected_annual_return": from_minor(round(expected_return)),
+            "installment_products": self.products.installment if avg_income > avg_expense else [],
+        }
+
+    @staticmethod
+    def _tier(history_months: int, runway: Optional[float], volatility: Optional[float]) -> int:
+        """余额可支撑月数越短、现金流波动越大，风险等级越低"""
+        if history_months < MIN_HISTORY_MONTHS:
+            return 1
+        tier = 2
+        if runway is not None:
+            if runway < 3:
+                return 0
+            if runway < RESERVE_MONTHS:
+                tier = 1
+        if volatility is not None:
+            if volatility > HIGH_VOLATILITY:
+                tier -= 1
+            elif volatility < LOW_VOLATILITY and (runway is None or runway >= 2 * RESERVE_MONTHS):
+                tier += 1
+        return min(max(tier, 0), len(RISK_TIERS) - 1)
+
+
+def format_advice(account_number: str, profile: Dict) -> str:
+    """大模型不可用时的模板建议"""
+    lines = [f"基于您的账户 {account_number} 近 {profile['history_months']} 个月的收支数据：", ""]
+    lines.append(f"1. **风险画像**：{profile['risk_tier']}")
+    if profile["runway_months"] is not None:
+        lines.append(f"   - 月均支出 {profile['avg_monthly_expense']:.2f} 元，当前余额可支撑约 {profile['runway_months']} 个月")
+    if profile["cash_flow_volatility"] is not None:
+        lines.append(f"   - 月度现金流波动系数 {profile['cash_flow_volatility']}")
+    if profile["holdings"]:
+        mix = '，'.join(f"{name} {share:.0%}" for name, share in profile["holdings"].items())
+        lines.append(f"   - 资产分布：{mix}")
+    lines.append("")
+    lines.append(f"2. **应急资金**：建议保留 {profile['reserve']:.2f} 元（约 {RESERVE_MONTHS} 个月支出）在可随时支取的产品中")
+    if profile["allocation"]:
+        lines.append("")
+        lines.append("3. **配置建议**：")
+        for item in profile["allocation"]:
+            lines.append(f"   - {item['product']}：{item['amount']:.2f} 元（年化 {item['rate']}）")
+        lines.append(f"   预计年收益约 {profile['expected_annual_return']:.2f} 元")
+    if profile["installment_products"]:
+        lines.append("")
+        lines.append(f"4. **储蓄计划**：每月结余约 {profile['avg_monthly_surplus']:.2f} 元，"
+                     f"可考虑{'、'.join(profile['installment_products'])}")
+    lines.append("")
+    lines.append("以上收益为历史区间，不代表未来表现；如需更详细的投资建议，请联系我们的理财顾问。")
+    return "\n".join(lines)
+
+
+advice_engine = AdviceEngine()
+posting_engine.add_listener(advice_engine.invalidate)
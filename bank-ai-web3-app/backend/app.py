@@ -4,7 +4,6 @@ import datetime
 import jwt
 import os
 import sys
-from functools import wraps
 import random
 from dotenv import load_dotenv
 
@@ -28,7 +27,7 @@ CORS(app,
      origins=CORS_ORIGINS,
      supports_credentials=True,
      methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
-     allow_headers=['Content-Type', 'Authorization'])
+     allow_headers=['Content-Type', 'Authorization', 'Idempotency-Key'])
 
 
 try:
@@ -37,16 +36,44 @@ try:
         sys.path.insert(0, current_dir)
     
 
-    from routes.auth_routes import auth_bp
+    from routes.auth_routes import auth_bp, token_bp
     from routes.ai_routes import ai_bp
+    from routes.chatbot_routes import chatbot_bp
+    from routes.ledger_routes import ledger_bp
+    from routes.dashboard_routes import dashboard_bp
+    from routes.rates_routes import rates_bp
+    from upload_guard import GuardedRequest, MAX_CONTENT_LENGTH
+    
+    # 媒体上传：按接口限制大小的流式 multipart 解析
+    app.request_class = GuardedRequest
+    app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
     
   
     app.register_blueprint(auth_bp)
+    app.register_blueprint(token_bp)
     app.register_blueprint(ai_bp)
+    app.register_blueprint(chatbot_bp)
+    app.register_blueprint(ledger_bp)
+    app.register_blueprint(dashboard_bp)
+    app.register_blueprint(rates_bp)
     
     print("✅ 成功导入并注册蓝图路由")
     print(f"   - 认证路由: /api/auth/*")
     print(f"   - AI路由: /api/ai/*")
+    print(f"   - 聊天会话: /api/chatbot/*")
+    print(f"   - 账户流水: /api/accounts, /api/transactions")
+    print(f"   - 对账单导入: /api/accounts/<id>/import（进度 /api/imports/<job_id>）")
+    print(f"   - 记账: /api/transfers, /api/transactions/deposit, /api/transactions/withdraw")
+    print(f"   - 仪表盘: /api/dashboard/*")
+    print(f"   - 汇率: /api/rates, /api/rates/convert")
+    
+    # 流式语音识别需要 flask-sock（WebSocket），未安装时跳过
+    try:
+        from routes.voice_stream_routes import voice_stream_bp
+        app.register_blueprint(voice_stream_bp)
+        print(f"   - 流式语音: ws /api/ai/chat/voice/stream")
+    except ImportError as e:
+        print(f"⚠️ 流式语音接口不可用: {e}")
     
 except ImportError as e:
     print(f"⚠️ 蓝图导入失败: {e}")
@@ -80,38 +107,14 @@ except ImportError as e:
     ]
     
 
-    def token_required(f):
-        """JWT Token"""
-        @wraps(f)
-        def decorated(*args, **kwargs):
-            token = None
-        
-            auth_header = request.headers.get('Authorization')
-            if auth_header and auth_header.startswith('Bearer '):
-                token = auth_header.split(' ')[1]
-    
-            if not token:
-                return jsonify({"success": False, "error": "Token缺失"}), 401
+    # username -> 用户，登录时 O(1) 查找
+    users_by_username = {u["username"]: u for u in users.values()}
     
-            try:
-           
-                payload = jwt.decode(
-                    token,
-                    app.config['SECRET_KEY'],
-                    algorithms=["HS256"]
-                )
-                current_user = next((u for u in users.values() if u["id"] == payload["user_id"]), None)
-                if not current_user:
-                    return jsonify({"success": False, "error": "Token无效：用户不存在"}), 401
-            except jwt.ExpiredSignatureError:
-                return jsonify({"success": False, "error": "Token已过期"}), 401
-            except jwt.InvalidTokenError:
-                return jsonify({"success": False, "error": "Token无效"}), 401
-    
-      
-            g.current_user = current_user
-            return f(*args, **kwargs)
-        return decorated
+    # JWT Token：声明缓存 + 按 id 查找用户
+    from auth_middleware import AuthMiddleware
+    from credential_service import credential_service, CredentialBusy
+    auth = AuthMiddleware(app.config['SECRET_KEY'], users.get)
+    token_required = auth.token_required
     
   
     @app.route('/api/health', methods=['GET'])
@@ -133,9 +136,21 @@ except ImportError as e:
             if not username or not password:
                 return jsonify({"success": False, "error": "用户名/密码不能为空"}), 400
     
-            current_user = next((u for u in users.values() if u["username"] == username and u["password"] == password), None)
-            if not current_user:
+            current_user = users_by_username.get(username)
+    
+            # 旧的明文记录校验通过后替换为 bcrypt 哈希；用户不存在时同样做一次校验，避免通过耗时判断用户名
+            try:
+                if current_user:
+                    valid, upgraded_hash = credential_service.verify(password, current_user.get("password_hash") or current_user.get("password"))
+                else:
+                    valid, upgraded_hash = credential_service.reject(password)
+            except CredentialBusy:
+                return jsonify({"success": False, "error": "登录请求过多，请稍后再试"}), 503
+            if not valid:
                 return jsonify({"success": False, "error": "用户名或密码错误"}), 401
+            if upgraded_hash:
+                current_user.pop("password", None)
+                current_user["password_hash"] = upgraded_hash
     
             # JWT Token
             token = jwt.encode({
@@ -181,7 +196,7 @@ except ImportError as e:
                 return jsonify({"success": False, "error": "用户名/密码/邮箱不能为空"}), 400
     
 
-            if any(u["username"] == username for u in users.values()):
+            if username in users_by_username:
                 return jsonify({"success": False, "error": "用户名已存在"}), 409
     
 
@@ -189,13 +204,14 @@ except ImportError as e:
             new_user = {
                 "id": new_user_id,
                 "username": username,
-                "password": password,  # 生产环境需加密
+                "password_hash": credential_service.hash_password(password),
                 "email": email,
                 "full_name": full_name or username,
                 "role": "user",
                 "balance": 0.00
             }
             users[new_user_id] = new_user
+            users_by_username[username] = new_user
     
 
             new_account = {
@@ -218,7 +234,7 @@ except ImportError as e:
                 "success": True,
                 "msg": "注册成功",
                 "token": token,
-                "user": new_user
+                "user": {k: v for k, v in new_user.items() if k != "password_hash"}
             }), 201
         except Exception as e:
             print(f"注册接口异常：{str(e)}")  # 调试日志
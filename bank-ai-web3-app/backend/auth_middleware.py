@@ -0,0 +1,148 @@
+# backend/auth_middleware.py
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Dict, Optional, Tuple
+
+import jwt
+from flask import g, jsonify, request
+
+# 已验证 token 的缓存条数上限
+TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 10000))
+
+
+class TokenCache:
+    """已验证 JWT 的声明缓存（LRU），键为 token 摘要，条目在 exp 到期后失效"""
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, key: bytes) -> Optional[Dict]:
+        with self._lock:
+            claims = self._entries.get(key)
+            if claims is None:
+                self.misses += 1
+                return None
+            if claims.get('exp', 0) <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return claims
+
+    def put(self, key: bytes, claims: Dict):
+        with self._lock:
+            self._entries[key] = claims
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+class AuthMiddleware:
+    """
+    JWT 鉴权
+
+    - 签名只在首次出现时校验，之后直接命中声明缓存直到过期
+    - 可选的吊销检查（is_revoked）在内存中完成
+    - 用户通过 user_lookup（按 id 的 O(1) 索引）查找
+    """
+
+    def __init__(self, secret: str, user_lookup: Callable[[int], Optional[Dict]],
+                 algorithms=("HS256",), cache_size: int = TOKEN_CACHE_SIZE,
+                 is_revoked: Optional[Callable[[Dict], bool]] = None):
+        self.secret = secret
+        self.user_lookup = user_lookup
+        self.is_revoked = is_revoked
+        self.algorithms = list(algorithms)
+        self.cache = TokenCache(cache_size)
+
+    def verify(self, token: str) -> Dict:
+        """返回 token 声明；签名无效或已过期时抛出 jwt 异常"""
+        key = TokenCache.key(token)
+        claims = self.cache.get(key)
+        if claims is not None:
+            return claims
+
+        claims = jwt.decode(token, self.secret, algorithms=self.algorithms)
+        # 没有 exp 的 token 不缓存，每次都完整校验
+        if 'exp' in claims:
+            self.cache.put(key, claims)
+        return claims
+
+    @staticmethod
+    def bearer_token() -> Optional[str]:
+        auth_header = request.headers.get('Authorization', '')
+        if auth_header.startswith('Bearer '):
+            return auth_header[7:].strip() or None
+        return None
+
+    def _authenticate(self) -> Tuple[Optional[Dict], Optional[Dict], Optional[str]]:
+        """校验请求中的 Bearer 令牌，返回 (用户, 声明, 错误信息)；没有令牌时三者都为 None"""
+        token = self.bearer_token()
+        if not token:
+            return None, None, None
+
+        try:
+            claims = self.verify(token)
+        except jwt.ExpiredSignatureError:
+            return None, None, "Token已过期"
+        except jwt.InvalidTokenError:
+            return None, None, "Token无效"
+
+        # 刷新令牌不能当作访问令牌使用；已登出的令牌在内存吊销索引中
+        if claims.get('type', 'access') != 'access':
+            return None, None, "Token无效"
+        if self.is_revoked and self.is_revoked(claims):
+            return None, None, "Token已失效，请重新登录"
+
+        current_user = self.user_lookup(claims.get('user_id'))
+        if not current_user:
+            return None, None, "Token无效：用户不存在"
+        return current_user, claims, None
+
+    def token_required(self, f):
+        """受保护路由的装饰器，验证通过后当前用户保存在 g.current_user"""
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            current_user, claims, error = self._authenticate()
+            if current_user is None:
+                return jsonify({"success": False, "error": error or "Token缺失"}), 401
+
+            g.current_user = current_user
+            g.token_claims = claims
+            return f(*args, **kwargs)
+        return decorated
+
+    def token_optional(self, f):
+        """访客也可访问的路由：没有令牌时 g.current_user 为 None，带了无效令牌仍返回 401（前端据此刷新令牌）"""
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            current_user, claims, error = self._authenticate()
+            if error:
+                return jsonify({"success": False, "error": error}), 401
+
+            g.current_user = current_user
+            g.token_claims = claims
+            return f(*args, **kwargs)
+        return decorated
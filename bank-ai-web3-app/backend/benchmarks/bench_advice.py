@@ -0,0 +1,80 @@
+# backend/benchmarks/bench_advice.py
+"""
+投资建议画像基准：每次重新计算与缓存查询对比
+
+用法：
+    python benchmarks/bench_advice.py [年数] [每天笔数]
+
+生成一个账户若干年的逐日流水，测量计算风险画像（加载流水 + NumPy 聚合 + 产品配置）
+和命中缓存的耗时；再通过记账引擎存一笔款，确认画像失效并重新计算。
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from advice_engine import AdviceEngine
+from database import ConnectionPool
+from ledger_store import LedgerStore
+from posting_engine import PostingEngine
+
+REPEAT = 200
+
+
+def populate(store, years, per_day):
+    today = date.today()
+    rows = []
+    day = today - timedelta(days=365 * years)
+    while day <= today:
+        rows += [(day.isoformat(), -random.randint(2000, 20000)) for _ in range(per_day)]
+        if day.day == 5:
+            rows.append((day.isoformat(), 2500000))
+        day += timedelta(days=1)
+    with store.pool.transaction() as conn:
+        conn.execute("INSERT INTO accounts (id, user_id, account_number, type, balance_minor, created_at) "
+                     "VALUES (1, 1, 'bench', '储蓄卡', ?, '')", (sum(amount for _, amount in rows),))
+        conn.execute("INSERT INTO accounts (id, user_id, account_number, type, balance_minor, created_at) "
+                     "VALUES (2, 1, 'bench-fund', '理财账户', 5000000, '')")
+        conn.executemany(
+            "INSERT INTO transactions (account_id, user_id, date, amount_minor, type, created_at) "
+            "VALUES (1, 1, ?, ?, 'expense', 0)", rows
+        )
+        store.rollups.rebuild(conn)
+    return len(rows)
+
+
+def timed(func, repeat=REPEAT):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+if __name__ == '__main__':
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    per_day = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LedgerStore(ConnectionPool(os.path.join(tmp, 'ledger.db')))
+        count = populate(store, years, per_day)
+        engine = PostingEngine(store)
+        advice = AdviceEngine(store)
+        engine.add_listener(advice.invalidate)
+
+        compute_ms, profile = timed(lambda: advice.compute(1, 1))
+        advice.get(1, 1)
+        cached_ms, _ = timed(lambda: advice.get(1, 1))
+        print(f"{years} 年流水 {count} 条")
+        print(f"重新计算: {compute_ms:.2f} ms   缓存命中: {cached_ms * 1000:.1f} µs")
+        print(f"画像: {profile['risk_tier']}，可支撑 {profile['runway_months']} 个月，"
+              f"波动系数 {profile['cash_flow_volatility']}，配置 {[a['product'] for a in profile['allocation']]}")
+
+        before = advice.get(1, 1)["profile"]["balance"]
+        engine.deposit(1, 1, 10000)
+        after = advice.get(1, 1)["profile"]["balance"]
+        ok = after == before + 100
+        print(f"{'✅' if ok else '❌'} 存款后画像失效：余额 {before} -> {after}，统计 {advice.stats}")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,87 @@
+# backend/benchmarks/bench_auth.py
+"""
+鉴权开销基准
+
+用法：
+    python benchmarks/bench_auth.py [并发线程数...]
+
+对比旧版（每次 jwt.decode + 线性扫描用户）与 AuthMiddleware（声明缓存 + id 索引），
+分别在不同用户规模和并发线程数下测量每个请求的鉴权耗时和总吞吐。
+"""
+import datetime
+import os
+import random
+import sys
+import threading
+import time
+
+import jwt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auth_middleware import AuthMiddleware
+
+SECRET = 'bench-secret-key-for-hs256-signing-0001'
+USER_COUNTS = [1000, 10000, 100000]
+ACTIVE_SESSIONS = 1000
+REQUESTS_PER_THREAD = 5000
+
+
+def build_users(count):
+    return {i: {"id": i, "username": f"user{i}"} for i in range(1, count + 1)}
+
+
+def build_tokens(users):
+    exp = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    ids = random.sample(list(users.keys()), min(ACTIVE_SESSIONS, len(users)))
+    return [jwt.encode({"user_id": i, "username": f"user{i}", "exp": exp}, SECRET, algorithm="HS256")
+            for i in ids]
+
+
+def legacy_auth(users):
+    def authenticate(token):
+        payload = jwt.decode(token, SECRET, algorithms=["HS256"])
+        return next((u for u in users.values() if u["id"] == payload["user_id"]), None)
+    return authenticate
+
+
+def middleware_auth(users):
+    auth = AuthMiddleware(SECRET, users.get)
+
+    def authenticate(token):
+        return auth.user_lookup(auth.verify(token)["user_id"])
+    return authenticate
+
+
+def run(authenticate, tokens, threads):
+    requests = REQUESTS_PER_THREAD if threads > 1 else REQUESTS_PER_THREAD * 2
+
+    def worker():
+        rng = random.Random()
+        for _ in range(requests):
+            assert authenticate(rng.choice(tokens)) is not None
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    total = requests * threads
+    return total / elapsed, elapsed / total * threads * 1e6
+
+
+if __name__ == '__main__':
+    thread_counts = [int(n) for n in sys.argv[1:]] or [1, 4, 16]
+    print(f"{'users':>8} {'threads':>7} {'impl':<10} {'req/s':>12} {'us/req':>10}")
+    for count in USER_COUNTS:
+        users = build_users(count)
+        tokens = build_tokens(users)
+        for threads in thread_counts:
+            for name, factory in [('legacy', legacy_auth), ('middleware', middleware_auth)]:
+                # 旧版在十万用户时太慢，跳过多线程组合
+                if name == 'legacy' and count > 10000 and threads > 1:
+                    continue
+                rps, latency = run(factory(users), tokens, threads)
+                print(f"{count:>8} {threads:>7} {name:<10} {rps:>12,.0f} {latency:>10.1f}")
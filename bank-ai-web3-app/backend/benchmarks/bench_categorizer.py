@@ -0,0 +1,82 @@
+# backend/benchmarks/bench_categorizer.py
+"""
+批量交易分类基准
+
+用法：
+    python benchmarks/bench_categorizer.py [交易条数]
+
+生成一批交易描述（常见商户 + 订单号、关键词之外的说法、完全陌生的商户），
+用一个只计数的假大模型跑两轮：第一轮冷启动，第二轮走缓存，
+打印耗时、各来源占比和大模型调用次数。
+"""
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import ConnectionPool
+from transaction_categorizer import TransactionCategorizer
+
+KNOWN = ['美团外卖', '滴滴出行', '京东商城', 'STARBUCKS', '中国移动 话费', '链家 房租', '腾讯视频 会员',
+         '国家电网 电费', '乐刻健身', 'UBER *TRIP', 'AMAZON MKTP', '某某科技 工资']
+PHRASES = ['午餐', '火锅店', '打车费', '水电费 缴费', '羽毛球场地', '门诊挂号', '酒店住宿', '演唱会门票']
+SYLLABLES = '华美嘉禾鑫源盛达恒通新宏泰丰瑞祥安康明辉'
+NOVEL = [''.join(random.sample(SYLLABLES, 3)) + random.choice(['商行', '工作室', '有限公司', ''])
+         for _ in range(300)] + [f"SQ *{''.join(random.choices('ABCDEFGHKLMNPRSTUVWXYZ', k=6))}" for _ in range(200)]
+
+
+def generate(count):
+    rows = []
+    for _ in range(count):
+        roll = random.random()
+        if roll < 0.7:
+            rows.append(f"{random.choice(KNOWN)} 订单 {random.randint(1, 999999)}")
+        elif roll < 0.85:
+            rows.append(f"{random.choice(PHRASES)} {random.randint(1, 99)}")
+        else:
+            rows.append(f"{random.choice(NOVEL)} #{random.randint(1, 9999)}")
+    return rows
+
+
+class CountingLLM:
+    """按批返回「其他」，只记录调用次数和条数"""
+
+    def __init__(self):
+        self.calls = 0
+        self.items = 0
+
+    def __call__(self, prompt):
+        numbers = re.findall(r'^(\d+)\. ', prompt, re.M)
+        self.calls += 1
+        self.items += len(numbers)
+        return json.dumps({n: '其他' for n in numbers}, ensure_ascii=False)
+
+
+def run(label, categorizer, rows):
+    start = time.perf_counter()
+    results = categorizer.categorize(rows, user_id=1)
+    elapsed = (time.perf_counter() - start) * 1000
+    sources = Counter(r['source'] for r in results)
+    print(f"{label}: {elapsed:.0f} ms  来源 {dict(sources)}")
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    rows = generate(count)
+    with tempfile.TemporaryDirectory() as tmp:
+        llm = CountingLLM()
+        categorizer = TransactionCategorizer(llm=llm, pool=ConnectionPool(os.path.join(tmp, 'labels.db')))
+        print(f"{count} 条交易描述")
+        start = time.perf_counter()
+        categorizer._get_model()
+        print(f"导入 scikit-learn 并训练本地模型: {(time.perf_counter() - start) * 1000:.0f} ms")
+        run("冷启动", categorizer, rows)
+        print(f"   大模型调用 {llm.calls} 次，共 {llm.items} 条（逐条调用需要 {count} 次）")
+        run("二次分类", categorizer, rows)
+        print(f"   大模型累计调用 {llm.calls} 次")
@@ -0,0 +1,64 @@
+# backend/benchmarks/bench_chat_memory.py
+"""
+聊天会话上下文与历史分页基准
+
+用法：
+    python benchmarks/bench_chat_memory.py [轮数]
+
+在一个会话里模拟多轮对话（每轮后按需合并摘要，使用本地摘要），
+打印不同轮数时发给大模型的上下文大小和组装耗时，以及翻到最早一页消息的耗时。
+上下文大小应与轮数无关；keyset 分页每页耗时应与翻到多深无关。
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_store import ChatStore
+from database import ConnectionPool
+
+QUESTIONS = ['存款利率是多少', '我想办一张信用卡，需要什么条件', '房贷提前还款划算吗', '帮我看看这个月的支出',
+             '有没有适合稳健型的理财产品', '转账限额是多少']
+
+
+def context_chars(context):
+    return len(context['summary']) + sum(len(m['content']) for m in context['messages'])
+
+
+if __name__ == '__main__':
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    checkpoints = {10, 100, 1000, turns}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ChatStore(ConnectionPool(os.path.join(tmp, 'chat.db')))
+        session_id = store.create_session(1, QUESTIONS[0])
+        folds = 0
+        start = time.perf_counter()
+        for turn in range(1, turns + 1):
+            t0 = time.perf_counter()
+            context = store.context(session_id)
+            context_ms = (time.perf_counter() - t0) * 1000
+            question = random.choice(QUESTIONS)
+            result = store.append_turn(session_id, question, f"关于“{question}”：" + '详细说明。' * random.randint(20, 80))
+            if result['needs_fold']:
+                folds += store.fold(session_id, lambda summary, messages: None) > 0
+            if turn in checkpoints:
+                print(f"第 {turn:>5} 轮：上下文 {len(context['messages'])} 条消息 + 摘要 {len(context['summary'])} 字，"
+                      f"共 {context_chars(context):,} 字，组装 {context_ms:.2f} ms")
+        elapsed = time.perf_counter() - start
+        print(f"{turns} 轮共 {elapsed:.1f} 秒（每轮 {elapsed / turns * 1000:.2f} ms，含写入），合并摘要 {folds} 次")
+
+        pages = 0
+        cursor = None
+        slowest = 0.0
+        while True:
+            t0 = time.perf_counter()
+            messages, cursor = store.list_messages(session_id, 50, cursor)
+            slowest = max(slowest, time.perf_counter() - t0)
+            pages += 1
+            if cursor is None:
+                break
+        print(f"消息历史 {pages} 页（每页 50 条），最慢一页 {slowest * 1000:.2f} ms")
@@ -0,0 +1,65 @@
+# backend/benchmarks/bench_credentials.py
+"""
+登录突发流量下的密码校验吞吐与尾延迟
+
+用法：
+    python benchmarks/bench_credentials.py [并发登录数...]
+
+模拟同一时刻涌入的 N 个登录请求（每个请求一个线程），统计吞吐、p50/p99
+以及因排队超时被拒绝的请求数。通过 BCRYPT_TARGET_MS、CREDENTIAL_WORKERS、
+CREDENTIAL_QUEUE_TIMEOUT 等环境变量调整参数。
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from credential_service import credential_service, CredentialBusy
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def burst(stored_hash, logins):
+    latencies = []
+    rejected = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(logins)
+
+    def login():
+        barrier.wait()
+        start = time.perf_counter()
+        try:
+            valid, _ = credential_service.verify('correct horse', stored_hash)
+            assert valid
+        except CredentialBusy:
+            with lock:
+                rejected.append(1)
+            return
+        with lock:
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=login) for _ in range(logins)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, percentile(latencies, 0.5), percentile(latencies, 0.99), len(rejected)
+
+
+if __name__ == '__main__':
+    bursts = [int(n) for n in sys.argv[1:]] or [8, 32, 128]
+    stored_hash = credential_service.hash_password('correct horse')
+    print(f"bcrypt cost {credential_service.rounds}, {credential_service.workers} 个进程")
+    print(f"{'burst':>6} {'login/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'rejected':>9}")
+    for logins in bursts:
+        rate, p50, p99, rejected = burst(stored_hash, logins)
+        print(f"{logins:>6} {rate:>9.1f} {p50:>9.1f} {p99:>9.1f} {rejected:>9}")
@@ -0,0 +1,68 @@
+# backend/benchmarks/bench_dashboard.py
+"""
+仪表盘汇总延迟基准：汇总表（rollups）与全量扫描流水对比
+
+用法：
+    python benchmarks/bench_dashboard.py [流水条数...]
+
+为单个用户生成不同年限的流水，分别用汇总表和直接聚合流水表计算本月 / 本年收支。
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import ConnectionPool
+from ledger_store import LedgerStore
+
+CATEGORIES = ['餐饮', '交通', '购物', '住房', '娱乐', '医疗', '工资', '理财']
+REPEAT = 20
+
+
+def populate(store, count):
+    today = date.today()
+    with store.pool.transaction() as conn:
+        for account_id in (1, 2):
+            conn.execute("INSERT INTO accounts (id, user_id, account_number, type, created_at) VALUES (?, 1, ?, '储蓄卡', '')",
+                         (account_id, f"bench{account_id}"))
+        conn.executemany(
+            'INSERT INTO transactions (account_id, user_id, date, amount_minor, type, category, created_at) '
+            'VALUES (?, 1, ?, ?, ?, ?, 0)',
+            ((random.randint(1, 2), (today - timedelta(days=random.randint(0, 3650))).isoformat(),
+              random.randint(-50000, 30000), 'expense', random.choice(CATEGORIES)) for _ in range(count))
+        )
+        store.rollups.rebuild(conn)
+
+
+def full_scan(store, start):
+    with store.pool.connection() as conn:
+        return conn.execute("""
+            SELECT category, SUM(CASE WHEN amount_minor >= 0 THEN amount_minor ELSE 0 END),
+                   SUM(CASE WHEN amount_minor < 0 THEN -amount_minor ELSE 0 END)
+            FROM transactions WHERE user_id = 1 AND date >= ? GROUP BY category
+        """, (start,)).fetchall()
+
+
+def timed(func):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        func()
+    return (time.perf_counter() - start) / REPEAT * 1000
+
+
+if __name__ == '__main__':
+    counts = [int(n) for n in sys.argv[1:]] or [10000, 100000, 1000000]
+    print(f"{'rows':>9} {'range':>6} {'rollups ms':>11} {'full scan ms':>13}")
+    for count in counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = LedgerStore(ConnectionPool(os.path.join(tmp, 'ledger.db')))
+            populate(store, count)
+            for time_range in ('month', 'year'):
+                start, _ = store.rollups.period_bounds(time_range)
+                rollup_ms = timed(lambda: store.rollups.summary(1, time_range))
+                scan_ms = timed(lambda: full_scan(store, start.isoformat()))
+                print(f"{count:>9} {time_range:>6} {rollup_ms:>11.2f} {scan_ms:>13.2f}")
@@ -0,0 +1,135 @@
+# backend/benchmarks/bench_document_extractor.py
+"""
+金融文档抽取吞吐量基准
+
+用法：
+    python benchmarks/bench_document_extractor.py [OCR文本目录]
+
+传入目录时读取其中所有 .txt 文件（每个文件为一份 OCR 输出）作为语料；
+否则使用下方内置的 OCR 样本。对比旧版逐条 re.search 实现与单次扫描引擎。
+"""
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from document_extractor import document_extractor
+
+SAMPLE_CORPUS = [
+    """中国工商银行 电子回单
+回单编号：20260115093012
+日期：2026-01-15
+付款人姓名：张三  账号：6222 0212 3456 7890
+收款人：上海云帆信息科技有限公司
+金额：¥12,345.60  大写：壹万贰仟叁佰肆拾伍元陆角
+用途：货款""",
+    """增值税普通发票 No. 04471235
+开票日期：2026年01月08日
+购买方名称：北京星河贸易有限公司
+货物或应税劳务名称  数量  单价  金额
+办公用品  10  35.00  350.00
+合计：￥350.00
+价税合计（大写）叁佰伍拾元整""",
+    """RECEIPT
+STARBUCKS COFFEE #1024
+Date: 01/12/2026  14:32
+Latte Grande      $5.75
+Croissant         $3.25
+TOTAL: 9.00
+VISA ****1234 payment approved""",
+    """中华人民共和国
+居民身份证
+姓名 李四
+性别 男 民族 汉
+出生 1990年3月7日
+住址 广东省深圳市南山区科技园路1号
+公民身份号码 44030519900307123X""",
+    """支票  No: 8812093
+出票日期 2026/01/20
+收款人：杭州青禾餐饮管理有限公司
+人民币 5000.00
+付款行名称：招商银行杭州分行""",
+    """会议纪要
+时间：下午三点
+参会人员：产品组、设计组
+议题：新版首页改版方案讨论
+结论：下周一提交原型""",
+]
+
+
+def legacy_analyze(text):
+    """旧版实现：关键词循环 + 多次 lower() + 逐条正则"""
+    text_lower = text.lower()
+    keywords = ['银行', '支票', '汇票', '账单', '发票', '收据', '金额', '合计', '总计',
+                '支付', '付款', '收款', '人民币', '美元', '欧元', '日元', '港币',
+                '身份证', '护照', '驾驶证', '证件',
+                'bank', 'check', 'invoice', 'receipt', 'amount', 'total', 'payment', 'money']
+    financial = any(k in text_lower for k in keywords)
+    if not financial:
+        for p in [r'no[.:]\s*\w+', r'编号[:：]\s*\w+', r'date[:：]\s*\d', r'日期[:：]\s*\d',
+                  r'amount[:：]\s*[\d,]', r'金额[:：]\s*[\d,]', r'\$\s*[\d,]+\.?\d*',
+                  r'¥\s*[\d,]+\.?\d*', r'￥\s*[\d,]+\.?\d*']:
+            if re.search(p, text_lower, re.IGNORECASE):
+                financial = True
+                break
+    if not financial:
+        return None
+
+    doc_type = "unknown"
+    if any(w in text.lower() for w in ['支票', 'cheque']):
+        doc_type = "check"
+    elif any(w in text.lower() for w in ['发票', 'invoice']):
+        doc_type = "invoice"
+    elif any(w in text.lower() for w in ['收据', 'receipt']):
+        doc_type = "receipt"
+    elif any(w in text.lower() for w in ['身份证', 'id card']):
+        doc_type = "id_card"
+
+    amounts = []
+    for p in [r'¥\s*([\d,]+\.?\d*)', r'￥\s*([\d,]+\.?\d*)', r'\$\s*([\d,]+\.?\d*)',
+              r'金额[:：]\s*([\d,]+\.?\d*)', r'合计[:：]\s*([\d,]+\.?\d*)',
+              r'total[:：]\s*([\d,]+\.?\d*)', r'amount[:：]\s*([\d,]+\.?\d*)',
+              r'人民币\s*([\d,]+\.?\d*)']:
+        amounts.extend(m.replace(',', '') for m in re.findall(p, text, re.IGNORECASE))
+    dates = []
+    for p in [r'\d{4}[-/]\d{1,2}[-/]\d{1,2}', r'\d{1,2}[-/]\d{1,2}[-/]\d{4}',
+              r'日期[:：]\s*(\d{4}[-/]\d{1,2}[-/]\d{1,2})', r'date[:：]\s*(\d{4}[-/]\d{1,2}[-/]\d{1,2})']:
+        dates.extend(re.findall(p, text, re.IGNORECASE))
+    parties = [line.strip() for line in text.split('\n')
+               if any(k in line for k in ['银行', '公司', '姓名', 'name', 'account'])]
+    return doc_type, amounts, dates, parties
+
+
+def load_corpus(path=None):
+    if not path:
+        return SAMPLE_CORPUS
+    corpus = []
+    for filename in sorted(os.listdir(path)):
+        if filename.endswith('.txt'):
+            with open(os.path.join(path, filename), 'r', encoding='utf-8') as f:
+                corpus.append(f.read())
+    return corpus
+
+
+def run(name, func, corpus, min_seconds=1.0):
+    docs = 0
+    chars = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < min_seconds:
+        for text in corpus:
+            func(text)
+            chars += len(text)
+        docs += len(corpus)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<10} {docs / elapsed:>12,.0f} docs/s {chars / elapsed / 1e6:>8.2f} MB/s")
+    return docs / elapsed
+
+
+if __name__ == '__main__':
+    corpus = load_corpus(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(f"语料: {len(corpus)} 份文档, {sum(len(t) for t in corpus)} 字符")
+    legacy = run('legacy', legacy_analyze, corpus)
+    engine = run('engine', document_extractor.extract, corpus)
+    print(f"加速比: {engine / legacy:.2f}x")
@@ -0,0 +1,61 @@
+# backend/benchmarks/bench_ledger_pagination.py
+"""
+流水分页延迟基准：OFFSET 与游标（keyset）对比
+
+用法：
+    python benchmarks/bench_ledger_pagination.py [流水条数]
+
+在临时库中为单个账户写入 N 条流水，分别测量在不同翻页深度取一页（50 条）的耗时。
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import ConnectionPool
+from ledger_store import LedgerStore, encode_cursor
+
+PAGE_SIZE = 50
+REPEAT = 20
+
+
+def populate(store, count):
+    start = date(2000, 1, 1)
+    with store.pool.transaction() as conn:
+        conn.execute("INSERT INTO accounts (user_id, account_number, type, created_at) VALUES (1, 'bench', '储蓄卡', '')")
+        conn.executemany(
+            'INSERT INTO transactions (account_id, user_id, date, amount_minor, type, description, created_at) '
+            'VALUES (1, 1, ?, ?, ?, ?, 0)',
+            (((start + timedelta(days=i * 9000 // count)).isoformat(), random.randint(-50000, 50000),
+              'expense', f"交易 {i}") for i in range(count))
+        )
+
+
+def timed(func):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        func()
+    return (time.perf_counter() - start) / REPEAT * 1000
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LedgerStore(ConnectionPool(os.path.join(tmp, 'ledger.db')))
+        populate(store, count)
+        with store.pool.connection() as conn:
+            rows = conn.execute('SELECT date, id FROM transactions ORDER BY date DESC, id DESC').fetchall()
+
+        print(f"流水 {count} 条，每页 {PAGE_SIZE} 条")
+        print(f"{'depth':>9} {'offset ms':>10} {'cursor ms':>10}")
+        for depth in [0, 1000, 10000, 100000, count // 2, count - PAGE_SIZE - 1]:
+            if depth >= len(rows):
+                continue
+            cursor = encode_cursor(rows[depth - 1]['date'], rows[depth - 1]['id']) if depth else None
+            offset_ms = timed(lambda: store.list_transactions(1, 1, limit=PAGE_SIZE, offset=depth))
+            cursor_ms = timed(lambda: store.list_transactions(1, 1, limit=PAGE_SIZE, cursor=cursor))
+            print(f"{depth:>9} {offset_ms:>10.2f} {cursor_ms:>10.2f}")
@@ -0,0 +1,86 @@
+# backend/benchmarks/bench_market_facts.py
+"""
+汇率快照查询与刷新基准
+
+用法：
+    python benchmarks/bench_market_facts.py [刷新次数]
+
+打印汇率查询、换算和聊天问答的单次耗时；然后几个读线程不停查询，
+同时写线程反复改写数据文件并刷新，检查读方从未看到新旧混合的快照。
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market_facts import FACTS_PATH, MarketFacts
+
+READERS = 4
+
+
+def per_call_us(func, n=200000):
+    start = time.perf_counter()
+    for _ in range(n):
+        func()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+if __name__ == '__main__':
+    refreshes = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    with open(FACTS_PATH, encoding='utf-8') as f:
+        data = json.load(f)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'facts.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        facts = MarketFacts(path=path, url='', refresh_seconds=0)
+
+        print(f"rate('USD', 'CNY')      {per_call_us(lambda: facts.rate('USD', 'CNY')):.2f} µs")
+        print(f"convert(100, EUR, JPY)   {per_call_us(lambda: facts.convert(100, 'EUR', 'JPY')):.2f} µs")
+        print(f"answer('100美元等于多少人民币') {per_call_us(lambda: facts.answer('100美元等于多少人民币'), 20000):.2f} µs")
+
+        stop = threading.Event()
+        stats = {"reads": 0, "torn": 0}
+
+        def reader():
+            reads = torn = 0
+            while not stop.is_set():
+                snapshot = facts.snapshot
+                # 每个版本的 USD 汇率与 as_of 写成同一个数，两者不一致就是读到了混合数据
+                usd = snapshot.rate('USD', 'CNY')
+                if f"{usd:.4f}" != snapshot.as_of or abs(usd * snapshot.rate('CNY', 'USD') - 1) > 1e-9:
+                    torn += 1
+                reads += 1
+            stats["reads"] += reads
+            stats["torn"] += torn
+
+        data['as_of'] = f"{data['rates']['USD']:.4f}"
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        facts.refresh()
+
+        threads = [threading.Thread(target=reader) for _ in range(READERS)]
+        for thread in threads:
+            thread.start()
+        swapped = 0
+        start = time.perf_counter()
+        for i in range(refreshes):
+            data['rates']['USD'] = round(6.5 + (i % 1000) / 1000, 4)
+            data['as_of'] = f"{data['rates']['USD']:.4f}"
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            swapped += facts.refresh()
+        elapsed = time.perf_counter() - start
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        print(f"{swapped} 次刷新（每次含写文件 {elapsed / max(refreshes, 1) * 1000:.2f} ms），"
+              f"{READERS} 个读线程共 {stats['reads']:,} 次读取，读到混合数据 {stats['torn']} 次")
+    sys.exit(0 if stats["torn"] == 0 else 1)
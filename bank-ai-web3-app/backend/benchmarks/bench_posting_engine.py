@@ -0,0 +1,131 @@
+# backend/benchmarks/bench_posting_engine.py
+"""
+记账引擎并发压测
+
+用法：
+    python benchmarks/bench_posting_engine.py [线程数] [每线程操作数] [账户数]
+
+多个线程随机转账 / 存款 / 取款（部分请求用同一幂等键重试一次），
+分别测量逐笔提交（max_batch=1）和合并提交的吞吐，结束后检查：
+所有账户（含清算账户）余额合计不变、每个账户余额等于流水合计、
+每个 journal 分录合计为 0、客户账户没有负余额、重试没有重复记账、
+汇总表与流水一致。
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import ConnectionPool
+from ledger_store import LedgerStore
+from posting_engine import PostingEngine, PostingError
+
+OPENING_BALANCE = 100000  # 1000 元
+
+
+def setup(tmp, account_count):
+    store = LedgerStore(ConnectionPool(os.path.join(tmp, 'ledger.db'), size=32))
+    with store.pool.transaction() as conn:
+        for i in range(account_count):
+            account_id = conn.execute(
+                "INSERT INTO accounts (user_id, account_number, type, balance_minor, created_at) VALUES (?, ?, '储蓄卡', ?, '')",
+                (i % 10 + 1, f"bench{i}", OPENING_BALANCE)
+            ).lastrowid
+            conn.execute(
+                "INSERT INTO transactions (account_id, user_id, date, amount_minor, type, description, created_at) "
+                "VALUES (?, ?, '2026-01-01', ?, 'income', '期初余额', 0)",
+                (account_id, i % 10 + 1, OPENING_BALANCE)
+            )
+        store.rollups.rebuild(conn)
+        accounts = [(row['id'], row['user_id']) for row in conn.execute('SELECT id, user_id FROM accounts')]
+    return store, accounts
+
+
+def worker(engine, accounts, operations, counters, lock):
+    rng = random.Random()
+    local = {"ok": 0, "replayed": 0, "rejected": 0}
+    for _ in range(operations):
+        (source, user_id), (target, _) = rng.sample(accounts, 2)
+        amount = rng.randint(1, 30000)
+        key = uuid.uuid4().hex if rng.random() < 0.5 else None
+        roll = rng.random()
+        if roll < 0.8:
+            call = lambda: engine.transfer(user_id, source, target, amount, idempotency_key=key)
+        elif roll < 0.9:
+            call = lambda: engine.deposit(user_id, source, amount, idempotency_key=key)
+        else:
+            call = lambda: engine.withdraw(user_id, source, amount, idempotency_key=key)
+        for attempt in range(2 if key else 1):
+            try:
+                result = call()
+            except PostingError:
+                local["rejected"] += 1
+                break
+            local["replayed" if result.get("replayed") else "ok"] += 1
+    with lock:
+        for name, value in local.items():
+            counters[name] += value
+
+
+def verify(store, total_before, successes):
+    with store.pool.connection() as conn:
+        total = conn.execute('SELECT SUM(balance_minor) FROM accounts').fetchone()[0]
+        mismatched = conn.execute("""
+            SELECT COUNT(*) FROM accounts a
+            WHERE a.balance_minor != (SELECT COALESCE(SUM(amount_minor), 0) FROM transactions WHERE account_id = a.id)
+        """).fetchone()[0]
+        unbalanced = conn.execute("""
+            SELECT COUNT(*) FROM (SELECT journal_id FROM transactions WHERE journal_id IS NOT NULL
+                                  GROUP BY journal_id HAVING SUM(amount_minor) != 0 OR COUNT(*) != 2)
+        """).fetchone()[0]
+        negative = conn.execute('SELECT COUNT(*) FROM accounts WHERE user_id != 0 AND balance_minor < 0').fetchone()[0]
+        journals = conn.execute(
+            'SELECT COUNT(DISTINCT journal_id) FROM transactions WHERE journal_id IS NOT NULL'
+        ).fetchone()[0]
+    checks = {
+        "余额合计不变": total == total_before,
+        "余额等于流水合计": mismatched == 0,
+        "journal 借贷平衡": unbalanced == 0,
+        "无负余额": negative == 0,
+        "重试未重复记账": journals == successes,
+        "汇总表与流水一致": not store.rollups.verify(),
+    }
+    for name, ok in checks.items():
+        print(f"   {'✅' if ok else '❌'} {name}")
+    return all(checks.values())
+
+
+def run(label, threads, operations, account_count, max_batch):
+    with tempfile.TemporaryDirectory() as tmp:
+        store, accounts = setup(tmp, account_count)
+        engine = PostingEngine(store, max_batch=max_batch)
+        total_before = OPENING_BALANCE * account_count
+        counters = {"ok": 0, "replayed": 0, "rejected": 0}
+        lock = threading.Lock()
+        pool = [threading.Thread(target=worker, args=(engine, accounts, operations, counters, lock))
+                for _ in range(threads)]
+        start = time.perf_counter()
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        elapsed = time.perf_counter() - start
+        stats = engine.stats()
+        print(f"{label}: {counters['ok'] / elapsed:.0f} 笔/秒（成功 {counters['ok']}，重放 {counters['replayed']}，"
+              f"拒绝 {counters['rejected']}，提交 {stats['commits']} 次，平均每批 {stats['avg_batch']}）")
+        return verify(store, total_before, counters['ok'])
+
+
+if __name__ == '__main__':
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    account_count = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    print(f"{threads} 线程 × {operations} 次操作，{account_count} 个账户")
+    ok = run("逐笔提交", threads, operations, account_count, max_batch=1)
+    ok = run("合并提交", threads, operations, account_count, max_batch=256) and ok
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,92 @@
+# backend/benchmarks/bench_spending_analytics.py
+"""
+支出分析耗时基准
+
+用法：
+    python benchmarks/bench_spending_analytics.py [年数] [每天笔数]
+
+生成一个账户若干年的逐日流水（日常消费 + 房租 / 订阅 / 健身等周期扣款 + 工资，
+最近 90 天插入几笔异常大额支出），分别测量加载流水和分析的耗时，并打印识别结果。
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import ConnectionPool
+from ledger_store import LedgerStore
+from spending_analytics import SpendingAnalyzer, load_account_frame
+
+DAILY = [('餐饮', '美团外卖', 2000, 8000), ('交通', '滴滴出行', 1500, 6000),
+         ('购物', '京东商城', 3000, 40000), ('娱乐', '猫眼电影', 4000, 12000)]
+REPEAT = 20
+
+
+def generate(years, per_day):
+    today = date.today()
+    start = today - timedelta(days=365 * years)
+    rows = []
+    day = start
+    while day <= today:
+        for _ in range(per_day):
+            category, merchant, low, high = random.choice(DAILY)
+            rows.append((day, -random.randint(low, high), category, f"{merchant} 订单 {random.randint(1, 99999)}", merchant))
+        if day.day == 5:
+            rows.append((day, -450000, '住房', '房租', '链家物业'))
+            rows.append((day, 2500000, '工资', '工资收入', '某某科技有限公司'))
+        if day.day == 12:
+            rows.append((day, -3900, '娱乐', '视频会员自动续费', '腾讯视频'))
+        if day.weekday() == 5:
+            rows.append((day, -random.randint(9800, 10200), '运动', '健身课程', '乐刻健身'))
+        day += timedelta(days=1)
+    for offset in (3, 20, 45):
+        rows.append((today - timedelta(days=offset), -random.randint(300000, 600000), '购物', '大额消费', '京东商城'))
+    return [(d.isoformat(), amount, category, description, merchant) for d, amount, category, description, merchant in rows]
+
+
+def timed(func):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        result = func()
+    return (time.perf_counter() - start) / REPEAT * 1000, result
+
+
+if __name__ == '__main__':
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    per_day = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    rows = generate(years, per_day)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LedgerStore(ConnectionPool(os.path.join(tmp, 'ledger.db')))
+        with store.pool.transaction() as conn:
+            conn.execute("INSERT INTO accounts (id, user_id, account_number, type, created_at) VALUES (1, 1, 'bench', '储蓄卡', '')")
+            conn.executemany(
+                'INSERT INTO transactions (account_id, user_id, date, amount_minor, type, category, description, '
+                'counterparty, created_at) VALUES (1, 1, ?, ?, ?, ?, ?, ?, 0)',
+                [(d, amount, 'income' if amount > 0 else 'expense', category, description, merchant)
+                 for d, amount, category, description, merchant in rows]
+            )
+
+        analyzer = SpendingAnalyzer()
+        load_ms, frame = timed(lambda: load_account_frame(store.pool, 1))
+        analyze_ms, summary = timed(lambda: analyzer.analyze(frame))
+
+    print(f"{years} 年流水 {len(rows)} 条")
+    print(f"加载: {load_ms:.1f} ms   分析: {analyze_ms:.1f} ms   合计: {load_ms + analyze_ms:.1f} ms")
+    print(f"周期性扣款: {[(r['merchant'], r['cadence']) for r in summary['recurring']]}")
+    print(f"异常支出: {[(a['date'], a['amount']) for a in summary['anomalies']]}")
+
+    # 上月同期不能越过上月末：3 月 31 日对比的是整个 2 月，不含 3 月 1-2 日
+    month_end = pd.DataFrame({
+        'date': pd.to_datetime(['2026-02-10', '2026-02-28', '2026-03-01', '2026-03-02', '2026-03-20']),
+        'amount_minor': [-10000, -20000, -40000, -80000, -5000],
+        'category': '购物', 'description': '', 'counterparty': ''
+    })
+    same_period = analyzer.analyze(month_end, today=date(2026, 3, 31))['month_to_date']['previous_same_period']
+    print(f"   {'✅' if same_period == 300.0 else '❌'} 3 月 31 日的上月同期 = 2 月全月（{same_period}）")
@@ -0,0 +1,101 @@
+# backend/benchmarks/bench_statement_import.py
+"""
+对账单批量导入基准
+
+用法：
+    python benchmarks/bench_statement_import.py [行数] [--categorize]
+
+生成一个 CSV 对账单（多年的日常消费、工资、房租），导入到空账户，
+再导入同一文件一次（应全部判为重复），打印耗时、进度回调次数，
+并检查余额等于流水合计、journal 借贷平衡、汇总表与流水一致。--categorize 时用规则和本地模型为每行分类。
+"""
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import ConnectionPool
+from ledger_store import LedgerStore
+from posting_engine import PostingEngine
+from statement_importer import StatementImporter
+
+MERCHANTS = [('美团外卖', 2000, 8000), ('滴滴出行', 1500, 6000), ('京东商城', 3000, 40000), ('星巴克', 3000, 6000),
+             ('盒马鲜生', 5000, 30000), ('中国移动', 5000, 20000)]
+
+
+def generate(path, count):
+    today = date.today()
+    days = max(count // 20, 1)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['交易日期', '摘要', '对方户名', '收入', '支出'])
+        for i in range(count):
+            day = today - timedelta(days=days - i * days // count)
+            if i % 20 == 0:
+                writer.writerow([day.isoformat(), '工资', '某某科技有限公司', '25000.00', ''])
+            else:
+                merchant, low, high = random.choice(MERCHANTS)
+                writer.writerow([day.isoformat(), f"{merchant} 订单 {random.randint(1, 10 ** 9)}", merchant, '',
+                                 f"{random.randint(low, high) / 100:.2f}"])
+
+
+def run(importer, path, label, categorize):
+    reports = []
+    start = time.perf_counter()
+    result = importer.run(1, 1, path, progress=reports.append, categorize=categorize)
+    elapsed = time.perf_counter() - start
+    print(f"{label}: {elapsed:.1f} 秒（{result['rows'] / elapsed:,.0f} 行/秒），导入 {result['imported']}，"
+          f"重复 {result['duplicates']}，无效 {result['invalid']}，进度回调 {len(reports)} 次")
+    return result
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 1000000
+    categorize = None
+    if '--categorize' in sys.argv:
+        from transaction_categorizer import TransactionCategorizer
+        categorizer = None
+
+        def categorize(texts):
+            return categorizer.categorize(texts, use_llm=False)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = ConnectionPool(os.path.join(tmp, 'ledger.db'))
+        store = LedgerStore(pool)
+        with pool.connection() as conn:
+            conn.execute("INSERT INTO accounts (id, user_id, account_number, type, created_at) "
+                         "VALUES (1, 1, 'bench', '储蓄卡', '')")
+        if categorize:
+            categorizer = TransactionCategorizer(pool=pool)
+            categorizer.categorize(['预热'])
+        importer = StatementImporter(store, PostingEngine(store))
+        path = os.path.join(tmp, 'statement.csv')
+        generate(path, count)
+        print(f"{count:,} 行，文件 {os.path.getsize(path) / 1024 / 1024:.0f} MB")
+
+        run(importer, path, "首次导入", categorize)
+        result = run(importer, path, "重复导入", categorize)
+
+        with pool.connection() as conn:
+            balance, total = conn.execute(
+                'SELECT balance_minor, (SELECT SUM(amount_minor) FROM transactions WHERE account_id = 1) '
+                'FROM accounts WHERE id = 1'
+            ).fetchone()
+            unbalanced = conn.execute(
+                'SELECT COUNT(*) FROM (SELECT journal_id FROM transactions GROUP BY journal_id '
+                'HAVING journal_id IS NULL OR SUM(amount_minor) != 0)'
+            ).fetchone()[0]
+        checks = {
+            "重复导入全部跳过": result['imported'] == 0,
+            "余额等于流水合计": balance == total,
+            "journal 借贷平衡": unbalanced == 0,
+            "汇总表与流水一致": not store.rollups.verify(),
+        }
+        for name, ok in checks.items():
+            print(f"   {'✅' if ok else '❌'} {name}")
+    sys.exit(0 if all(checks.values()) else 1)
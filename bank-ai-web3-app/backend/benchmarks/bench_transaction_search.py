@@ -0,0 +1,66 @@
+# backend/benchmarks/bench_transaction_search.py
+"""
+流水搜索延迟基准
+
+用法：
+    python benchmarks/bench_transaction_search.py [流水条数...]
+
+为单个账户生成不同规模的历史流水（商户名混合中英文），测量关键词搜索、
+两个汉字的关键词（二元组索引）、关键词 + 金额/日期过滤，以及旧前端做法（取回全部流水后在内存中逐条匹配）的耗时。
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import ConnectionPool
+from ledger_store import LedgerStore
+
+MERCHANTS = ['星巴克咖啡', '美团外卖', '滴滴出行', '中国石化加油站', '京东商城', '盒马鲜生',
+             'Starbucks Coffee', 'Apple Store', 'Amazon Marketplace', 'Shell Gas Station']
+REPEAT = 20
+
+
+def populate(store, count):
+    start = date(2026, 1, 1) - timedelta(days=3650)
+    with store.pool.transaction() as conn:
+        conn.execute("INSERT INTO accounts (user_id, account_number, type, created_at) VALUES (1, 'bench', '储蓄卡', '')")
+        conn.executemany(
+            'INSERT INTO transactions (account_id, user_id, date, amount_minor, type, description, counterparty, created_at) '
+            'VALUES (1, 1, ?, ?, ?, ?, ?, 0)',
+            (((start + timedelta(days=i * 3650 // count)).isoformat(), -random.randint(100, 100000), 'expense',
+              f"{random.choice(MERCHANTS)} 订单 {i}", random.choice(MERCHANTS)) for i in range(count))
+        )
+
+
+def timed(func):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        func()
+    return (time.perf_counter() - start) / REPEAT * 1000
+
+
+def client_side(store, term):
+    """旧做法：取回全部流水后在内存中逐条匹配"""
+    with store.pool.connection() as conn:
+        rows = conn.execute('SELECT * FROM transactions WHERE user_id = 1').fetchall()
+    return [r for r in rows if term in r['description'].lower() or term in (r['counterparty'] or '').lower()][:50]
+
+
+if __name__ == '__main__':
+    counts = [int(n) for n in sys.argv[1:]] or [10000, 100000, 1000000]
+    print(f"{'rows':>9} {'keyword ms':>11} {'2-char ms':>10} {'+filters ms':>12} {'client-side ms':>15}")
+    for count in counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = LedgerStore(ConnectionPool(os.path.join(tmp, 'ledger.db')))
+            populate(store, count)
+            keyword = timed(lambda: store.search_transactions(1, '星巴克', limit=50))
+            two_char = timed(lambda: store.search_transactions(1, '外卖', limit=50))
+            filtered = timed(lambda: store.search_transactions(
+                1, 'starbucks', min_amount=10000, max_amount=50000, date_from='2025-01-01', limit=50))
+            legacy = timed(lambda: client_side(store, 'starbucks')) if count <= 100000 else float('nan')
+            print(f"{count:>9} {keyword:>11.2f} {two_char:>10.2f} {filtered:>12.2f} {legacy:>15.2f}")
@@ -0,0 +1,59 @@
+# backend/benchmarks/bench_user_store.py
+"""
+用户存储查询延迟基准
+
+用法：
+    python benchmarks/bench_user_store.py [用户数...]
+
+在临时库中批量写入 N 个用户，测量按用户名、按 id（缓存未命中 / 命中）查询的耗时，
+验证唯一索引 + 预编译语句在百万用户时依然是常数级的查询开销。
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import ConnectionPool
+from user_store import UserStore
+
+LOOKUPS = 20000
+
+
+def populate(store, count):
+    with store.pool.transaction() as conn:
+        conn.executemany(
+            'INSERT INTO users (username, email, password_hash, full_name, role, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            ((f"user{i}", f"user{i}@example.com", 'x', f"User {i}", 'user', '2026-01-01T00:00:00Z')
+             for i in range(1, count + 1))
+        )
+
+
+def measure(func, keys):
+    start = time.perf_counter()
+    for key in keys:
+        assert func(key) is not None
+    return (time.perf_counter() - start) / len(keys) * 1e6
+
+
+if __name__ == '__main__':
+    counts = [int(n) for n in sys.argv[1:]] or [10000, 100000, 1000000]
+    print(f"{'users':>9} {'by username':>12} {'by id':>8} {'by id cached':>13}  (us/lookup)")
+    for count in counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = UserStore(ConnectionPool(os.path.join(tmp, 'users.db')))
+            populate(store, count)
+            ids = [random.randint(1, count) for _ in range(LOOKUPS)]
+            names = [f"user{i}" for i in ids]
+
+            by_name = measure(store.get_by_username, names)
+            store._cache.clear()
+            by_id = measure(store.get_by_id, [random.randint(1, count) for _ in range(LOOKUPS)])
+            hot = ids[:1000]
+            for user_id in hot:
+                store.get_by_id(user_id)
+            by_id_cached = measure(store.get_by_id, hot * (LOOKUPS // len(hot)))
+            print(f"{count:>9} {by_name:>12.1f} {by_id:>8.1f} {by_id_cached:>13.2f}")
@@ -0,0 +1,298 @@
+# backend/chat_store.py
+import base64
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from database import ConnectionPool, get_pool
+
+# 原样发给大模型的最近消息条数（一问一答算两条）
+WINDOW_MESSAGES = int(os.getenv('CHAT_WINDOW_MESSAGES', 12))
+# 窗口外积累到这么多条才合并进摘要，避免每轮都调用一次摘要
+FOLD_BATCH_MESSAGES = int(os.getenv('CHAT_FOLD_BATCH', 8))
+# 单次合并最多处理的消息数（摘要落后很多时分几次追上）
+FOLD_MAX_MESSAGES = 64
+# 上下文中最多带的消息条数，摘要落后时也不会超过
+CONTEXT_MAX_MESSAGES = WINDOW_MESSAGES + FOLD_BATCH_MESSAGES
+# 上下文中单条消息和摘要的长度上限（字符）
+CONTEXT_MESSAGE_CHARS = 1000
+SUMMARY_MAX_CHARS = int(os.getenv('CHAT_SUMMARY_MAX_CHARS', 1200))
+TITLE_MAX_CHARS = 30
+MAX_PAGE_SIZE = 100
+
+
+def _clip(text: str, limit: int) -> str:
+    text = ' '.join(text.split())
+    return text if len(text) <= limit else text[:limit - 1] + '…'
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts).isoformat(timespec='seconds')
+
+
+def _encode_cursor(updated_at: float, session_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{updated_at!r}|{session_id}".encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        updated_at, session_id = raw.split('|')
+        return float(updated_at), session_id
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("无效的分页游标")
+
+
+def merge_summary(summary: str, messages: List[Dict]) -> str:
+    """不调用大模型的摘要：每条消息压成一行追加到旧摘要后，超长时丢掉最早的行"""
+    lines = summary.splitlines() if summary else []
+    for message in messages:
+        if message['role'] == 'user':
+            lines.append(f"用户：{_clip(message['content'], 80)}")
+        else:
+            first = message['content'].strip().split('\n', 1)[0]
+            lines.append(f"助手：{_clip(first, 60)}")
+    total = 0
+    kept = []
+    for line in reversed(lines):
+        total += len(line) + 1
+        if total > SUMMARY_MAX_CHARS:
+            break
+        kept.append(line)
+    return '\n'.join(reversed(kept))
+
+
+class ChatStore:
+    """
+    聊天会话与消息历史
+
+    - 消息表只追加，按 (session_id, id) 索引；id 随写入递增，即时间顺序
+    - 发给大模型的上下文 = 滚动摘要 + 最近 WINDOW_MESSAGES 条原文，长度与对话轮数无关
+    - 摘要记到 summarized_upto 为止的消息，窗口外的旧消息攒够一批后增量合并
+    - 会话列表和消息历史都按游标（keyset）分页
+    """
+
+    def __init__(self, pool: Optional[ConnectionPool] = None):
+        self.pool = pool or get_pool()
+        self._init_schema()
+
+    def _init_schema(self):
+        with self.pool.connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chat_sessions (
+                    id TEXT PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    title TEXT NOT NULL,
+                    summary TEXT NOT NULL DEFAULT '',
+                    summarized_upto INTEGER NOT NULL DEFAULT 0,
+                    message_count INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_chat_sessions_user '
+                         'ON chat_sessions(user_id, updated_at, id)')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chat_messages (
+                    id INTEGER PRIMARY KEY,
+                    session_id TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_chat_messages_session ON chat_messages(session_id, id)')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chat_feedback (
+                    message_id INTEGER PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    rating INTEGER NOT NULL,
+                    comment TEXT NOT NULL DEFAULT '',
+                    created_at REAL NOT NULL
+                )
+            """)
+
+    # ---------- 会话 ----------
+
+    def create_session(self, user_id: int, first_message: str) -> str:
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        with self.pool.connection() as conn:
+            conn.execute(
+                'INSERT INTO chat_sessions (id, user_id, title, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+                (session_id, user_id, _clip(first_message, TITLE_MAX_CHARS) or '新对话', now, now)
+            )
+        return session_id
+
+    def get_session(self, session_id: str, user_id: int) -> Optional[Dict]:
+        with self.pool.connection() as conn:
+            row = conn.execute('SELECT * FROM chat_sessions WHERE id = ? AND user_id = ?',
+                               (session_id, user_id)).fetchone()
+        return self._serialize_session(row) if row else None
+
+    def list_sessions(self, user_id: int, limit: int = 20,
+                      cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """最近活跃的会话在前；cursor 为上一页返回的 next_cursor"""
+        limit = min(max(limit, 1), MAX_PAGE_SIZE)
+        sql = 'SELECT * FROM chat_sessions WHERE user_id = ?'
+        params: list = [user_id]
+        if cursor:
+            updated_at, session_id = _decode_cursor(cursor)
+            sql += ' AND (updated_at, id) < (?, ?)'
+            params += [updated_at, session_id]
+        sql += ' ORDER BY updated_at DESC, id DESC LIMIT ?'
+        params.append(limit + 1)
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor(rows[-1]['updated_at'], rows[-1]['id'])
+        return [self._serialize_session(row) for row in rows], next_cursor
+
+    @staticmethod
+    def _serialize_session(row) -> Dict:
+        return {
+            "id": row['id'],
+            "title": row['title'],
+            "message_count": row['message_count'],
+            "created_at": _iso(row['created_at']),
+            "updated_at": _iso(row['updated_at'])
+        }
+
+    # ---------- 消息 ----------
+
+    def append_turn(self, session_id: str, message: str, reply: str) -> Dict:
+        """
+        追加一问一答
+
+        Returns:
+            {"interaction_id": 回复消息的 id（用于反馈）, "needs_fold": 是否该合并摘要,
+             "summarized_upto": 当前摘要覆盖到的消息 id}
+        """
+        now = time.time()
+        with self.pool.transaction() as conn:
+            conn.execute('INSERT INTO chat_messages (session_id, role, content, created_at) VALUES (?, ?, ?, ?)',
+                         (session_id, 'user', message, now))
+            reply_id = conn.execute(
+                'INSERT INTO chat_messages (session_id, role, content, created_at) VALUES (?, ?, ?, ?)',
+                (session_id, 'assistant', reply, now)
+            ).lastrowid
+            summarized_upto = conn.execute(
+                'UPDATE chat_sessions SET message_count = message_count + 2, updated_at = ? WHERE id = ? '
+                'RETURNING summarized_upto', (now, session_id)
+            ).fetchone()[0]
+            unsummarized = self._unsummarized(conn, session_id, summarized_upto)
+        return {
+            "interaction_id": reply_id,
+            "needs_fold": unsummarized >= WINDOW_MESSAGES + FOLD_BATCH_MESSAGES,
+            "summarized_upto": summarized_upto
+        }
+
+    def list_messages(self, session_id: str, limit: int = 50,
+                      cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """按时间正序返回最近的一页；cursor（上一页的 next_cursor）继续向前翻更早的消息"""
+        limit = min(max(limit, 1), MAX_PAGE_SIZE)
+        sql = ('SELECT m.id, m.role, m.content, m.created_at, f.rating FROM chat_messages m '
+               'LEFT JOIN chat_feedback f ON f.message_id = m.id WHERE m.session_id = ?')
+        params: list = [session_id]
+        if cursor:
+            try:
+                params.append(int(cursor))
+            except ValueError:
+                raise ValueError("无效的分页游标")
+            sql += ' AND m.id < ?'
+        sql += ' ORDER BY m.id DESC LIMIT ?'
+        params.append(limit + 1)
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = str(rows[-1]['id'])
+        return [{
+            "id": row['id'],
+            "role": row['role'],
+            "content": row['content'],
+            "timestamp": _iso(row['created_at']),
+            "rating": row['rating']
+        } for row in reversed(rows)], next_cursor
+
+    def add_feedback(self, message_id: int, user_id: int, rating: int, comment: str = '') -> bool:
+        """给自己会话中的助手回复打分，重复提交覆盖；消息不存在或不属于该用户时返回 False"""
+        with self.pool.connection() as conn:
+            owned = conn.execute(
+                "SELECT 1 FROM chat_messages m JOIN chat_sessions s ON s.id = m.session_id "
+                "WHERE m.id = ? AND m.role = 'assistant' AND s.user_id = ?",
+                (message_id, user_id)
+            ).fetchone()
+            if not owned:
+                return False
+            conn.execute(
+                'INSERT INTO chat_feedback (message_id, user_id, rating, comment, created_at) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(message_id) DO UPDATE SET rating = excluded.rating, comment = excluded.comment, '
+                'created_at = excluded.created_at',
+                (message_id, user_id, rating, comment, time.time())
+            )
+        return True
+
+    # ---------- 对话上下文 ----------
+
+    def context(self, session_id: str) -> Dict:
+        """发给大模型的上下文：{"summary": 旧对话摘要, "messages": [{"role", "content"}, ...] 最近的原文}"""
+        with self.pool.connection() as conn:
+            session = conn.execute('SELECT summary, summarized_upto FROM chat_sessions WHERE id = ?',
+                                   (session_id,)).fetchone()
+            if session is None:
+                return {"summary": "", "messages": []}
+            rows = conn.execute(
+                'SELECT role, content FROM chat_messages WHERE session_id = ? AND id > ? ORDER BY id DESC LIMIT ?',
+                (session_id, session['summarized_upto'], CONTEXT_MAX_MESSAGES)
+            ).fetchall()
+        return {
+            "summary": session['summary'],
+            "messages": [{"role": row['role'], "content": _clip(row['content'], CONTEXT_MESSAGE_CHARS)}
+                         for row in reversed(rows)]
+        }
+
+    def fold(self, session_id: str, summarize: Callable[[str, List[Dict]], Optional[str]]) -> int:
+        """
+        把窗口外的旧消息合并进摘要
+
+        summarize(旧摘要, 待合并消息) 返回新摘要，返回 None 时用 merge_summary。
+        摘要生成期间不占连接；写回时比对 summarized_upto，并发合并只有一个生效。
+
+        Returns:
+            合并的消息条数
+        """
+        with self.pool.connection() as conn:
+            session = conn.execute('SELECT summary, summarized_upto FROM chat_sessions WHERE id = ?',
+                                   (session_id,)).fetchone()
+            if session is None:
+                return 0
+            overflow = self._unsummarized(conn, session_id, session['summarized_upto']) - WINDOW_MESSAGES
+            if overflow <= 0:
+                return 0
+            rows = conn.execute(
+                'SELECT id, role, content FROM chat_messages WHERE session_id = ? AND id > ? ORDER BY id LIMIT ?',
+                (session_id, session['summarized_upto'], min(overflow, FOLD_MAX_MESSAGES))
+            ).fetchall()
+        messages = [{"role": row['role'], "content": _clip(row['content'], CONTEXT_MESSAGE_CHARS)} for row in rows]
+
+        summary = summarize(session['summary'], messages) or merge_summary(session['summary'], messages)
+        with self.pool.connection() as conn:
+            updated = conn.execute(
+                'UPDATE chat_sessions SET summary = ?, summarized_upto = ? WHERE id = ? AND summarized_upto = ?',
+                (summary[:SUMMARY_MAX_CHARS], rows[-1]['id'], session_id, session['summarized_upto'])
+            ).rowcount
+        return len(rows) if updated else 0
+
+    @staticmethod
+    def _unsummarized(conn, session_id: str, summarized_upto: int) -> int:
+        return conn.execute('SELECT COUNT(*) FROM chat_messages WHERE session_id = ? AND id > ?',
+                            (session_id, summarized_upto)).fetchone()[0]
+
+
+chat_store = ChatStore()
@@ -11,7 +11,8 @@ class Config:
     
     # JWT Configuration
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key-change-me'
-    JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
+    # 访问令牌短期有效，过期后用刷新令牌换取新令牌
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=int(os.environ.get('JWT_ACCESS_TOKEN_MINUTES', 15)))
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
     
     # AI Configuration
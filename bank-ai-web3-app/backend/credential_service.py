@@ -0,0 +1,138 @@
+# backend/credential_service.py
+import hashlib
+import hmac
+import math
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+
+import bcrypt
+
+# 单次校验的目标耗时，启动时据此校准 bcrypt cost
+TARGET_VERIFY_MS = float(os.getenv('BCRYPT_TARGET_MS', 250))
+MIN_ROUNDS = int(os.getenv('BCRYPT_MIN_ROUNDS', 10))
+MAX_ROUNDS = int(os.getenv('BCRYPT_MAX_ROUNDS', 15))
+# 哈希进程数，以及每个进程最多排队的任务数
+WORKERS = int(os.getenv('CREDENTIAL_WORKERS', min(4, os.cpu_count() or 1)))
+QUEUE_PER_WORKER = int(os.getenv('CREDENTIAL_QUEUE_PER_WORKER', 4))
+# 排队超过该时间直接拒绝，避免登录高峰拖垮所有请求线程
+QUEUE_TIMEOUT_SECONDS = float(os.getenv('CREDENTIAL_QUEUE_TIMEOUT', 1.0))
+
+_SHA256_HEX = re.compile(r'^[0-9a-f]{64}$')
+
+
+class CredentialBusy(Exception):
+    """哈希进程池已满"""
+
+
+def _hash_password(password: bytes, rounds: int) -> str:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode('ascii')
+
+
+def _check_password(password: bytes, password_hash: bytes) -> bool:
+    return bcrypt.checkpw(password, password_hash)
+
+
+def calibrate_rounds(target_ms: float = TARGET_VERIFY_MS) -> int:
+    """测量最低 cost 的耗时，按每加一轮耗时翻倍推算达到目标耗时的 cost"""
+    salt = bcrypt.gensalt(MIN_ROUNDS)
+    start = time.perf_counter()
+    bcrypt.hashpw(b'calibration', salt)
+    elapsed_ms = max((time.perf_counter() - start) * 1000, 0.001)
+    rounds = MIN_ROUNDS + int(math.floor(math.log2(max(target_ms / elapsed_ms, 1))))
+    return max(MIN_ROUNDS, min(MAX_ROUNDS, rounds))
+
+
+class CredentialService:
+    """
+    密码哈希服务
+
+    - bcrypt 计算放到独立进程池，不占用请求线程
+    - 排队数有上限，超时直接拒绝，保证登录高峰时延迟可预期
+    - 兼容旧的 sha256 / 明文记录，校验通过后返回新的 bcrypt 哈希供调用方替换
+    """
+
+    def __init__(self, workers: int = WORKERS, rounds: Optional[int] = None):
+        self.workers = max(1, workers)
+        self._slots = threading.BoundedSemaphore(self.workers * QUEUE_PER_WORKER)
+        self._executor_lock = threading.Lock()
+        self._executor = None
+        self._dummy_hash = None
+        # 在当前进程校准；进程池在首次使用时创建（模块导入期间 fork 会卡在导入锁上）
+        self.rounds = rounds or calibrate_rounds()
+        print(f"✅ 密码哈希服务已启动（bcrypt cost {self.rounds}，{self.workers} 个进程）")
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(timeout=QUEUE_TIMEOUT_SECONDS):
+            raise CredentialBusy("密码校验请求过多")
+        try:
+            try:
+                return self._get_executor().submit(func, *args).result()
+            except BrokenProcessPool:
+                # 工作进程异常退出时重建进程池并重试一次
+                with self._executor_lock:
+                    self._executor = None
+                return self._get_executor().submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash_password(self, password: str) -> str:
+        return self._run(_hash_password, password.encode('utf-8'), self.rounds)
+
+    def verify(self, password: str, stored_hash: str) -> Tuple[bool, Optional[str]]:
+        """
+        校验密码
+
+        Returns:
+            (是否通过, 新哈希)；旧格式或 cost 低于当前设置时新哈希非空，调用方应保存
+        """
+        if not stored_hash:
+            return False, None
+
+        if stored_hash.startswith('$2'):
+            ok = self._run(_check_password, password.encode('utf-8'), stored_hash.encode('ascii'))
+            if ok and self._rounds_of(stored_hash) < self.rounds:
+                return True, self.hash_password(password)
+            return ok, None
+
+        # 旧记录：无盐 sha256 或明文
+        if _SHA256_HEX.match(stored_hash):
+            candidate = hashlib.sha256(password.encode('utf-8')).hexdigest()
+        else:
+            candidate = password
+        if not hmac.compare_digest(candidate.encode('utf-8'), stored_hash.encode('utf-8')):
+            return self.reject(password)
+        return True, self.hash_password(password)
+
+    def reject(self, password: str) -> Tuple[bool, Optional[str]]:
+        """
+        用户不存在时调用：按当前 cost 做一次同样耗时的 bcrypt 校验后返回失败，
+        响应时间不会泄露用户名是否存在
+        """
+        dummy = self._dummy_hash
+        if dummy is None or self._rounds_of(dummy) != self.rounds:
+            # 第一次调用时生成随机密码的哈希，耗时与一次校验相同
+            self._dummy_hash = self.hash_password(os.urandom(16).hex())
+        else:
+            self._run(_check_password, password.encode('utf-8'), dummy.encode('ascii'))
+        return False, None
+
+    @staticmethod
+    def _rounds_of(stored_hash: str) -> int:
+        try:
+            return int(stored_hash.split('$')[2])
+        except (IndexError, ValueError):
+            return 0
+
+
+credential_service = CredentialService()
@@ -0,0 +1,107 @@
+# backend/database.py
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+from config import Config
+
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 8))
+POOL_TIMEOUT_SECONDS = float(os.getenv('DB_POOL_TIMEOUT', 10))
+
+
+def sqlite_path(uri: str) -> str:
+    """sqlite:///relative.db -> relative.db，sqlite:////abs/path.db -> /abs/path.db"""
+    prefix = 'sqlite:///'
+    if not uri.startswith(prefix):
+        raise ValueError(f"仅支持 SQLite 数据库: {uri}")
+    return uri[len(prefix):]
+
+
+class ConnectionPool:
+    """
+    SQLite 连接池
+
+    连接按需创建，最多 size 个，归还后复用，保留预编译语句缓存。
+    所有连接开启 WAL，读写互不阻塞，多个 gunicorn worker 共享同一个库文件。
+    """
+
+    def __init__(self, db_path: str, size: int = POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=POOL_TIMEOUT_SECONDS,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=256
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get(timeout=POOL_TIMEOUT_SECONDS)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """借出一个连接（自动提交模式）"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """借出一个连接并开启写事务，正常退出时提交，异常时回滚"""
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(uri: str = Config.SQLALCHEMY_DATABASE_URI) -> ConnectionPool:
+    """同一数据库在进程内共享一个连接池"""
+    path = sqlite_path(uri)
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = _pools[path] = ConnectionPool(path)
+        return pool
@@ -0,0 +1,205 @@
+# backend/document_extractor.py
+import re
+import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional
+
+# 文档类型关键词（顺序即平局时的优先级）
+DOCUMENT_TYPE_KEYWORDS = {
+    "check": ['支票', 'cheque'],
+    "invoice": ['发票', 'invoice'],
+    "receipt": ['收据', 'receipt'],
+    "id_card": ['身份证', 'id card'],
+}
+
+DOCUMENT_TYPE_CONFIDENCE = {
+    "check": "medium",
+    "invoice": "medium",
+    "receipt": "medium",
+    "id_card": "high",
+}
+
+# 其他金融相关关键词（仅用于判断是否是金融文档）
+FINANCIAL_KEYWORDS = [
+    '银行', '汇票', '账单', '金额', '合计', '总计',
+    '支付', '付款', '收款', '人民币', '美元', '欧元', '日元', '港币',
+    '护照', '驾驶证', '证件',
+    'bank', 'check', 'amount', 'total', 'payment', 'money'
+]
+
+# 相关方所在行的关键词
+PARTY_KEYWORDS = ['银行', '公司', '姓名', 'name', 'account']
+
+CURRENCY_SYMBOLS = {'¥': 'CNY', '￥': 'CNY', '人民币': 'CNY', '$': 'USD'}
+
+_NUMBER = r'\d[\d,]*(?:\.\d+)?'
+
+
+def _alternation(words: List[str]) -> str:
+    # 长词优先，避免 "check" 抢先匹配 "cheque" 之类的前缀
+    return '|'.join(re.escape(w) for w in sorted(set(words), key=len, reverse=True))
+
+
+def _build_pattern() -> re.Pattern:
+    doc_type_groups = '|'.join(
+        f'(?P<type_{doc_type}>{_alternation(words)})'
+        for doc_type, words in DOCUMENT_TYPE_KEYWORDS.items()
+    )
+    parts = [
+        # 带币种符号的金额：¥1,000.00 / $ 25 / 人民币 300
+        rf'(?P<cur>[¥￥$]|人民币)\s*(?P<cur_amount>{_NUMBER})',
+        # 带标签的金额：金额：1,000 / total: 25.00
+        rf'(?P<label>金额|合计|total|amount)\s*[:：]\s*(?P<label_amount>{_NUMBER})',
+        # 日期标签：Date: 2024 / 日期：2024（只匹配标签，日期本身由下面的分支抽取）
+        r'(?P<date_label>(?:date|日期)\s*[:：])(?=\s*\d)',
+        # 日期：2024-01-15 / 2024/1/15 / 2024.01.15 / 2024年1月15日
+        r'(?P<ymd>(?P<y1>(?:19|20)\d{2})\s*(?:[-/.]|年)\s*(?P<m1>\d{1,2})\s*(?:[-/.]|月)\s*(?P<d1>\d{1,2})日?)',
+        # 日期：15/01/2024
+        r'(?P<dmy>(?P<d2>\d{1,2})[-/](?P<m2>\d{1,2})[-/](?P<y2>(?:19|20)\d{2}))',
+        # 18 位身份证号
+        r'(?P<id_number>(?<!\d)\d{6}(?:19|20)\d{2}(?:0[1-9]|1[0-2])(?:0[1-9]|[12]\d|3[01])\d{3}[\dXx](?!\d))',
+        # 单据编号：No. 123 / 编号：123
+        r'(?P<doc_no>(?:\bno[.:]|编号[:：])\s*\w+)',
+        doc_type_groups,
+        rf'(?P<party>{_alternation(PARTY_KEYWORDS)})',
+        rf'(?P<keyword>{_alternation(FINANCIAL_KEYWORDS)})',
+    ]
+    # 先用所有分支可能的首字符做前瞻过滤，绝大多数位置无需逐个尝试分支
+    words = FINANCIAL_KEYWORDS + PARTY_KEYWORDS + [w for ws in DOCUMENT_TYPE_KEYWORDS.values() for w in ws]
+    first_chars = set(w[0] for w in words) | set('¥￥$人金合totalamountdate日期no编') | set('0123456789')
+    first_class = ''.join(sorted(re.escape(c) for c in first_chars))
+    # 文本在扫描前统一转为小写，因此无需 IGNORECASE
+    return re.compile(f'(?=[{first_class}])(?:' + '|'.join(parts) + ')')
+
+
+_PATTERN = _build_pattern()
+_TYPE_GROUPS = [f'type_{doc_type}' for doc_type in DOCUMENT_TYPE_KEYWORDS]
+
+_ID_WEIGHTS = [7, 9, 10, 5, 8, 4, 2, 1, 6, 3, 7, 9, 10, 5, 8, 4, 2]
+_ID_CHECK_CODES = '10X98765432'
+
+
+def is_valid_id_checksum(id_number: str) -> bool:
+    """校验 18 位身份证号的 ISO 7064 MOD 11-2 校验位"""
+    if len(id_number) != 18 or not id_number[:17].isdigit():
+        return False
+    total = sum(int(d) * w for d, w in zip(id_number[:17], _ID_WEIGHTS))
+    return _ID_CHECK_CODES[total % 11] == id_number[17].upper()
+
+
+def _to_decimal(raw: str) -> Optional[Decimal]:
+    try:
+        return Decimal(raw.replace(',', ''))
+    except InvalidOperation:
+        return None
+
+
+def _to_date(year: str, month: str, day: str) -> Optional[datetime.date]:
+    try:
+        return datetime.date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+
+
+class DocumentExtractor:
+    """单次扫描的金融文档抽取引擎：分类 + 金额/日期/证件号/相关方"""
+
+    def __init__(self):
+        self.pattern = _PATTERN
+
+    def extract(self, text: str) -> Dict:
+        """
+        扫描一次文本，返回带类型的抽取结果
+
+        Returns:
+            is_financial_document: bool
+            document_type / confidence: 文档类型及置信度
+            amounts: [{"value": Decimal, "currency": str|None}]
+            dates: [datetime.date]
+            id_numbers: [{"value": str, "checksum_valid": bool}]
+            parties: [str] 命中相关方关键词的整行文本
+        """
+        result = {
+            "is_financial_document": False,
+            "document_type": "unknown",
+            "confidence": "low",
+            "amounts": [],
+            "dates": [],
+            "id_numbers": [],
+            "parties": [],
+        }
+        if not text:
+            return result
+
+        type_hits = dict.fromkeys(DOCUMENT_TYPE_KEYWORDS, 0)
+        party_lines = {}
+        financial = False
+
+        lowered = text.lower()
+        # 极少数字符小写后长度会变化，此时相关方行只能从小写文本中截取
+        source = text if len(lowered) == len(text) else lowered
+
+        for match in self.pattern.finditer(lowered):
+            kind = match.lastgroup
+            if kind is None:
+                continue
+
+            if kind == 'cur_amount':
+                value = _to_decimal(match.group('cur_amount'))
+                if value is not None:
+                    result["amounts"].append({"value": value, "currency": CURRENCY_SYMBOLS[match.group('cur')]})
+                financial = True
+            elif kind == 'label_amount':
+                value = _to_decimal(match.group('label_amount'))
+                if value is not None:
+                    result["amounts"].append({"value": value, "currency": None})
+                financial = True
+            elif kind == 'ymd':
+                value = _to_date(match.group('y1'), match.group('m1'), match.group('d1'))
+                if value:
+                    result["dates"].append(value)
+            elif kind == 'dmy':
+                value = (_to_date(match.group('y2'), match.group('m2'), match.group('d2'))
+                         or _to_date(match.group('y2'), match.group('d2'), match.group('m2')))
+                if value:
+                    result["dates"].append(value)
+            elif kind == 'id_number':
+                value = match.group('id_number').upper()
+                result["id_numbers"].append({"value": value, "checksum_valid": is_valid_id_checksum(value)})
+            elif kind == 'doc_no':
+                financial = True
+            elif kind in _TYPE_GROUPS:
+                type_hits[kind[5:]] += 1
+                financial = True
+            elif kind == 'party':
+                start = lowered.rfind('\n', 0, match.start()) + 1
+                end = lowered.find('\n', match.end())
+                line = source[start:end if end != -1 else len(source)].strip()
+                party_lines.setdefault(start, line)
+                if match.group('party') == '银行':
+                    financial = True
+            elif kind in ('keyword', 'date_label'):
+                financial = True
+
+        best_type = max(type_hits, key=lambda t: type_hits[t])
+        if type_hits[best_type]:
+            result["document_type"] = best_type
+            result["confidence"] = DOCUMENT_TYPE_CONFIDENCE[best_type]
+
+        result["parties"] = list(party_lines.values())
+        result["is_financial_document"] = financial
+        return result
+
+    @staticmethod
+    def to_json(result: Dict) -> Dict:
+        """将 Decimal/date 转换为可 JSON 序列化的字符串"""
+        return {
+            **result,
+            "amounts": [
+                {"value": str(a["value"]), "currency": a["currency"]} for a in result["amounts"]
+            ],
+            "dates": [d.isoformat() for d in result["dates"]],
+        }
+
+
+document_extractor = DocumentExtractor()
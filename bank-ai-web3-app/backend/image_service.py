@@ -1,9 +1,16 @@
 import os
 import re
 import io
+import time
 from typing import Dict, List, Optional
 from PIL import Image, ImageEnhance
 import numpy as np
+from document_extractor import document_extractor, is_valid_id_checksum
+
+# 第二代居民身份证正面版面（85.6mm x 54mm），矫正后的标准尺寸及各字段的相对位置
+ID_CARD_SIZE = (856, 540)
+ID_CARD_NAME_REGION = (0.15, 0.08, 0.55, 0.22)
+ID_CARD_NUMBER_REGION = (0.30, 0.78, 0.95, 0.92)
 
 class ImageService:
     def __init__(self):
@@ -81,30 +88,52 @@ class ImageService:
             print(f"❌ 图像预处理失败: {e}")
             return image
     
-    def analyze_image(self, image_data: bytes) -> Dict[str, any]:
-        """分析图像"""
+    def decode_image(self, image_data: bytes) -> Image.Image:
+        """解码图像（只做一次，供预处理/OCR/分析共用）"""
+        image = Image.open(io.BytesIO(image_data))
+        image.load()
+        return image
+    
+    def analyze_image(self, image_data: Optional[bytes] = None, image: Optional[Image.Image] = None,
+                      timings: Optional[Dict] = None) -> Dict[str, any]:
+        """
+        分析图像
+
+        Args:
+            image_data: 原始图像字节（未提供 image 时解码）
+            image: 已解码的图像
+            timings: 可选，写入各阶段耗时（毫秒）
+        """
+        timings = timings if timings is not None else {}
         try:
-            image = Image.open(io.BytesIO(image_data))
+            if image is None:
+                start = time.perf_counter()
+                image = self.decode_image(image_data)
+                timings["decode_ms"] = round((time.perf_counter() - start) * 1000, 2)
             
-            # 预处理图像
+            # 预处理图像 + 提取文本
+            start = time.perf_counter()
             processed_image = self.preprocess_image(image)
-            
-            # 提取文本
             text = self._extract_text(processed_image)
+            timings["ocr_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            
+            start = time.perf_counter()
+            extraction = document_extractor.extract(text)
             
             result = {
                 "size": image.size,
                 "format": image.format,
                 "mode": image.mode,
                 "text_content": text,
-                "is_financial_document": self._is_financial_document(text),
+                "is_financial_document": extraction["is_financial_document"],
                 "analysis": {},
                 "preprocessed": True
             }
             
             # 如果是金融文档，进行详细分析
             if result["is_financial_document"]:
-                result["analysis"].update(self._analyze_financial_document(text))
+                result["analysis"].update(self._analyze_financial_document(text, extraction))
+            timings["analysis_ms"] = round((time.perf_counter() - start) * 1000, 2)
             
             return result
         except Exception as e:
@@ -159,127 +188,141 @@ class ImageService:
     
     def _is_financial_document(self, text: str) -> bool:
         """判断是否是金融文档"""
-        if not text:
-            return False
-        
-        text_lower = text.lower()
-        
-        # 检查金融相关关键词
-        financial_keywords = [
-            '银行', '支票', '汇票', '账单', '发票', '收据', '金额', '合计', '总计',
-            '支付', '付款', '收款', '人民币', '美元', '欧元', '日元', '港币',
-            '身份证', '护照', '驾驶证', '证件',
-            'bank', 'check', 'invoice', 'receipt', 'amount', 'total', 'payment', 'money'
-        ]
-        
-        for keyword in financial_keywords:
-            if keyword in text_lower:
-                return True
-        
-        # 检查常见的金融文档格式特征
-        patterns = [
-            r'no[.:]\s*\w+',  # No. 123
-            r'编号[:：]\s*\w+',  # 编号：123
-            r'date[:：]\s*\d',  # Date: 2024
-            r'日期[:：]\s*\d',  # 日期：2024
-            r'amount[:：]\s*[\d,]',  # Amount: 1,000
-            r'金额[:：]\s*[\d,]',  # 金额：1,000
-            r'\$\s*[\d,]+\.?\d*',  # $1,000.00
-            r'¥\s*[\d,]+\.?\d*',  # ¥1,000.00
-            r'￥\s*[\d,]+\.?\d*'  # ￥1,000.00
-        ]
-        
-        for pattern in patterns:
-            if re.search(pattern, text_lower, re.IGNORECASE):
-                return True
-        
-        return False
+        return document_extractor.extract(text)["is_financial_document"]
     
-    def _analyze_financial_document(self, text: str) -> Dict:
-        """分析金融文档"""
-        analysis = {
-            "document_type": "unknown",
-            "amounts_found": [],
-            "dates_found": [],
-            "parties_involved": [],
-            "confidence": "low"
+    def _analyze_financial_document(self, text: str, extraction: Optional[Dict] = None) -> Dict:
+        """分析金融文档（单次扫描抽取，金额/日期已规范化）"""
+        extraction = document_extractor.to_json(extraction or document_extractor.extract(text))
+        return {
+            "document_type": extraction["document_type"],
+            "amounts_found": [a["value"] for a in extraction["amounts"]],
+            "amounts": extraction["amounts"],
+            "dates_found": extraction["dates"],
+            "id_numbers_found": extraction["id_numbers"],
+            "parties_involved": extraction["parties"],
+            "confidence": extraction["confidence"]
         }
-        
-        # 尝试识别文档类型
-        if any(word in text.lower() for word in ['支票', 'cheque']):
-            analysis["document_type"] = "check"
-            analysis["confidence"] = "medium"
-        elif any(word in text.lower() for word in ['发票', 'invoice']):
-            analysis["document_type"] = "invoice"
-            analysis["confidence"] = "medium"
-        elif any(word in text.lower() for word in ['收据', 'receipt']):
-            analysis["document_type"] = "receipt"
-            analysis["confidence"] = "medium"
-        elif any(word in text.lower() for word in ['身份证', 'id card']):
-            analysis["document_type"] = "id_card"
-            analysis["confidence"] = "high"
-        
-        # 提取金额
-        amount_patterns = [
-            r'¥\s*([\d,]+\.?\d*)',
-            r'￥\s*([\d,]+\.?\d*)',
-            r'\$\s*([\d,]+\.?\d*)',
-            r'金额[:：]\s*([\d,]+\.?\d*)',
-            r'合计[:：]\s*([\d,]+\.?\d*)',
-            r'total[:：]\s*([\d,]+\.?\d*)',
-            r'amount[:：]\s*([\d,]+\.?\d*)',
-            r'人民币\s*([\d,]+\.?\d*)'
-        ]
-        
-        for pattern in amount_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            for match in matches:
-                amount = match.replace(',', '')
-                if amount:
-                    analysis["amounts_found"].append(amount)
-        
-        # 提取日期
-        date_patterns = [
-            r'\d{4}[-/]\d{1,2}[-/]\d{1,2}',  # 2024-01-15
-            r'\d{1,2}[-/]\d{1,2}[-/]\d{4}',  # 15/01/2024
-            r'日期[:：]\s*(\d{4}[-/]\d{1,2}[-/]\d{1,2})',
-            r'date[:：]\s*(\d{4}[-/]\d{1,2}[-/]\d{1,2})'
-        ]
-        
-        for pattern in date_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            analysis["dates_found"].extend(matches)
-        
-        # 提取相关方信息
-        lines = text.split('\n')
-        for line in lines:
-            if any(keyword in line for keyword in ['银行', '公司', '姓名', 'name', 'account']):
-                analysis["parties_involved"].append(line.strip())
-        
-        return analysis
     
     def validate_id_card(self, image_data: bytes) -> Dict:
-        """验证身份证"""
+        """验证身份证：优先按版面裁剪姓名/号码区域做 OCR，失败时回退到整图识别"""
         try:
             image = Image.open(io.BytesIO(image_data))
+            image.load()
+            
+            roi_result = self._validate_id_card_roi(image) if self.ocr_provider else None
+            if roi_result and roi_result["is_valid"]:
+                return roi_result
+            
             processed_image = self.preprocess_image(image)
             text = self._extract_text(processed_image)
             
             id_pattern = r'(\d{6})(19|20)(\d{2})(0[1-9]|1[0-2])(0[1-9]|[12]\d|3[01])(\d{3})(\d|X|x)'
-            id_matches = re.findall(id_pattern, text)
+            id_numbers = ["".join(match).upper() for match in re.findall(id_pattern, text)]
+            valid_numbers = [n for n in id_numbers if is_valid_id_checksum(n)]
             
             validation_result = {
-                "is_valid": bool(id_matches),
-                "id_numbers_found": ["".join(match) for match in id_matches],
+                "is_valid": bool(valid_numbers),
+                "id_numbers_found": id_numbers,
+                "checksum_valid": bool(valid_numbers),
                 "name_found": self._extract_chinese_name(text),
                 "text_content": text[:500],  # 只返回前500字符
-                "validation_method": "regex_pattern"
+                "validation_method": "regex_pattern",
+                "ocr_pixels": processed_image.size[0] * processed_image.size[1]
             }
             
             return validation_result
         except Exception as e:
             return {"error": str(e), "is_valid": False}
     
+    def _validate_id_card_roi(self, image: Image.Image) -> Optional[Dict]:
+        """版面感知识别：检测卡片四边形 → 透视矫正 → 仅识别姓名与号码区域"""
+        try:
+            card = self._rectify_id_card(image)
+            
+            name_box, id_box = ID_CARD_NAME_REGION, ID_CARD_NUMBER_REGION
+            name_crop = self._crop_relative(card, name_box)
+            id_crop = self._crop_relative(card, id_box)
+            
+            # 号码区域只允许数字和 X，单行模式
+            id_text = self.pytesseract.image_to_string(
+                id_crop,
+                lang='eng',
+                config=r'--oem 3 --psm 7 -c tessedit_char_whitelist=0123456789X'
+            )
+            id_number = re.sub(r'[^0-9X]', '', id_text.upper())
+            
+            name_text = self.pytesseract.image_to_string(
+                name_crop,
+                lang='chi_sim',
+                config=r'--oem 3 --psm 7'
+            )
+            name = ''.join(re.findall(r'[\u4e00-\u9fa5]', name_text))
+            name = name.replace('姓名', '')
+            
+            checksum_valid = is_valid_id_checksum(id_number)
+            return {
+                "is_valid": checksum_valid,
+                "id_numbers_found": [id_number] if id_number else [],
+                "checksum_valid": checksum_valid,
+                "name_found": [name] if 2 <= len(name) <= 4 else [],
+                "text_content": f"{name_text.strip()}\n{id_text.strip()}",
+                "validation_method": "roi_layout",
+                "ocr_pixels": name_crop.size[0] * name_crop.size[1] + id_crop.size[0] * id_crop.size[1]
+            }
+        except Exception as e:
+            print(f"⚠️ 身份证版面识别失败，回退整图识别: {e}")
+            return None
+    
+    def _rectify_id_card(self, image: Image.Image) -> Image.Image:
+        """将身份证矫正为标准尺寸的灰度图；无 OpenCV 或未检测到卡片时按整图处理"""
+        gray = image.convert('L')
+        width, height = ID_CARD_SIZE
+        
+        if self.opencv_available:
+            cv2 = self.cv2
+            img = np.array(gray)
+            quad = self._detect_card_quad(img)
+            if quad is not None:
+                target = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], dtype=np.float32)
+                matrix = cv2.getPerspectiveTransform(quad, target)
+                warped = cv2.warpPerspective(img, matrix, (width, height))
+                return Image.fromarray(warped)
+        
+        return gray.resize((width, height), Image.Resampling.LANCZOS)
+    
+    def _detect_card_quad(self, gray: np.ndarray) -> Optional[np.ndarray]:
+        """用 OpenCV 检测卡片四边形，返回按 左上/右上/右下/左下 排列的四个角点"""
+        cv2 = self.cv2
+        # 在缩小的图上找轮廓，再映射回原尺寸
+        scale = 800.0 / max(gray.shape[:2]) if max(gray.shape[:2]) > 800 else 1.0
+        small = cv2.resize(gray, None, fx=scale, fy=scale) if scale != 1.0 else gray
+        
+        blurred = cv2.GaussianBlur(small, (5, 5), 0)
+        edges = cv2.Canny(blurred, 50, 150)
+        edges = cv2.dilate(edges, None, iterations=1)
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        
+        min_area = 0.2 * small.shape[0] * small.shape[1]
+        for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+            if cv2.contourArea(contour) < min_area:
+                break
+            approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+            if len(approx) == 4:
+                pts = approx.reshape(4, 2).astype(np.float32) / scale
+                # 按坐标和/差排序角点
+                s = pts.sum(axis=1)
+                d = np.diff(pts, axis=1).ravel()
+                return np.array([pts[np.argmin(s)], pts[np.argmin(d)], pts[np.argmax(s)], pts[np.argmax(d)]],
+                                dtype=np.float32)
+        return None
+    
+    @staticmethod
+    def _crop_relative(image: Image.Image, box) -> Image.Image:
+        """按相对坐标 (left, top, right, bottom) 裁剪"""
+        w, h = image.size
+        left, top, right, bottom = box
+        return image.crop((int(left * w), int(top * h), int(right * w), int(bottom * h)))
+    
     def _extract_chinese_name(self, text: str) -> List[str]:
         """提取中文名字"""
         name_pattern = r'姓名[:：]?\s*([\u4e00-\u9fa5]{2,4})'
@@ -0,0 +1,304 @@
+# backend/job_service.py
+import os
+import json
+import time
+import uuid
+import heapq
+import sqlite3
+import socket
+import hashlib
+import threading
+from typing import Callable, Dict, Optional
+
+# 优先级：数值越小越先执行
+PRIORITY_INTERACTIVE = 0   # 交互式语音请求
+PRIORITY_DEFAULT = 5       # 身份证验证等普通任务
+PRIORITY_BULK = 10         # 批量 OCR / 导入
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+# 进程标识的启动随机数：pid 被新进程复用时也能区分上一次运行
+_BOOT_NONCE = uuid.uuid4().hex[:12]
+
+
+def worker_id() -> str:
+    """当前进程的任务归属标识：主机名:pid:启动随机数（fork 后 pid 不同，标识也不同）"""
+    return f"{socket.gethostname()}:{os.getpid()}:{_BOOT_NONCE}"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # 无权限等情况：进程存在
+        return True
+    return True
+
+
+def _is_orphan(owner: Optional[str], current: str) -> bool:
+    """owner 所在进程已经不在运行（本机 pid 不存在，或同一 pid 的上一次运行）"""
+    if not owner:
+        return True     # 旧版本写入的任务没有归属
+    if owner == current:
+        return False
+    host, pid, _ = owner.rsplit(':', 2)
+    current_host, current_pid, _ = current.rsplit(':', 2)
+    if host != current_host:
+        return False    # 其他主机的任务无法判断，留给 TTL 清理
+    return pid == current_pid or not _pid_alive(int(pid))
+
+
+class JobStore:
+    """基于 SQLite 的任务结果存储（带 TTL）"""
+
+    def __init__(self, db_path: str, ttl_seconds: int = 3600):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._init_schema()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                dedupe_key TEXT,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                worker TEXT,
+                owner_id INTEGER
+            )
+        """)
+        columns = [row['name'] for row in conn.execute('PRAGMA table_info(jobs)')]
+        if 'worker' not in columns:
+            conn.execute('ALTER TABLE jobs ADD COLUMN worker TEXT')
+        if 'owner_id' not in columns:
+            conn.execute('ALTER TABLE jobs ADD COLUMN owner_id INTEGER')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_dedupe ON jobs(dedupe_key)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_expires ON jobs(expires_at)')
+
+    def create(self, job_id: str, kind: str, priority: int, dedupe_key: Optional[str],
+               owner_id: Optional[int] = None):
+        now = time.time()
+        self._conn().execute(
+            'INSERT INTO jobs (id, kind, priority, status, dedupe_key, created_at, updated_at, expires_at, worker, '
+            'owner_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (job_id, kind, priority, STATUS_QUEUED, dedupe_key, now, now, now + self.ttl_seconds, worker_id(),
+             owner_id)
+        )
+
+    def find_active(self, dedupe_key: str) -> Optional[str]:
+        """查找未过期且未失败的相同任务，用于去重客户端重试"""
+        row = self._conn().execute(
+            'SELECT id FROM jobs WHERE dedupe_key = ? AND status != ? AND expires_at > ? '
+            'ORDER BY created_at DESC LIMIT 1',
+            (dedupe_key, STATUS_FAILED, time.time())
+        ).fetchone()
+        return row['id'] if row else None
+
+    def update(self, job_id: str, status: str, result=None, error: Optional[str] = None):
+        now = time.time()
+        self._conn().execute(
+            'UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?, expires_at = ? WHERE id = ?',
+            (status,
+             json.dumps(result, ensure_ascii=False) if result is not None else None,
+             error, now, now + self.ttl_seconds, job_id)
+        )
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            'SELECT * FROM jobs WHERE id = ? AND expires_at > ?', (job_id, time.time())
+        ).fetchone()
+        if not row:
+            return None
+        return {
+            "job_id": row['id'],
+            "kind": row['kind'],
+            "priority": row['priority'],
+            "status": row['status'],
+            "result": json.loads(row['result']) if row['result'] else None,
+            "error": row['error'],
+            "created_at": row['created_at'],
+            "updated_at": row['updated_at'],
+            "owner_id": row['owner_id']
+        }
+
+    def purge_expired(self) -> int:
+        cursor = self._conn().execute('DELETE FROM jobs WHERE expires_at <= ?', (time.time(),))
+        return cursor.rowcount
+
+    def fail_orphans(self) -> int:
+        """
+        进程重启后，它内存队列中的任务已丢失，将其标记为失败
+
+        只处理所属进程已经不在运行的任务；多个 worker 共用任务库时不会把其他存活进程的任务标记为失败
+        """
+        conn = self._conn()
+        current = worker_id()
+        owners = [row['worker'] for row in conn.execute(
+            'SELECT DISTINCT worker FROM jobs WHERE status IN (?, ?)', (STATUS_QUEUED, STATUS_RUNNING)
+        )]
+        orphaned = [owner for owner in owners if _is_orphan(owner, current)]
+        if not orphaned:
+            return 0
+        cursor = conn.execute(
+            'UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE status IN (?, ?) '
+            'AND (worker IS NULL OR worker IN ({}))'.format(','.join('?' * len(orphaned))),
+            (STATUS_FAILED, '服务重启，任务已中断，请重新提交', time.time(), STATUS_QUEUED, STATUS_RUNNING, *orphaned)
+        )
+        return cursor.rowcount
+
+
+class JobQueue:
+    """单机优先级任务队列：工作线程池 + SQLite 结果存储，无需外部消息代理"""
+
+    def __init__(self, db_path: Optional[str] = None, workers: Optional[int] = None,
+                 ttl_seconds: Optional[int] = None):
+        db_path = db_path or os.getenv('JOB_DB_PATH', 'jobs.db')
+        workers = workers or int(os.getenv('JOB_WORKERS', 2))
+        ttl_seconds = ttl_seconds or int(os.getenv('JOB_RESULT_TTL', 3600))
+
+        self.store = JobStore(db_path, ttl_seconds)
+        orphans = self.store.fail_orphans()
+        if orphans:
+            print(f"⚠️ {orphans} 个任务所属进程已退出，已标记为失败")
+
+        self._heap = []
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._finished = threading.Condition()
+        self._last_purge = time.time()
+        self._local = threading.local()
+
+        self._threads = []
+        for i in range(workers):
+            t = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+        print(f"✅ 任务队列已启动（{workers} 个工作线程，结果保留 {ttl_seconds} 秒）")
+
+    def submit(self, kind: str, func: Callable, *args, priority: int = PRIORITY_DEFAULT,
+               dedupe_payload: Optional[bytes] = None, owner_id: Optional[int] = None, **kwargs) -> str:
+        """
+        提交任务
+
+        Args:
+            kind: 任务类型（voice / ocr / id_card ...）
+            func: 执行函数，返回值必须可 JSON 序列化
+            priority: 优先级，数值越小越先执行
+            dedupe_payload: 用于去重的原始数据，相同数据的重复提交返回已有任务
+            owner_id: 提交任务的用户，查询接口据此只向本人返回任务
+
+        Returns:
+            任务ID
+        """
+        dedupe_key = None
+        if dedupe_payload is not None:
+            dedupe_key = self._dedupe_key(kind, dedupe_payload)
+            existing = self.store.find_active(dedupe_key)
+            if existing:
+                return existing
+
+        job_id = uuid.uuid4().hex
+        self.store.create(job_id, kind, priority, dedupe_key, owner_id)
+
+        with self._cond:
+            self._seq += 1
+            heapq.heappush(self._heap, (priority, self._seq, job_id, func, args, kwargs))
+            self._cond.notify()
+        return job_id
+
+    @staticmethod
+    def _dedupe_key(kind: str, dedupe_payload: bytes) -> str:
+        return hashlib.sha256(kind.encode() + b'\0' + dedupe_payload).hexdigest()
+
+    def find_duplicate(self, kind: str, dedupe_payload: bytes) -> Optional[str]:
+        """submit 之前查询相同数据的已有任务（提交前需要准备资源的任务使用）"""
+        return self.store.find_active(self._dedupe_key(kind, dedupe_payload))
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        return self.store.get(job_id)
+
+    def report_progress(self, progress: Dict):
+        """在任务函数内调用：更新当前任务的进度（status 仍为 running，result 为进度）"""
+        job_id = getattr(self._local, 'job_id', None)
+        if job_id:
+            self.store.update(job_id, STATUS_RUNNING, result=progress)
+
+    def wait(self, job_id: str, timeout: float = 0) -> Optional[Dict]:
+        """长轮询：等待任务完成或超时，返回当前任务状态"""
+        deadline = time.time() + max(0.0, timeout)
+        job = self.store.get(job_id)
+        while job and job['status'] in (STATUS_QUEUED, STATUS_RUNNING):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            # 其他进程提交的任务不会通知本进程，因此最多等待 0.5 秒后重新查询
+            with self._finished:
+                self._finished.wait(min(remaining, 0.5))
+            job = self.store.get(job_id)
+        return job
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                # 空闲超时后先释放条件锁再清理：清理执行 DELETE，不能挡住 submit / queue_depth
+                if not self._heap:
+                    self._cond.wait(timeout=60)
+                job = heapq.heappop(self._heap) if self._heap else None
+            if job is None:
+                self._maybe_purge()
+                continue
+            priority, _, job_id, func, args, kwargs = job
+
+            self.store.update(job_id, STATUS_RUNNING)
+            self._local.job_id = job_id
+            try:
+                result = func(*args, **kwargs)
+                self.store.update(job_id, STATUS_DONE, result=result)
+            except Exception as e:
+                print(f"❌ 任务 {job_id} 执行失败: {e}")
+                self.store.update(job_id, STATUS_FAILED, error=str(e))
+            finally:
+                self._local.job_id = None
+
+            with self._finished:
+                self._finished.notify_all()
+            self._maybe_purge()
+
+    def _maybe_purge(self):
+        if time.time() - self._last_purge < 60:
+            return
+        self._last_purge = time.time()
+        try:
+            removed = self.store.purge_expired()
+            if removed:
+                print(f"🧹 已清理 {removed} 个过期任务")
+        except Exception as e:
+            print(f"❌ 清理过期任务失败: {e}")
@@ -0,0 +1,257 @@
+# backend/ledger_rollups.py
+"""
+流水汇总的物化表（按账户 / 日 / 分类、按账户 / 月 / 分类）
+
+记账时在同一事务内增量更新，仪表盘的周 / 月 / 年汇总只读取预聚合的桶，
+耗时与桶数相关，与历史流水条数无关。
+
+校验与重建：
+    python ledger_rollups.py --verify    # 与全量重算比对
+    python ledger_rollups.py --rebuild   # 按流水全量重算
+"""
+import sys
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from database import ConnectionPool
+
+UNCATEGORIZED = '未分类'
+# 本人账户之间的转账不计入收入 / 支出
+INTERNAL_CATEGORIES = ('internal_transfer',)
+TIME_RANGES = ('week', 'month', 'year')
+SYSTEM_USER_ID = 0
+
+_TABLES = {'daily_rollups': 'day', 'monthly_rollups': 'month'}
+
+
+class LedgerRollups:
+
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+
+    def init_schema(self, conn):
+        missing = False
+        for table, period in _TABLES.items():
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone():
+                missing = True
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    account_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    {period} TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    income_minor INTEGER NOT NULL DEFAULT 0,
+                    expense_minor INTEGER NOT NULL DEFAULT 0,
+                    tx_count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (account_id, {period}, category)
+                ) WITHOUT ROWID
+            """)
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_user ON {table}(user_id, {period})')
+        if missing:
+            # 已有流水的库第一次建汇总表
+            self.rebuild(conn)
+
+    # ---------- 增量更新 ----------
+
+    def apply(self, conn, entries: Iterable[Tuple[int, int, str, Optional[str], int]], sign: int = 1):
+        """
+        在调用方的事务内累加流水
+
+        Args:
+            entries: (account_id, user_id, date, category, amount_minor)
+            sign: -1 用于撤销（删除流水或修改分类前的旧值）
+        """
+        buckets: Dict[Tuple, List[int]] = defaultdict(lambda: [0, 0, 0])
+        for account_id, user_id, day, category, amount in entries:
+            if user_id == SYSTEM_USER_ID:
+                continue
+            bucket = buckets[(account_id, user_id, day, category or UNCATEGORIZED)]
+            if amount >= 0:
+                bucket[0] += sign * amount
+            else:
+                bucket[1] += sign * -amount
+            bucket[2] += sign
+        if not buckets:
+            return
+
+        monthly: Dict[Tuple, List[int]] = defaultdict(lambda: [0, 0, 0])
+        for (account_id, user_id, day, category), values in buckets.items():
+            bucket = monthly[(account_id, user_id, day[:7], category)]
+            for i in range(3):
+                bucket[i] += values[i]
+
+        for table, period, rows in (('daily_rollups', 'day', buckets), ('monthly_rollups', 'month', monthly)):
+            conn.executemany(f"""
+                INSERT INTO {table} (account_id, user_id, {period}, category, income_minor, expense_minor, tx_count)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (account_id, {period}, category) DO UPDATE SET
+                    income_minor = income_minor + excluded.income_minor,
+                    expense_minor = expense_minor + excluded.expense_minor,
+                    tx_count = tx_count + excluded.tx_count
+            """, [(*key, *values) for key, values in rows.items()])
+
+    def apply_select(self, conn, source: str, params: Sequence = ()):
+        """
+        在调用方的事务内累加一个查询返回的流水，聚合在 SQL 中完成（批量导入使用）
+
+        Args:
+            source: 返回 account_id, user_id, date, category, amount_minor 列的 SELECT
+        """
+        for table, period, period_expr in (('daily_rollups', 'day', 'date'),
+                                           ('monthly_rollups', 'month', 'substr(date, 1, 7)')):
+            conn.execute(f"""
+                INSERT INTO {table} (account_id, user_id, {period}, category, income_minor, expense_minor, tx_count)
+                SELECT account_id, user_id, {period_expr}, COALESCE(category, '{UNCATEGORIZED}'),
+                       SUM(CASE WHEN amount_minor >= 0 THEN amount_minor ELSE 0 END),
+                       SUM(CASE WHEN amount_minor < 0 THEN -amount_minor ELSE 0 END),
+                       COUNT(*)
+                FROM ({source}) WHERE user_id != {SYSTEM_USER_ID}
+                GROUP BY 1, 2, 3, 4
+                ON CONFLICT (account_id, {period}, category) DO UPDATE SET
+                    income_minor = income_minor + excluded.income_minor,
+                    expense_minor = expense_minor + excluded.expense_minor,
+                    tx_count = tx_count + excluded.tx_count
+            """, params)
+
+    # ---------- 查询 ----------
+
+    @staticmethod
+    def period_bounds(time_range: str, today: Optional[date] = None) -> Tuple[date, date]:
+        """本周（周一起）、本月、本年，截止到今天"""
+        today = today or date.today()
+        if time_range == 'week':
+            return today - timedelta(days=today.weekday()), today
+        if time_range == 'month':
+            return today.replace(day=1), today
+        if time_range == 'year':
+            return today.replace(month=1, day=1), today
+        raise ValueError(f"timeRange 只支持 {'/'.join(TIME_RANGES)}")
+
+    def summary(self, user_id: int, time_range: str = 'month', account_id: Optional[int] = None,
+                today: Optional[date] = None) -> Dict:
+        """
+        收支汇总：合计、按分类、按时间序列（周 / 月按日，年按月）
+
+        金额为整数分，支出为正数
+        """
+        start, end = self.period_bounds(time_range, today)
+        if time_range == 'year':
+            table, period, lower, upper = 'monthly_rollups', 'month', start.isoformat()[:7], end.isoformat()[:7]
+        else:
+            table, period, lower, upper = 'daily_rollups', 'day', start.isoformat(), end.isoformat()
+
+        if account_id is not None:
+            where, params = f'account_id = ? AND {period} BETWEEN ? AND ?', [account_id, lower, upper]
+        else:
+            where, params = f'user_id = ? AND {period} BETWEEN ? AND ?', [user_id, lower, upper]
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                f'SELECT {period} AS period, category, SUM(income_minor) AS income, SUM(expense_minor) AS expense, '
+                f'SUM(tx_count) AS count FROM {table} WHERE {where} GROUP BY {period}, category',
+                params
+            ).fetchall()
+
+        categories: Dict[str, Dict] = {}
+        series: Dict[str, Dict] = {}
+        income = expense = 0
+        for row in rows:
+            if row['category'] in INTERNAL_CATEGORIES:
+                continue
+            income += row['income']
+            expense += row['expense']
+            cat = categories.setdefault(row['category'], {"category": row['category'], "income": 0, "expense": 0,
+                                                          "count": 0})
+            cat["income"] += row['income']
+            cat["expense"] += row['expense']
+            cat["count"] += row['count']
+            point = series.setdefault(row['period'], {"period": row['period'], "income": 0, "expense": 0})
+            point["income"] += row['income']
+            point["expense"] += row['expense']
+
+        return {
+            "timeRange": time_range,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "income": income,
+            "expense": expense,
+            "categories": sorted(categories.values(), key=lambda c: c["expense"], reverse=True),
+            "series": [series[key] for key in sorted(series)]
+        }
+
+    def month_totals_by_account(self, user_id: int, month: str) -> Dict[int, Dict]:
+        """{account_id: {"income": 分, "expense": 分}}"""
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                'SELECT account_id, SUM(income_minor) AS income, SUM(expense_minor) AS expense '
+                'FROM monthly_rollups WHERE user_id = ? AND month = ? AND category NOT IN ({}) '
+                'GROUP BY account_id'.format(','.join('?' * len(INTERNAL_CATEGORIES))),
+                (user_id, month, *INTERNAL_CATEGORIES)
+            ).fetchall()
+        return {row['account_id']: {"income": row['income'], "expense": row['expense']} for row in rows}
+
+    # ---------- 重建与校验 ----------
+
+    @staticmethod
+    def _recompute_sql(period_expr: str) -> str:
+        return f"""
+            SELECT account_id, user_id, {period_expr} AS period, COALESCE(category, '{UNCATEGORIZED}') AS category,
+                   SUM(CASE WHEN amount_minor >= 0 THEN amount_minor ELSE 0 END) AS income_minor,
+                   SUM(CASE WHEN amount_minor < 0 THEN -amount_minor ELSE 0 END) AS expense_minor,
+                   COUNT(*) AS tx_count
+            FROM transactions WHERE user_id != {SYSTEM_USER_ID}
+            GROUP BY account_id, user_id, period, COALESCE(category, '{UNCATEGORIZED}')
+        """
+
+    def rebuild(self, conn=None):
+        """按流水全量重算汇总表"""
+        if conn is None:
+            with self.pool.transaction() as conn:
+                return self.rebuild(conn)
+        for table, period_expr in (('daily_rollups', 'date'), ('monthly_rollups', 'substr(date, 1, 7)')):
+            conn.execute(f'DELETE FROM {table}')
+            conn.execute(f'INSERT INTO {table} {self._recompute_sql(period_expr)}')
+
+    def verify(self) -> List[str]:
+        """与全量重算比对，返回不一致项的描述（为空表示一致）"""
+        problems = []
+        with self.pool.connection() as conn:
+            conn.execute('BEGIN')  # 同一个读快照
+            for table, period, period_expr in (('daily_rollups', 'day', 'date'),
+                                               ('monthly_rollups', 'month', 'substr(date, 1, 7)')):
+                rows = conn.execute(f"""
+                    WITH expected AS ({self._recompute_sql(period_expr)})
+                    SELECT e.account_id, e.period, e.category FROM expected e
+                    LEFT JOIN {table} r ON r.account_id = e.account_id AND r.{period} = e.period
+                                        AND r.category = e.category
+                    WHERE r.account_id IS NULL OR r.income_minor != e.income_minor
+                       OR r.expense_minor != e.expense_minor OR r.tx_count != e.tx_count
+                    UNION ALL
+                    SELECT r.account_id, r.{period}, r.category FROM {table} r
+                    LEFT JOIN expected e ON r.account_id = e.account_id AND r.{period} = e.period
+                                         AND r.category = e.category
+                    WHERE e.account_id IS NULL AND (r.income_minor != 0 OR r.expense_minor != 0 OR r.tx_count != 0)
+                """).fetchall()
+                problems += [f"{table}: 账户 {r[0]} {r[1]} {r[2]}" for r in rows]
+            rows = conn.execute("""
+                SELECT a.id FROM accounts a
+                WHERE a.balance_minor != (SELECT COALESCE(SUM(amount_minor), 0) FROM transactions WHERE account_id = a.id)
+            """).fetchall()
+            problems += [f"accounts: 账户 {r[0]} 余额与流水合计不一致" for r in rows]
+            conn.rollback()
+        return problems
+
+
+if __name__ == '__main__':
+    from ledger_store import ledger_store
+
+    rollups = ledger_store.rollups
+    if '--rebuild' in sys.argv:
+        rollups.rebuild()
+        print("✅ 汇总表已按流水重算")
+    problems = rollups.verify()
+    for problem in problems:
+        print(f"❌ {problem}")
+    print("✅ 汇总表与流水一致" if not problems else f"共 {len(problems)} 处不一致")
+    sys.exit(1 if problems else 0)
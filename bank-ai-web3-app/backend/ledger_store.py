@@ -0,0 +1,429 @@
+# backend/ledger_store.py
+import base64
+import random
+import sqlite3
+import time
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+from typing import Dict, List, Optional, Tuple
+
+from database import ConnectionPool, get_pool
+from ledger_rollups import LedgerRollups
+
+# 列表接口只返回这些列
+TRANSACTION_COLUMNS = 'id, account_id, date, amount_minor, type, description, counterparty, status'
+# 二元组索引每个字段拆分的最大字符数
+BIGRAM_MAX_CHARS = 1000
+# 两字词的命中数低于此值时从索引命中集合出发查询；更常见的词按日期顺序扫描、子串过滤，很快就能凑满一页
+BIGRAM_SELECTIVE_HITS = 2000
+
+
+def to_minor(amount) -> int:
+    """金额转为整数分，按四舍五入保留两位小数"""
+    try:
+        value = Decimal(str(amount)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"无效金额: {amount}")
+    return int(value * 100)
+
+
+def from_minor(amount_minor: int) -> float:
+    return amount_minor / 100
+
+
+def encode_cursor(date: str, tx_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{date}|{tx_id}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        date, tx_id = raw.split('|')
+        return date, int(tx_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("无效的分页游标")
+
+
+def serialize_transaction(row) -> Dict:
+    return {
+        "id": row['id'],
+        "accountId": row['account_id'],
+        "date": row['date'],
+        "amount": from_minor(row['amount_minor']),
+        "type": row['type'],
+        "description": row['description'],
+        "counterparty": row['counterparty'],
+        "status": row['status']
+    }
+
+
+def serialize_account(row) -> Dict:
+    return {
+        "id": row['id'],
+        "userId": row['user_id'],
+        "accountNumber": row['account_number'],
+        "type": row['type'],
+        "currency": row['currency'],
+        "balance": from_minor(row['balance_minor'])
+    }
+
+
+class LedgerStore:
+    """
+    账户与交易流水存储
+
+    - 金额以整数分存储
+    - (account_id, date, id) 与 (user_id, date, id) 复合索引，
+      历史记录按游标（keyset）分页，翻到多深都只扫描一页的数据
+    - 按日 / 月 / 分类的汇总表（rollups）随流水写入增量更新
+    """
+
+    def __init__(self, pool: Optional[ConnectionPool] = None):
+        self.pool = pool or get_pool()
+        self.rollups = LedgerRollups(self.pool)
+        self._init_schema()
+
+    def _init_schema(self):
+        with self.pool.connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS accounts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    account_number TEXT NOT NULL UNIQUE,
+                    type TEXT NOT NULL,
+                    currency TEXT NOT NULL DEFAULT 'CNY',
+                    balance_minor INTEGER NOT NULL DEFAULT 0,
+                    created_at TEXT NOT NULL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_accounts_user ON accounts(user_id)')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS transactions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    account_id INTEGER NOT NULL REFERENCES accounts(id),
+                    user_id INTEGER NOT NULL,
+                    date TEXT NOT NULL,
+                    amount_minor INTEGER NOT NULL,
+                    type TEXT NOT NULL,
+                    category TEXT,
+                    description TEXT NOT NULL DEFAULT '',
+                    counterparty TEXT,
+                    status TEXT NOT NULL DEFAULT 'success',
+                    journal_id TEXT,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_tx_account_date ON transactions(account_id, date, id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_tx_user_date ON transactions(user_id, date, id)')
+            self._init_search_index(conn)
+            self._init_bigram_index(conn)
+            self.rollups.init_schema(conn)
+
+    def _init_search_index(self, conn):
+        """描述 / 对方户名的全文索引（trigram 分词，中英文都按子串匹配），由触发器与流水表同步"""
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transactions_fts'"
+        ).fetchone()
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+                description, counterparty,
+                content='transactions', content_rowid='id', tokenize='trigram'
+            )
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions BEGIN
+                INSERT INTO transactions_fts (rowid, description, counterparty)
+                VALUES (new.id, new.description, new.counterparty);
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN
+                INSERT INTO transactions_fts (transactions_fts, rowid, description, counterparty)
+                VALUES ('delete', old.id, old.description, old.counterparty);
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS transactions_fts_update AFTER UPDATE OF description, counterparty
+            ON transactions BEGIN
+                INSERT INTO transactions_fts (transactions_fts, rowid, description, counterparty)
+                VALUES ('delete', old.id, old.description, old.counterparty);
+                INSERT INTO transactions_fts (rowid, description, counterparty)
+                VALUES (new.id, new.description, new.counterparty);
+            END
+        """)
+        if not exists:
+            # 已有流水的库第一次建索引
+            conn.execute("INSERT INTO transactions_fts (transactions_fts) VALUES ('rebuild')")
+
+    def _init_bigram_index(self, conn):
+        """
+        两个字符的关键词（如两个汉字）用的二元组索引：trigram 索引至少要 3 个字符
+
+        触发器把描述和对方户名拆成相互重叠的 2 字符片段（“美团外卖” → “美团 团外 外卖”），
+        写入无内容的 FTS5 表；每个字段只拆前 BIGRAM_MAX_CHARS 个字符
+        """
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transactions_bigram'"
+        ).fetchone()
+        conn.execute('CREATE TABLE IF NOT EXISTS search_positions (n INTEGER PRIMARY KEY)')
+        conn.execute("""
+            INSERT OR IGNORE INTO search_positions (n)
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < ?)
+            SELECT n FROM seq
+        """, (BIGRAM_MAX_CHARS,))
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS transactions_bigram USING fts5(
+                grams, content='', tokenize='unicode61 remove_diacritics 0'
+            )
+        """)
+        new_grams, old_grams = _bigrams_sql('new'), _bigrams_sql('old')
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS transactions_bigram_insert AFTER INSERT ON transactions BEGIN
+                INSERT INTO transactions_bigram (rowid, grams) VALUES (new.id, {new_grams});
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS transactions_bigram_delete AFTER DELETE ON transactions BEGIN
+                INSERT INTO transactions_bigram (transactions_bigram, rowid, grams)
+                VALUES ('delete', old.id, {old_grams});
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS transactions_bigram_update AFTER UPDATE OF description, counterparty
+            ON transactions BEGIN
+                INSERT INTO transactions_bigram (transactions_bigram, rowid, grams)
+                VALUES ('delete', old.id, {old_grams});
+                INSERT INTO transactions_bigram (rowid, grams) VALUES (new.id, {new_grams});
+            END
+        """)
+        if not exists:
+            conn.execute(f'INSERT INTO transactions_bigram (rowid, grams) SELECT id, {_bigrams_sql("transactions")} '
+                         'FROM transactions')
+
+    def seed_demo_data(self, user_id: int):
+        """演示账号首次启动时写入两个账户和几条流水（期初余额使余额等于流水合计）"""
+        with self.pool.transaction() as conn:
+            if conn.execute('SELECT 1 FROM accounts WHERE user_id = ?', (user_id,)).fetchone():
+                return
+            demo_accounts = [
+                ("6226000011112222", "储蓄卡", [
+                    ("2026-01-01", 1705000, "income", "期初余额"),
+                    ("2026-01-08", -35000, "expense", "餐饮消费"),
+                    ("2026-01-10", -120000, "expense", "房租支出"),
+                    ("2026-01-15", 450000, "income", "工资收入"),
+                ]),
+                ("6226000033334444", "理财账户", [
+                    ("2026-01-01", 4915000, "income", "期初余额"),
+                    ("2026-01-05", 85000, "income", "股票收益"),
+                ]),
+            ]
+            for account_number, account_type, entries in demo_accounts:
+                account_id = conn.execute(
+                    'INSERT INTO accounts (user_id, account_number, type, balance_minor, created_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (user_id, account_number, account_type, sum(e[1] for e in entries), '2026-01-01T00:00:00Z')
+                ).lastrowid
+                conn.executemany(
+                    'INSERT INTO transactions (account_id, user_id, date, amount_minor, type, description, created_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    [(account_id, user_id, date, amount, tx_type, description, time.time())
+                     for date, amount, tx_type, description in entries]
+                )
+                self.rollups.apply(conn, [(account_id, user_id, date, None, amount)
+                                          for date, amount, _, _ in entries])
+
+    def open_account(self, user_id: int, account_type: str = '储蓄卡', currency: str = 'CNY') -> Dict:
+        """开立新账户，卡号冲突时重新生成"""
+        created_at = datetime.utcnow().isoformat() + 'Z'
+        with self.pool.connection() as conn:
+            while True:
+                account_number = f"62260000{random.randint(10000000, 99999999)}"
+                try:
+                    cursor = conn.execute(
+                        'INSERT INTO accounts (user_id, account_number, type, currency, created_at) '
+                        'VALUES (?, ?, ?, ?, ?)',
+                        (user_id, account_number, account_type, currency, created_at)
+                    )
+                    break
+                except sqlite3.IntegrityError:
+                    continue
+            row = conn.execute('SELECT * FROM accounts WHERE id = ?', (cursor.lastrowid,)).fetchone()
+        return serialize_account(row)
+
+    def get_accounts(self, user_id: int) -> List[Dict]:
+        with self.pool.connection() as conn:
+            rows = conn.execute('SELECT * FROM accounts WHERE user_id = ? ORDER BY id', (user_id,)).fetchall()
+        return [serialize_account(row) for row in rows]
+
+    def get_account(self, account_id: int, user_id: int) -> Optional[Dict]:
+        """只返回属于该用户的账户"""
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                'SELECT * FROM accounts WHERE id = ? AND user_id = ?', (account_id, user_id)
+            ).fetchone()
+        return serialize_account(row) if row else None
+
+    def list_transactions(self, user_id: int, account_id: Optional[int] = None, limit: int = 50,
+                          cursor: Optional[str] = None, offset: int = 0) -> Tuple[List[Dict], Optional[str]]:
+        """
+        按日期倒序分页查询流水
+
+        Args:
+            account_id: 为空时查询该用户的所有账户
+            cursor: 上一页返回的 next_cursor；优先于 offset
+            offset: 兼容旧的偏移分页，翻页越深越慢
+
+        Returns:
+            (流水列表, 下一页游标)；没有更多数据时游标为 None
+        """
+        if account_id is not None:
+            # 账户归属由调用方校验（get_account），这里只按账户索引查询
+            where, params = 'account_id = ?', [account_id]
+        else:
+            where, params = 'user_id = ?', [user_id]
+
+        if cursor:
+            date, tx_id = decode_cursor(cursor)
+            where += ' AND (date, id) < (?, ?)'
+            params += [date, tx_id]
+            offset = 0
+
+        sql = (f'SELECT {TRANSACTION_COLUMNS} FROM transactions WHERE {where} '
+               f'ORDER BY date DESC, id DESC LIMIT ? OFFSET ?')
+        params += [limit + 1, max(0, offset)]
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['date'], rows[-1]['id'])
+        return [serialize_transaction(row) for row in rows], next_cursor
+
+    def search_transactions(self, user_id: int, query: str = '', account_id: Optional[int] = None,
+                            min_amount: Optional[int] = None, max_amount: Optional[int] = None,
+                            date_from: Optional[str] = None, date_to: Optional[str] = None,
+                            limit: int = 50, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        搜索流水
+
+        关键词按空格拆分，全部命中才返回；不少于 3 个字符的词走 trigram 全文索引，
+        两个字母 / 数字 / 汉字的词命中较少时走二元组索引，从命中集合出发；其余更短的词（单字、含标点、
+        很常见的两字词）在索引结果或账户流水上按日期顺序做子串过滤。
+        金额按绝对值（分）过滤，日期为 YYYY-MM-DD 闭区间。
+        """
+        terms = query.split()
+        indexed = [t for t in terms if len(t) >= 3]
+        bigrams = [t for t in terms if len(t) == 2 and t.isalnum()]
+        short = [t for t in terms if len(t) < 3 and t not in bigrams]
+
+        columns = ', '.join(f't.{c.strip()}' for c in TRANSACTION_COLUMNS.split(','))
+        sql = f'SELECT {columns} FROM transactions t'
+        conditions, params = [], []
+        bigram_match = ' AND '.join(f'"{t}"' for t in bigrams)
+        if bigrams and not self._bigram_selective(bigram_match):
+            short += bigrams
+            bigrams = []
+        if indexed:
+            # 命中集合只计算一次；直接 JOIN 时规划器会对日期范围内的每一行重复扫描全文索引
+            conditions.append('t.id IN (SELECT rowid FROM transactions_fts WHERE transactions_fts MATCH ?)')
+            params.append(' AND '.join('"' + t.replace('"', '""') + '"' for t in indexed))
+        if bigrams:
+            conditions.append('t.id IN (SELECT rowid FROM transactions_bigram WHERE transactions_bigram MATCH ?)')
+            params.append(bigram_match)
+
+        # 命中集合很小时用 + 屏蔽账户 / 用户索引，让规划器从命中集合出发，而不是按日期逐行探测集合
+        hint = '+' if bigrams else ''
+        if account_id is not None:
+            conditions.append(f'{hint}t.account_id = ?')
+            params.append(account_id)
+        else:
+            conditions.append(f'{hint}t.user_id = ?')
+            params.append(user_id)
+
+        for term in short:
+            escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            conditions.append("(t.description LIKE ? ESCAPE '\\' OR t.counterparty LIKE ? ESCAPE '\\')")
+            params += [f'%{escaped}%', f'%{escaped}%']
+        if min_amount is not None:
+            conditions.append('abs(t.amount_minor) >= ?')
+            params.append(min_amount)
+        if max_amount is not None:
+            conditions.append('abs(t.amount_minor) <= ?')
+            params.append(max_amount)
+        if date_from:
+            conditions.append('t.date >= ?')
+            params.append(date_from)
+        if date_to:
+            conditions.append('t.date <= ?')
+            params.append(date_to)
+        if cursor:
+            date, tx_id = decode_cursor(cursor)
+            conditions.append('(t.date, t.id) < (?, ?)')
+            params += [date, tx_id]
+
+        sql += ' WHERE ' + ' AND '.join(conditions) + ' ORDER BY t.date DESC, t.id DESC LIMIT ?'
+        params.append(limit + 1)
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['date'], rows[-1]['id'])
+
+        results = []
+        for row in rows:
+            item = serialize_transaction(row)
+            if terms:
+                item["highlights"] = {
+                    field: spans for field in ('description', 'counterparty')
+                    if (spans := _match_spans(row[field], terms))
+                }
+            results.append(item)
+        return results, next_cursor
+
+    def _bigram_selective(self, match: str) -> bool:
+        """两字词在全库的命中数是否低于 BIGRAM_SELECTIVE_HITS（只数到上限为止）"""
+        with self.pool.connection() as conn:
+            hits = conn.execute(
+                'SELECT COUNT(*) FROM (SELECT rowid FROM transactions_bigram WHERE transactions_bigram MATCH ? LIMIT ?)',
+                (match, BIGRAM_SELECTIVE_HITS)
+            ).fetchone()[0]
+        return hits < BIGRAM_SELECTIVE_HITS
+
+
+def _bigrams_sql(row: str) -> str:
+    """触发器中把 row 的描述和对方户名拆成空格分隔的重叠 2 字符片段的 SQL 表达式"""
+    return ' || \' \' || '.join(
+        f"coalesce((SELECT group_concat(substr({row}.{field}, n, 2), ' ') FROM search_positions "
+        f"WHERE n < length({row}.{field})), '')"
+        for field in ('description', 'counterparty')
+    )
+
+
+def _match_spans(text: Optional[str], terms: List[str]) -> List[List[int]]:
+    """关键词在文本中出现的位置 [起, 止)，忽略大小写，重叠的区间合并"""
+    if not text:
+        return []
+    lowered = text.lower()
+    spans = []
+    for term in terms:
+        term = term.lower()
+        start = lowered.find(term)
+        while start != -1:
+            spans.append([start, start + len(term)])
+            start = lowered.find(term, start + 1)
+    spans.sort()
+    merged = []
+    for span in spans:
+        if merged and span[0] <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], span[1])
+        else:
+            merged.append(span)
+    return merged
+
+
+ledger_store = LedgerStore()
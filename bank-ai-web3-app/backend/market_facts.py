@@ -0,0 +1,332 @@
+# backend/market_facts.py
+"""
+汇率与市场数据
+
+- 数据来自本地 JSON 文件（MARKET_FACTS_PATH）或行情源（MARKET_FACTS_URL，返回同样格式的 JSON）
+- 加载后构建不可变快照：币种两两之间的汇率矩阵 + 利率等事实，查询只是两次下标访问
+- 后台线程定期检查来源，有变化时构建新快照并整体替换引用；读路径不加锁，
+  同一次查询先取一次快照引用，不会读到新旧混合的数据
+- 聊天回复、RAG 上下文和 /api/rates 都从这里读取
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+import urllib.request
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+FACTS_PATH = os.getenv('MARKET_FACTS_PATH') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'rag', 'knowledge_base', 'market_facts.json')
+FACTS_URL = os.getenv('MARKET_FACTS_URL', '')
+REFRESH_SECONDS = float(os.getenv('MARKET_FACTS_REFRESH', 60))
+FEED_TIMEOUT_SECONDS = 5
+
+# 问汇率但没有说币种时展示的币种
+DEFAULT_CURRENCIES = ('USD', 'EUR')
+# 币种名称与别名（中文 / 英文），英文别名不区分大小写
+CURRENCY_NAMES = {
+    'CNY': ('人民币', 'Chinese Yuan', ('人民币', 'rmb', 'yuan', 'renminbi')),
+    'USD': ('美元', 'US Dollar', ('美元', '美金', 'us dollar', 'dollar')),
+    'EUR': ('欧元', 'Euro', ('欧元', 'euro')),
+    'JPY': ('日元', 'Japanese Yen', ('日元', '日圆', 'yen')),
+    'GBP': ('英镑', 'British Pound', ('英镑', 'pound', 'sterling')),
+    'HKD': ('港币', 'Hong Kong Dollar', ('港币', '港元', 'hong kong dollar')),
+    'CAD': ('加元', 'Canadian Dollar', ('加元', '加拿大元', 'canadian dollar')),
+    'AUD': ('澳元', 'Australian Dollar', ('澳元', '澳大利亚元', 'australian dollar')),
+    'CHF': ('瑞士法郎', 'Swiss Franc', ('瑞士法郎', '瑞郎', 'swiss franc')),
+}
+
+
+def _alias_pattern(alias: str) -> str:
+    # 英文别名前后不能紧挨字母（中文字符在正则里也算 \w，不能用 \b）
+    if alias.isascii():
+        return rf'(?<![A-Za-z]){re.escape(alias)}s?(?![A-Za-z])'
+    return re.escape(alias)
+
+
+_ALIASES = sorted(((alias, code) for code, (_, _, aliases) in CURRENCY_NAMES.items() for alias in aliases),
+                  key=lambda item: -len(item[0]))
+_ALIAS_CODES = {alias: code for alias, code in _ALIASES}
+# 别名长的优先匹配（hong kong dollar 先于 dollar），最后是三个字母的币种代码
+_CURRENCY_RE = re.compile(
+    '|'.join(_alias_pattern(alias) for alias, _ in _ALIASES) + r'|(?<![A-Za-z])[A-Za-z]{3}(?![A-Za-z])',
+    re.IGNORECASE
+)
+_AMOUNT_RE = re.compile(r'(\d[\d,]*(?:\.\d+)?)\s*(万|千|k)?\s*$', re.IGNORECASE)
+# 不含「多少钱」：「100美元的手续费是多少钱」问的是费用，不是换算
+_FX_WORDS = ('汇率', '兑', '换', '等于', '合多少')
+_FX_WORDS_EN = ('exchange', 'convert', ' fx ', ' to ', 'how much', 'worth')
+_RATE_RE = re.compile(r'(?<![a-z])rates?(?![a-z])')
+
+
+@dataclass(frozen=True)
+class RatesSnapshot:
+    """某一时刻的全部数据；构建后不再修改，可以在线程之间随意共享"""
+    version: int
+    digest: str
+    as_of: str
+    source: str
+    base: str
+    codes: Tuple[str, ...]
+    index: Mapping[str, int]
+    # matrix[i][j]：1 单位 codes[i] 折合多少 codes[j]
+    matrix: Tuple[Tuple[float, ...], ...]
+    facts: Mapping[str, Mapping]
+    loaded_at: float
+
+    def rate(self, source: str, target: str) -> float:
+        try:
+            return self.matrix[self.index[source]][self.index[target]]
+        except KeyError as e:
+            raise ValueError(f"不支持的币种: {e.args[0]}")
+
+    def convert(self, amount: float, source: str, target: str) -> float:
+        return amount * self.rate(source, target)
+
+    def fact(self, key: str) -> Optional[Mapping]:
+        return self.facts.get(key)
+
+    def group(self, group: str) -> List[Mapping]:
+        return [fact for fact in self.facts.values() if fact['group'] == group]
+
+
+def build_snapshot(raw: bytes, version: int = 1) -> RatesSnapshot:
+    """解析并校验数据文件；格式不对时抛出 ValueError，调用方保留旧快照"""
+    try:
+        data = json.loads(raw)
+        base = str(data.get('base', 'CNY')).upper()
+        rates = {str(code).upper(): float(value) for code, value in data['rates'].items()}
+    except (KeyError, TypeError, AttributeError, json.JSONDecodeError) as e:
+        raise ValueError(f"数据格式错误: {e}")
+    rates.setdefault(base, 1.0)
+    if rates[base] != 1.0:
+        raise ValueError(f"基准币种 {base} 的汇率必须为 1")
+    bad = [code for code, value in rates.items() if not math.isfinite(value) or value <= 0]
+    if bad:
+        raise ValueError(f"汇率无效: {', '.join(bad)}")
+
+    codes = (base,) + tuple(code for code in rates if code != base)
+    per_base = [rates[code] for code in codes]
+    matrix = tuple(tuple(a / b for b in per_base) for a in per_base)
+
+    facts = {}
+    for item in data.get('facts', []):
+        try:
+            fact = {
+                "key": str(item['key']),
+                "group": str(item.get('group', '')),
+                "name": str(item['name']),
+                "name_en": str(item.get('name_en') or item['name']),
+                "value": float(item['value']),
+                "max": float(item['max']) if item.get('max') is not None else None,
+                "unit": str(item.get('unit', ''))
+            }
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"事实数据格式错误: {item!r} ({e})")
+        facts[fact['key']] = MappingProxyType(fact)
+
+    return RatesSnapshot(
+        version=version,
+        digest=hashlib.blake2b(raw, digest_size=8).hexdigest(),
+        as_of=str(data.get('as_of', '')),
+        source=str(data.get('source', '')),
+        base=base,
+        codes=codes,
+        index=MappingProxyType({code: i for i, code in enumerate(codes)}),
+        matrix=matrix,
+        facts=MappingProxyType(facts),
+        loaded_at=time.time()
+    )
+
+
+def currency_name(code: str, lang: str = 'zh') -> str:
+    names = CURRENCY_NAMES.get(code)
+    if not names:
+        return code
+    return names[0] if lang == 'zh' else names[1]
+
+
+def format_rate(value: float) -> str:
+    return f"{value:.4f}" if value >= 0.1 else f"{value:.6f}"
+
+
+def format_fact(fact: Mapping) -> str:
+    value = f"{fact['value']:.2f}{fact['unit']}"
+    if fact['max'] is not None:
+        value = f"{fact['value']:.2f}{fact['unit']}–{fact['max']:.2f}{fact['unit']}"
+    return value
+
+
+class MarketFacts:
+    """汇率与市场数据服务，持有当前快照并负责刷新"""
+
+    def __init__(self, path: str = FACTS_PATH, url: str = FACTS_URL, refresh_seconds: float = REFRESH_SECONDS):
+        self.path = path
+        self.url = url
+        self.refresh_seconds = refresh_seconds
+        self._refresh_lock = threading.Lock()
+        self._snapshot = build_snapshot(b'{"rates": {}}', version=0)
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"❌ 市场数据加载失败: {e}")
+        if refresh_seconds > 0:
+            threading.Thread(target=self._run_refresher, name='market-facts', daemon=True).start()
+
+    @property
+    def snapshot(self) -> RatesSnapshot:
+        return self._snapshot
+
+    def rate(self, source: str, target: str) -> float:
+        return self._snapshot.rate(source, target)
+
+    def convert(self, amount: float, source: str, target: str) -> float:
+        return self._snapshot.convert(amount, source, target)
+
+    # ---------- 刷新 ----------
+
+    def refresh(self) -> bool:
+        """从来源重新加载；内容有变化（按摘要比较）并通过校验时替换快照，返回是否替换"""
+        with self._refresh_lock:
+            raw = self._read_feed() if self.url else self._read_file()
+            current = self._snapshot
+            if hashlib.blake2b(raw, digest_size=8).hexdigest() == current.digest:
+                return False
+            snapshot = build_snapshot(raw, version=current.version + 1)
+            # 引用赋值是原子的：读方要么拿到旧快照，要么拿到完整的新快照
+            self._snapshot = snapshot
+        print(f"✅ 市场数据已更新：{len(snapshot.codes)} 个币种，{len(snapshot.facts)} 条利率数据，"
+              f"数据日期 {snapshot.as_of or '未知'}")
+        return True
+
+    def _read_file(self) -> bytes:
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def _read_feed(self) -> bytes:
+        with urllib.request.urlopen(self.url, timeout=FEED_TIMEOUT_SECONDS) as response:
+            return response.read()
+
+    def _run_refresher(self):
+        while True:
+            time.sleep(self.refresh_seconds)
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"❌ 市场数据刷新失败，继续使用 {self._snapshot.as_of or '当前'} 的数据: {e}")
+
+    # ---------- 问答 ----------
+
+    @staticmethod
+    def _mentions(text: str, snapshot: RatesSnapshot) -> List[Tuple[str, int]]:
+        """文本中提到的币种（按出现顺序去重）及其位置"""
+        found = []
+        seen = set()
+        for match in _CURRENCY_RE.finditer(text):
+            word = match.group(0).lower().rstrip('s') if match.group(0).isascii() else match.group(0)
+            code = _ALIAS_CODES.get(word) or _ALIAS_CODES.get(match.group(0).lower()) or match.group(0).upper()
+            if code in snapshot.index and code not in seen:
+                seen.add(code)
+                found.append((code, match.start()))
+        return found
+
+    def answer(self, message: str, lang: str = 'zh') -> Optional[str]:
+        """
+        用当前数据回答汇率换算、汇率和存款利率问题
+
+        Returns:
+            回复文本；不是这类问题或数据缺失时返回 None
+        """
+        snapshot = self._snapshot
+        lower = message.lower()
+        mentions = self._mentions(message, snapshot)
+        base = snapshot.base
+        as_of = f"（{snapshot.source}，{snapshot.as_of}）" if lang == 'zh' else f" (as of {snapshot.as_of})"
+
+        asks_fx = ('汇率' in message or 'exchange rate' in lower
+                   or (mentions and any(word in message for word in _FX_WORDS))
+                   or (mentions and any(word in f" {lower} " for word in _FX_WORDS_EN))
+                   or (mentions and _RATE_RE.search(lower)
+                       and not any(word in lower for word in ('interest', 'deposit', 'loan', 'mortgage'))))
+        if asks_fx and len(snapshot.codes) > 1:
+            if mentions:
+                code, start = mentions[0]
+                amount = _AMOUNT_RE.search(message[:start])
+                if amount:
+                    value = float(amount.group(1).replace(',', ''))
+                    value *= {'万': 10000, '千': 1000, 'k': 1000}.get((amount.group(2) or '').lower(), 1)
+                    target = mentions[1][0] if len(mentions) > 1 else (base if code != base else 'USD')
+                    if target in snapshot.index:
+                        return self._conversion_text(snapshot, value, code, target, lang)
+                if len(mentions) > 1:
+                    # 问两种货币之间的汇率时直接给交叉汇率
+                    pair = (code, mentions[1][0])
+                    return self._rates_text(snapshot, [pair], lang) + as_of + self._fx_disclaimer(lang)
+
+            foreign = [code for code, _ in mentions if code != base] or \
+                [code for code in DEFAULT_CURRENCIES if code in snapshot.index]
+            if foreign:
+                pairs = [(code, base) for code in foreign]
+                return self._rates_text(snapshot, pairs, lang) + as_of + self._fx_disclaimer(lang)
+
+        asks_deposit = ('存款' in message or ('利率' in message and '贷' not in message)
+                        or (any(word in lower for word in ('deposit', 'saving', 'interest'))
+                            and not any(word in lower for word in ('loan', 'mortgage'))))
+        deposit = snapshot.group('deposit')
+        if asks_deposit and deposit:
+            if lang == 'zh':
+                items = '，'.join(f"{fact['name']} {format_fact(fact)}" for fact in deposit)
+                return f"当前存款基准利率：{items}{as_of}。"
+            items = ', '.join(f"{fact['name_en']} {format_fact(fact)}" for fact in deposit)
+            return f"Current deposit benchmark rates: {items}{as_of}."
+        return None
+
+    @staticmethod
+    def _fx_disclaimer(lang: str) -> str:
+        if lang == 'zh':
+            return "。汇率实时波动，请以实际交易为准。"
+        return ". Rates fluctuate; the actual transaction rate applies."
+
+    @staticmethod
+    def _rates_text(snapshot: RatesSnapshot, pairs: List[Tuple[str, str]], lang: str) -> str:
+        if lang == 'zh':
+            return "当前" + "，".join(
+                f"{currency_name(source)}兑{currency_name(target)}汇率为 {format_rate(snapshot.rate(source, target))}"
+                for source, target in pairs
+            )
+        return "Current " + ", ".join(
+            f"{source}/{target} rate is {format_rate(snapshot.rate(source, target))}" for source, target in pairs
+        )
+
+    @staticmethod
+    def _conversion_text(snapshot: RatesSnapshot, amount: float, source: str, target: str, lang: str) -> str:
+        rate = snapshot.rate(source, target)
+        result = amount * rate
+        if lang == 'zh':
+            return (f"按 {snapshot.as_of} {snapshot.source}，{amount:,.2f} {currency_name(source)}约合 "
+                    f"{result:,.2f} {currency_name(target)}（1 {currency_name(source)} = {format_rate(rate)} "
+                    f"{currency_name(target)}）。实际交易以银行牌价为准。")
+        return (f"{amount:,.2f} {source} is about {result:,.2f} {target} at {format_rate(rate)} "
+                f"(as of {snapshot.as_of}). The actual transaction rate applies.")
+
+    def documents(self) -> List[Dict]:
+        """当前数据转成知识库文档（content + metadata），用于需要文档形式的地方"""
+        snapshot = self._snapshot
+        base = snapshot.base
+        docs = [{
+            "content": f"{currency_name(code)}兑{currency_name(base)}汇率：{format_rate(snapshot.rate(code, base))}",
+            "metadata": {"source": snapshot.source, "type": "exchange_rate", "date": snapshot.as_of}
+        } for code in snapshot.codes if code != base]
+        docs.extend({
+            "content": f"{fact['name']}：{format_fact(fact)}",
+            "metadata": {"source": snapshot.source, "type": fact['group'] or 'fact', "date": snapshot.as_of}
+        } for fact in snapshot.facts.values())
+        return docs
+
+
+market_facts = MarketFacts()
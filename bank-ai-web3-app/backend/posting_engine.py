@@ -0,0 +1,522 @@
+# backend/posting_engine.py
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from database import ConnectionPool
+from ledger_store import LedgerStore, ledger_store, from_minor, serialize_transaction, TRANSACTION_COLUMNS
+
+# 一次提交最多合并的记账请求数
+GROUP_COMMIT_MAX_BATCH = int(os.getenv('GROUP_COMMIT_MAX_BATCH', 256))
+# 凑批等待时间（毫秒）；0 表示只合并提交期间已经排队的请求
+GROUP_COMMIT_WINDOW_MS = float(os.getenv('GROUP_COMMIT_WINDOW_MS', 0))
+POSTING_TIMEOUT_SECONDS = float(os.getenv('POSTING_TIMEOUT_SECONDS', 10))
+IDEMPOTENCY_TTL_HOURS = float(os.getenv('IDEMPOTENCY_TTL_HOURS', 24))
+# 单笔金额上限（分）；余额是 64 位整数，超大金额会在绑定参数时溢出
+MAX_AMOUNT_MINOR = 10 ** 12
+
+# 系统账户 user_id 为 0，允许为负：每个币种一个现金清算账户（存取款的对手方）、
+# 一个导入清算账户（对账单导入的期初 / 历史流水的对手方）
+SYSTEM_USER_ID = 0
+
+
+class PostingError(Exception):
+    """记账请求无效（金额、账户等）"""
+
+
+class AccountNotFound(PostingError):
+    pass
+
+
+class InsufficientFunds(PostingError):
+    pass
+
+
+class IdempotencyConflict(PostingError):
+    """同一个幂等键被用于参数不同的请求"""
+
+
+class PostingBusy(PostingError):
+    """提交队列积压或数据库繁忙，结果未知，可用同一幂等键重试"""
+
+
+class _Posting:
+    __slots__ = ('kind', 'category', 'user_id', 'entries', 'owners', 'description', 'counterparties',
+                 'report_account', 'key', 'request_hash', 'date', 'future')
+
+    def __init__(self, kind, user_id, entries, owners, description, counterparties, report_account, category=None):
+        self.kind = kind
+        self.category = category or kind
+        self.user_id = user_id
+        self.entries = entries                # [(account_id, delta_minor)]，合计为 0
+        self.owners = owners                  # {account_id: user_id}
+        self.description = description        # {account_id: 描述}
+        self.counterparties = counterparties  # {account_id: 对方账号}
+        self.report_account = report_account  # 返回给调用方的账户
+        self.key: Optional[str] = None
+        self.request_hash = ''
+        self.date = ''
+        self.future: Future = Future()
+
+    @property
+    def accounts(self) -> List[int]:
+        """客户账户（清算账户不加锁、不缓存余额）"""
+        return [account_id for account_id, _ in self.entries if self.owners[account_id] != SYSTEM_USER_ID]
+
+    @property
+    def holds(self) -> Dict[int, int]:
+        """需要冻结的客户账户支出"""
+        return {account_id: -delta for account_id, delta in self.entries
+                if delta < 0 and self.owners[account_id] != SYSTEM_USER_ID}
+
+
+class PostingEngine:
+    """
+    复式记账引擎（转账、存款、取款）
+
+    - 每笔业务生成一个 journal，分录合计为 0，金额为整数分
+    - 按账户加锁，多个账户按 id 升序加锁，互不相关的转账并行、不会死锁；
+      锁内只做余额校验和资金冻结，只有缓存缺失或可用余额不足时才读一次账户余额
+    - 单个写线程合并排队中的请求，一次事务提交（group commit），每笔请求用 SAVEPOINT 隔离
+    - 幂等键与 journal 在同一事务写入，客户端重试返回第一次的结果
+    - 数据库层再做一次透支检查，多进程部署时内存余额过期也不会透支
+    """
+
+    def __init__(self, ledger: Optional[LedgerStore] = None, max_batch: int = GROUP_COMMIT_MAX_BATCH,
+                 window_ms: float = GROUP_COMMIT_WINDOW_MS):
+        self.ledger = ledger or ledger_store
+        self.pool: ConnectionPool = self.ledger.pool
+        self.max_batch = max(1, max_batch)
+        self.window = window_ms / 1000
+
+        self._locks: Dict[int, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._balances: Dict[int, int] = {}   # 已提交余额（缓存）
+        self._held: Dict[int, int] = {}       # 已冻结、尚未提交的支出
+        self._system_accounts: Dict[Tuple[str, str], int] = {}
+        self._inflight: Dict[Tuple[int, str], _Posting] = {}
+        self._inflight_lock = threading.Lock()
+
+        self._queue: "queue.Queue[_Posting]" = queue.Queue()
+        self._committing = 0
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        self._stats = {"commits": 0, "postings": 0, "rejected": 0, "max_batch": 0}
+        self._listeners: List[Callable[[Set[int]], None]] = []
+
+        self._init_schema()
+
+    def _init_schema(self):
+        with self.pool.connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS idempotency_keys (
+                    user_id INTEGER NOT NULL,
+                    key TEXT NOT NULL,
+                    request_hash TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (user_id, key)
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_tx_journal ON transactions(journal_id)')
+            conn.execute('DELETE FROM idempotency_keys WHERE created_at < ?',
+                         (time.time() - IDEMPOTENCY_TTL_HOURS * 3600,))
+
+    # ---------- 对外接口 ----------
+
+    def transfer(self, user_id: int, from_account_id: int, to_account_id: int, amount_minor: int,
+                 description: str = '', idempotency_key: Optional[str] = None) -> Dict:
+        if from_account_id == to_account_id:
+            raise PostingError("转出和转入账户不能相同")
+        source = self._load_account(from_account_id, owner=user_id)
+        target = self._load_account(to_account_id)
+        if source['currency'] != target['currency']:
+            raise PostingError("暂不支持跨币种转账")
+        return self._post(_Posting(
+            'transfer', user_id,
+            entries=[(from_account_id, -amount_minor), (to_account_id, amount_minor)],
+            owners={from_account_id: user_id, to_account_id: target['user_id']},
+            description={from_account_id: description or f"转账至 {target['account_number']}",
+                         to_account_id: description or f"来自 {source['account_number']} 的转账"},
+            counterparties={from_account_id: target['account_number'], to_account_id: source['account_number']},
+            report_account=from_account_id,
+            category='internal_transfer' if target['user_id'] == user_id else 'transfer'
+        ), amount_minor, idempotency_key)
+
+    def deposit(self, user_id: int, account_id: int, amount_minor: int, description: str = '',
+                idempotency_key: Optional[str] = None) -> Dict:
+        account = self._load_account(account_id, owner=user_id)
+        cash_id = self.system_account(account['currency'])
+        return self._post(_Posting(
+            'deposit', user_id,
+            entries=[(account_id, amount_minor), (cash_id, -amount_minor)],
+            owners={account_id: user_id, cash_id: SYSTEM_USER_ID},
+            description={account_id: description or "存款", cash_id: f"存款 {account['account_number']}"},
+            counterparties={account_id: None, cash_id: account['account_number']},
+            report_account=account_id
+        ), amount_minor, idempotency_key)
+
+    def withdraw(self, user_id: int, account_id: int, amount_minor: int, description: str = '',
+                 idempotency_key: Optional[str] = None) -> Dict:
+        account = self._load_account(account_id, owner=user_id)
+        cash_id = self.system_account(account['currency'])
+        return self._post(_Posting(
+            'withdraw', user_id,
+            entries=[(account_id, -amount_minor), (cash_id, amount_minor)],
+            owners={account_id: user_id, cash_id: SYSTEM_USER_ID},
+            description={account_id: description or "取款", cash_id: f"取款 {account['account_number']}"},
+            counterparties={account_id: None, cash_id: account['account_number']},
+            report_account=account_id
+        ), amount_minor, idempotency_key)
+
+    def add_listener(self, callback: Callable[[Set[int]], None]):
+        """每批提交后在写线程中调用 callback(有新流水的用户 id 集合)，用于让派生缓存失效"""
+        self._listeners.append(callback)
+
+    def refresh(self, account_ids: List[int], user_ids: Set[int]):
+        """记账引擎之外写入了流水（批量导入）：丢弃这些账户的余额缓存并通知回调"""
+        locks = self._acquire(account_ids)
+        try:
+            for account_id in account_ids:
+                self._balances.pop(account_id, None)
+        finally:
+            self._release(locks)
+        self._notify(set(user_ids))
+
+    @contextmanager
+    def external_write(self, account_ids: List[int]) -> Iterator[Dict[int, int]]:
+        """
+        记账引擎之外修改余额（批量导入）时持有这些账户的锁，返回各账户已冻结、尚未提交的支出
+
+        期间不会有新的冻结；退出时丢弃余额缓存。调用方需先拿到数据库写锁（BEGIN IMMEDIATE）再进入，
+        与提交线程的加锁顺序一致
+        """
+        locks = self._acquire(account_ids)
+        try:
+            yield {account_id: self._held.get(account_id, 0) for account_id in account_ids}
+        finally:
+            for account_id in account_ids:
+                self._balances.pop(account_id, None)
+            self._release(locks)
+
+    def pending(self) -> int:
+        """排队中和正在提交的记账请求数；批量写入方在两批之间据此让出写锁"""
+        return self._queue.qsize() + self._committing
+
+    def stats(self) -> Dict:
+        stats = dict(self._stats)
+        stats["avg_batch"] = round(stats["postings"] / stats["commits"], 2) if stats["commits"] else 0
+        return stats
+
+    # ---------- 账户 ----------
+
+    def _load_account(self, account_id: int, owner: Optional[int] = None) -> Dict:
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                'SELECT id, user_id, account_number, currency FROM accounts WHERE id = ?', (account_id,)
+            ).fetchone()
+        if row is None or row['user_id'] == SYSTEM_USER_ID or (owner is not None and row['user_id'] != owner):
+            raise AccountNotFound("账户不存在")
+        return dict(row)
+
+    def system_account(self, currency: str, purpose: str = 'CASH') -> int:
+        """某币种的系统清算账户 id（purpose 为 CASH 或 IMPORT），不存在时创建"""
+        account_id = self._system_accounts.get((purpose, currency))
+        if account_id is not None:
+            return account_id
+        account_number = f"SYS-{purpose}-{currency}"
+        with self.pool.connection() as conn:
+            conn.execute(
+                'INSERT OR IGNORE INTO accounts (user_id, account_number, type, currency, created_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (SYSTEM_USER_ID, account_number, '清算账户', currency, datetime.utcnow().isoformat() + 'Z')
+            )
+            account_id = conn.execute(
+                'SELECT id FROM accounts WHERE account_number = ?', (account_number,)
+            ).fetchone()[0]
+        self._system_accounts[(purpose, currency)] = account_id
+        return account_id
+
+    def _lock(self, account_id: int) -> threading.Lock:
+        with self._locks_guard:
+            lock = self._locks.get(account_id)
+            if lock is None:
+                lock = self._locks[account_id] = threading.Lock()
+            return lock
+
+    def _acquire(self, account_ids) -> List[threading.Lock]:
+        """按账户 id 升序加锁"""
+        locks = [self._lock(account_id) for account_id in sorted(set(account_ids))]
+        for lock in locks:
+            lock.acquire()
+        return locks
+
+    @staticmethod
+    def _release(locks: List[threading.Lock]):
+        for lock in reversed(locks):
+            lock.release()
+
+    def _committed_balance(self, account_id: int, reload: bool = False) -> int:
+        """调用方需持有该账户的锁"""
+        if reload or account_id not in self._balances:
+            with self.pool.connection() as conn:
+                row = conn.execute('SELECT balance_minor FROM accounts WHERE id = ?', (account_id,)).fetchone()
+            self._balances[account_id] = row[0]
+        return self._balances[account_id]
+
+    # ---------- 记账 ----------
+
+    def _post(self, posting: _Posting, amount_minor: int, key: Optional[str]) -> Dict:
+        if not isinstance(amount_minor, int) or amount_minor <= 0:
+            raise PostingError("金额必须大于 0")
+        if amount_minor > MAX_AMOUNT_MINOR:
+            raise PostingError("金额超出单笔上限")
+        user_id = posting.user_id
+        posting.key = key
+        posting.request_hash = request_hash = hashlib.sha256(json.dumps(
+            [posting.kind, posting.entries, posting.description], sort_keys=True, ensure_ascii=False
+        ).encode('utf-8')).hexdigest()
+
+        if key:
+            # 查库放在锁外；查完到登记之间若有同键请求提交，写入时主键冲突，由 _translate 返回那次的结果
+            stored = self._stored_response(user_id, key, request_hash)
+            if stored is not None:
+                return stored
+            with self._inflight_lock:
+                existing = self._inflight.get((user_id, key))
+                if existing is None:
+                    self._inflight[(user_id, key)] = posting
+            if existing is not None:
+                if existing.request_hash != request_hash:
+                    raise IdempotencyConflict("幂等键已用于其他请求")
+                return self._wait(existing)
+
+        try:
+            self._reserve(posting)
+        except PostingError as e:
+            self._finish(posting, error=e)
+            raise
+        self._ensure_writer()
+        self._queue.put(posting)
+        return self._wait(posting)
+
+    def _stored_response(self, user_id: int, key: str, request_hash: str) -> Optional[Dict]:
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                'SELECT request_hash, response FROM idempotency_keys WHERE user_id = ? AND key = ?', (user_id, key)
+            ).fetchone()
+        if row is None:
+            return None
+        if row['request_hash'] != request_hash:
+            raise IdempotencyConflict("幂等键已用于其他请求")
+        response = json.loads(row['response'])
+        response["replayed"] = True
+        return response
+
+    def _reserve(self, posting: _Posting):
+        """校验可用余额并冻结支出；收入要等提交后才可用"""
+        debits = posting.holds
+        locks = self._acquire(posting.accounts)
+        try:
+            for account_id, amount in debits.items():
+                available = self._committed_balance(account_id) - self._held.get(account_id, 0)
+                if available < amount:
+                    # 其他进程可能已经入账，重新读取一次再判断
+                    available = self._committed_balance(account_id, reload=True) - self._held.get(account_id, 0)
+                if available < amount:
+                    raise InsufficientFunds("余额不足")
+            for account_id, amount in debits.items():
+                self._held[account_id] = self._held.get(account_id, 0) + amount
+        finally:
+            self._release(locks)
+
+    def _wait(self, posting: _Posting) -> Dict:
+        try:
+            return posting.future.result(timeout=POSTING_TIMEOUT_SECONDS)
+        except FutureTimeout:
+            raise PostingBusy("记账超时，请使用同一幂等键重试")
+
+    def _finish(self, posting: _Posting, result: Optional[Dict] = None, error: Optional[Exception] = None):
+        if posting.key:
+            with self._inflight_lock:
+                if self._inflight.get((posting.user_id, posting.key)) is posting:
+                    del self._inflight[(posting.user_id, posting.key)]
+        if error is not None:
+            posting.future.set_exception(error)
+        else:
+            posting.future.set_result(result)
+
+    # ---------- 写线程 ----------
+
+    def _ensure_writer(self):
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run_writer, name='posting-writer', daemon=True)
+                self._writer.start()
+
+    def _next_batch(self) -> List[_Posting]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            try:
+                remaining = deadline - time.monotonic()
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run_writer(self):
+        while True:
+            batch = self._next_batch()
+            self._committing = len(batch)
+            try:
+                self._commit_batch(batch)
+            except Exception as e:
+                print(f"❌ 记账批次提交失败: {e}")
+                self._settle([], [(p, PostingBusy("数据库繁忙，请使用同一幂等键重试")) for p in batch], reload=True)
+            finally:
+                self._committing = 0
+
+    def _commit_batch(self, batch: List[_Posting]):
+        done: List[Tuple[_Posting, Dict]] = []
+        failed: List[Tuple[_Posting, Exception]] = []
+        rejected: List[Tuple[_Posting, Exception]] = []
+        with self.pool.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            for posting in batch:
+                conn.execute('SAVEPOINT posting')
+                try:
+                    result = self._write(conn, posting)
+                except (PostingError, sqlite3.Error, OverflowError) as e:
+                    # 只回滚这一笔；事务本身已被 SQLite 回滚时 ROLLBACK TO 会抛错，整批按繁忙处理
+                    conn.execute('ROLLBACK TO posting')
+                    failed.append((posting, e))
+                else:
+                    done.append((posting, result))
+                conn.execute('RELEASE posting')
+            self.ledger.rollups.apply(conn, [
+                (account_id, posting.owners[account_id], posting.date, posting.category, delta)
+                for posting, _ in done for account_id, delta in posting.entries
+            ])
+
+            # 持有相关账户的锁提交并更新缓存，避免并发的重新读取把同一笔金额计算两次
+            locks = self._acquire(a for p in batch for a in p.accounts)
+            try:
+                conn.commit()
+                for posting, _ in done:
+                    for account_id, delta in posting.entries:
+                        if account_id in self._balances:
+                            self._balances[account_id] += delta
+                self._release_holds(batch)
+                for posting, _ in failed:
+                    # 数据库余额与缓存不一致（其他进程记账），下次重新读取
+                    for account_id in posting.accounts:
+                        self._balances.pop(account_id, None)
+            finally:
+                self._release(locks)
+
+        self._stats["commits"] += 1
+        self._stats["postings"] += len(done)
+        self._stats["rejected"] += len(failed)
+        self._stats["max_batch"] = max(self._stats["max_batch"], len(batch))
+        self._notify({posting.owners[a] for posting, _ in done for a in posting.accounts})
+        for posting, error in failed:
+            outcome = self._translate(posting, error)
+            if isinstance(outcome, Exception):
+                rejected.append((posting, outcome))
+            else:
+                done.append((posting, outcome))
+        self._settle(done, rejected)
+
+    def _notify(self, user_ids: Set[int]):
+        if not user_ids:
+            return
+        for callback in self._listeners:
+            try:
+                callback(user_ids)
+            except Exception as e:
+                print(f"⚠️ 记账通知回调失败: {e}")
+
+    def _release_holds(self, batch: List[_Posting]):
+        """调用方需持有相关账户的锁"""
+        for posting in batch:
+            for account_id, amount in posting.holds.items():
+                self._held[account_id] -= amount
+
+    def _settle(self, done, failed, reload: bool = False):
+        if reload:
+            locks = self._acquire(a for p, _ in failed for a in p.accounts)
+            try:
+                self._release_holds([p for p, _ in failed])
+                for posting, _ in failed:
+                    for account_id in posting.accounts:
+                        self._balances.pop(account_id, None)
+            finally:
+                self._release(locks)
+        for posting, result in done:
+            self._finish(posting, result=result)
+        for posting, error in failed:
+            self._finish(posting, error=error)
+
+    def _translate(self, posting: _Posting, error: Exception):
+        """返回异常，或者（其他进程已用同一幂等键提交时）那次的结果"""
+        if isinstance(error, PostingError):
+            return error
+        if posting.key:
+            try:
+                stored = self._stored_response(posting.user_id, posting.key, posting.request_hash)
+            except IdempotencyConflict as e:
+                return e
+            if stored is not None:
+                return stored
+        return PostingError(f"记账失败: {error}")
+
+    def _write(self, conn, posting: _Posting) -> Dict:
+        journal_id = uuid.uuid4().hex
+        now = time.time()
+        date = posting.date = datetime.now().strftime('%Y-%m-%d')
+        tx_ids = {}
+        for account_id, delta in posting.entries:
+            updated = conn.execute(
+                'UPDATE accounts SET balance_minor = balance_minor + ? '
+                'WHERE id = ? AND (user_id = ? OR balance_minor + ? >= 0)',
+                (delta, account_id, SYSTEM_USER_ID, delta)
+            ).rowcount
+            if not updated:
+                raise InsufficientFunds("余额不足")
+            tx_ids[account_id] = conn.execute(
+                'INSERT INTO transactions (account_id, user_id, date, amount_minor, type, category, '
+                'description, counterparty, journal_id, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (account_id, posting.owners[account_id], date, delta, posting.kind, posting.category,
+                 posting.description[account_id], posting.counterparties[account_id], journal_id, now)
+            ).lastrowid
+
+        report = posting.report_account
+        tx_row = conn.execute(f'SELECT {TRANSACTION_COLUMNS} FROM transactions WHERE id = ?',
+                              (tx_ids[report],)).fetchone()
+        balance = conn.execute('SELECT balance_minor FROM accounts WHERE id = ?', (report,)).fetchone()[0]
+        result = {
+            "journalId": journal_id,
+            "transaction": serialize_transaction(tx_row),
+            "balance": from_minor(balance)
+        }
+        if posting.key:
+            conn.execute(
+                'INSERT INTO idempotency_keys (user_id, key, request_hash, response, created_at) VALUES (?, ?, ?, ?, ?)',
+                (posting.user_id, posting.key, posting.request_hash, json.dumps(result, ensure_ascii=False), now)
+            )
+        return result
+
+
+posting_engine = PostingEngine()
@@ -3,6 +3,7 @@ import os
 import markdown
 from typing import List, Dict
 import json
+from market_facts import market_facts
 
 class DocumentLoader:
     def __init__(self, knowledge_base_path="rag/knowledge_base"):
@@ -77,27 +78,5 @@ class DocumentLoader:
         return chunks
     
     def create_financial_facts(self) -> List[Dict]:
-        """创建金融事实数据"""
-        facts = [
-            {
-                "content": "今日美元兑人民币汇率：7.18",
-                "metadata": {"source": "实时数据", "type": "exchange_rate", "date": "2024-01-15"}
-            },
-            {
-                "content": "当前基准存款利率：1.5%（一年期）",
-                "metadata": {"source": "央行数据", "type": "interest_rate", "date": "2024-01-15"}
-            },
-            {
-                "content": "上证指数：2900点",
-                "metadata": {"source": "股市数据", "type": "stock_market", "date": "2024-01-15"}
-            },
-            {
-                "content": "比特币价格：42000美元",
-                "metadata": {"source": "加密货币", "type": "crypto", "date": "2024-01-15"}
-            },
-            {
-                "content": "黄金价格：2020美元/盎司",
-                "metadata": {"source": "大宗商品", "type": "commodity", "date": "2024-01-15"}
-            }
-        ]
-        return facts
\ No newline at end of file
+        """创建金融事实数据（汇率、利率），取自 market_facts 的当前快照"""
+        return market_facts.documents()
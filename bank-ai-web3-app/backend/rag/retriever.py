@@ -1,6 +1,7 @@
 # backend/rag/retriever.py
 from .vector_store import VectorStore
 from .document_loader import DocumentLoader
+from market_facts import market_facts
 import os
 
 class RAGRetriever:
@@ -35,14 +36,14 @@ class RAGRetriever:
             print(f"知识库初始化完成，添加了 {len(documents)} 个文档")
     
     def _create_basic_knowledge(self):
-        """创建基础知识库"""
+        """创建基础知识库（汇率、存款利率等会变动的数据不入库，检索时从 market_facts 取当前值）"""
         return [
             {
-                "content": "活期储蓄账户利率为0.3%，随时可以存取，没有最低存款要求。",
+                "content": "活期储蓄账户随时可以存取，没有最低存款要求。",
                 "metadata": {"source": "基础知识", "type": "savings_account"}
             },
             {
-                "content": "定期存款利率：1年期1.5%，3年期2.5%，5年期3.0%。提前支取按活期利率计算。",
+                "content": "定期存款提前支取按活期利率计算。",
                 "metadata": {"source": "基础知识", "type": "fixed_deposit"}
             },
             {
@@ -52,10 +53,6 @@ class RAGRetriever:
             {
                 "content": "货币基金是低风险投资产品，年化收益率通常在2%-3%之间，适合短期资金管理。",
                 "metadata": {"source": "基础知识", "type": "investment"}
-            },
-            {
-                "content": "当前美元兑人民币汇率为7.18，欧元兑人民币为7.80，日元兑人民币为0.048。",
-                "metadata": {"source": "汇率数据", "type": "exchange_rate"}
             }
         ]
     
@@ -81,9 +78,13 @@ class RAGRetriever:
         # 按相关性排序
         retrieved_docs.sort(key=lambda x: x["relevance_score"], reverse=True)
         
-        # 构建上下文
+        # 构建上下文；汇率、利率类问题先放入当前数据
         context_parts = []
         total_tokens = 0
+        facts = market_facts.answer(query)
+        if facts:
+            context_parts.append(f"来源：{market_facts.snapshot.source}\n内容：{facts}\n")
+            total_tokens += len(context_parts[0])
         
         for doc in retrieved_docs:
             doc_content = f"来源：{doc['metadata'].get('source', '未知')}\n内容：{doc['content']}\n"
@@ -1,15 +1,33 @@
 # backend/routes/ai_routes.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context, g
+import json
+import io
 import time
 import base64
-from .ai_service import AIService
+import traceback
+from PIL import Image
+from .ai_service import ai_banker
+from .auth_routes import token_required, token_optional
+from ledger_store import ledger_store
+from chat_store import chat_store
+from job_service import JobQueue, PRIORITY_INTERACTIVE, PRIORITY_DEFAULT, PRIORITY_BULK
+from upload_guard import guard_uploads
+from tts_pool import encode_frame, FRAME_AUDIO, FRAME_JSON
 
-ai_banker = AIService()
+job_queue = JobQueue()
 
 ai_bp = Blueprint('ai', __name__, url_prefix='/api/ai')
+ai_bp.before_request(guard_uploads)
 
 @ai_bp.route('/chat', methods=['POST'])
+@token_optional
 def chat():
+    """
+    AI 文本聊天
+
+    登录用户的对话保存为会话：不带 session_id 时新建，返回的 session_id 用于继续对话，
+    interaction_id 用于提交反馈。访客的对话不保存，每轮独立回答。
+    """
 
     import traceback  
     
@@ -25,15 +43,44 @@ def chat():
         
         message = data.get('message', '')
         user_id = data.get('user_id', 'guest')
+        session_id = data.get('session_id')
+        current_user = g.current_user
         print(f"📝 消息内容: {message}, 用户ID: {user_id}")  # 添加日志
+
+        context = None
+        if current_user:
+            user_id = current_user['id']
+            if session_id:
+                if not chat_store.get_session(session_id, user_id):
+                    return jsonify({
+                        "success": False,
+                        "error": "会话不存在"
+                    }), 404
+            else:
+                session_id = chat_store.create_session(user_id, message)
+            context = chat_store.context(session_id)
         
         # 调用 AI 服务
-        response = ai_banker.chat(message, user_id)
+        response = ai_banker.chat(message, user_id, context)
         print(f"🤖 AI 响应: {response}")  # 添加日志
-        
+
+        if not current_user:
+            return jsonify({
+                "success": True,
+                "response": response
+            })
+
+        turn = chat_store.append_turn(session_id, message, response)
+        if turn['needs_fold']:
+            # 同一摘要进度只排一个合并任务
+            job_queue.submit('chat_summary', _chat_summary_job, session_id, priority=PRIORITY_BULK,
+                             dedupe_payload=f"{session_id}|{turn['summarized_upto']}".encode(),
+                             owner_id=user_id)
         return jsonify({
             "success": True,
-            "response": response
+            "response": response,
+            "session_id": session_id,
+            "interaction_id": turn['interaction_id']
         })
         
     except Exception as e:
@@ -63,6 +110,7 @@ def system_info():
     })
 
 @ai_bp.route('/knowledge/add', methods=['POST'])
+@token_required
 def add_knowledge():
     """添加新知识"""
     try:
@@ -124,6 +172,7 @@ def search_knowledge():
 # 在现有基础上添加这些新的路由
 
 @ai_bp.route('/chat/voice', methods=['POST'])
+@token_optional
 def chat_voice():
     """AI 语音聊天接口"""
     print("=" * 60)
@@ -162,31 +211,39 @@ def chat_voice():
             }), 400
         
         # 获取其他参数
-        user_id = request.form.get('user_id', 'guest')
+        user_id = _owner_id() or request.form.get('user_id', 'guest')
         generate_audio = request.form.get('generate_audio', 'false') == 'true'
+        language = request.form.get('language') or None
+        accuracy = request.form.get('accuracy') or None
         
         print(f"📝 语音参数:")
         print(f" - user_id: {user_id}")
         print(f" - generate_audio: {generate_audio}")
-        
+        print(f" - language: {language or 'auto'}")
+        
+        # 流水线模式：按句子返回二进制音频帧，不再 base64 编码进 JSON
+        if request.form.get('stream', 'false') == 'true':
+            events = ai_banker.stream_chat_voice(audio_data, user_id, language, accuracy)
+            return Response(stream_with_context(_encode_events(events)), mimetype='application/octet-stream')
+        
+        if _wants_async():
+            job_id = job_queue.submit(
+                'voice', _voice_job, audio_data, user_id, generate_audio, language, accuracy,
+                priority=PRIORITY_INTERACTIVE,
+                dedupe_payload=audio_data + f"|{user_id}|{generate_audio}|{language}|{accuracy}".encode(),
+                owner_id=_owner_id()
+            )
+            return _job_accepted(job_id)
+
         # ✅ 关键修改：传递 audio_data 而不是 audio_file
         print("🔄 调用 AI 服务进行语音识别...")
-        result = ai_banker.chat_voice(audio_data, user_id, generate_audio)
-        
-        print(f"🤖 语音识别结果: {result.get('transcribed_text', '')}")
-        print(f"🤖 AI 回复: {result.get('response', '')[:100]}...")
-        print(f"🤖 音频响应: {'有' if result.get('audio_response') else '无'}")
-        
-        audio_response = result.get('audio_response', None)
-        if audio_response is not None and isinstance(audio_response, bytes):
-            audio_response = base64.b64encode(audio_response).decode('utf-8')
+        payload = _voice_job(audio_data, user_id, generate_audio, language, accuracy)
 
-        return jsonify({
-            "success": True,
-            "transcribed_text": result.get('transcribed_text', ''),
-            "response": result.get('response', ''),
-            "audio_response": audio_response
-        })
+        print(f"🤖 语音识别结果: {payload['transcribed_text']}")
+        print(f"🤖 AI 回复: {payload['response'][:100]}...")
+        print(f"🤖 音频响应: {'有' if payload['audio_response'] else '无'}")
+
+        return jsonify({"success": True, **payload})
 
         
     except Exception as e:
@@ -200,6 +257,7 @@ def chat_voice():
 
 
 @ai_bp.route('/chat/image', methods=['POST'])
+@token_optional
 def chat_image():
     """AI Image Analysis Interface"""
     print("=" * 60)
@@ -232,7 +290,7 @@ def chat_image():
         
         # Get other parameters
         message = request.form.get('message', '')
-        user_id = request.form.get('user_id', 'guest')
+        user_id = _owner_id() or request.form.get('user_id', 'guest')
         
         print(f"📝 Image Parameters:")
         print(f" - message: {message}")
@@ -240,14 +298,15 @@ def chat_image():
         
         # Call AI image service
         print("🔄 Calling AI service...")
-        result = ai_banker.chat_image(image_file, message, user_id)
+        result = ai_banker.chat_image(image_data, message, user_id)
         
         print(f"🤖 Image Response: {result}")
         
         return jsonify({
             "success": True,
             "image_analysis": result.get('analysis', ''),
-            "response": result.get('response', '')
+            "response": result.get('response', ''),
+            "timings": result.get('timings', {})
         })
         
     except Exception as e:
@@ -259,6 +318,7 @@ def chat_image():
         }), 500
 
 @ai_bp.route('/advice', methods=['GET'])
+@token_required
 def get_investment_advice():
     """获取投资建议"""
     try:
@@ -270,12 +330,20 @@ def get_investment_advice():
                 "error": "请提供 accountId 参数"
             }), 400
 
-        # 调用 AI 服务获取投资建议
-        advice = ai_banker.get_investment_advice(account_id)
+        account = ledger_store.get_account(int(account_id), g.current_user['id']) if account_id.isdigit() else None
+        if not account:
+            return jsonify({
+                "success": False,
+                "error": "账户不存在"
+            }), 404
+
+        # 调用 AI 服务获取投资建议（风险画像按账户缓存）
+        result = ai_banker.get_investment_advice(account['id'], g.current_user['id'], account['accountNumber'])
 
         return jsonify({
             "success": True,
-            "advice": advice
+            "advice": result["advice"],
+            "profile": result["profile"]
         })
 
     except Exception as e:
@@ -287,8 +355,9 @@ def get_investment_advice():
         }), 500
 
 @ai_bp.route('/analyze-spending', methods=['GET'])
+@token_required
 def analyze_spending():
-    """支出分析"""
+    """支出分析：文字报告 + 结构化摘要（分类、环比、周期性扣款、异常支出）"""
     try:
         account_id = request.args.get('accountId')
 
@@ -298,12 +367,20 @@ def analyze_spending():
                 "error": "请提供 accountId 参数"
             }), 400
 
+        account = ledger_store.get_account(int(account_id), g.current_user['id']) if account_id.isdigit() else None
+        if not account:
+            return jsonify({
+                "success": False,
+                "error": "账户不存在"
+            }), 404
+
         # 调用 AI 服务进行支出分析
-        analysis = ai_banker.analyze_spending(account_id)
+        result = ai_banker.analyze_spending(account['id'], account['accountNumber'])
 
         return jsonify({
             "success": True,
-            "analysis": analysis
+            "analysis": result["report"],
+            "summary": result["summary"]
         })
 
     except Exception as e:
@@ -314,7 +391,49 @@ def analyze_spending():
             "error": f"服务异常：{str(e)}"
         }), 500
 
+# 单次请求最多分类的交易条数
+MAX_CATEGORIZE_BATCH = 10000
+
+
+@ai_bp.route('/categorize', methods=['POST'])
+@token_required
+def categorize_transactions():
+    """
+    批量交易分类
+
+    请求体：{"transactions": [描述字符串，或 {"id", "description", "counterparty"/"merchant"}]}
+    返回与输入顺序一致的 {"category", "confidence", "source"}
+    """
+    data = request.get_json(silent=True) or {}
+    transactions = data.get('transactions')
+    if not isinstance(transactions, list) or not transactions:
+        return jsonify({
+            "success": False,
+            "error": "请提供 transactions 数组"
+        }), 400
+    if len(transactions) > MAX_CATEGORIZE_BATCH:
+        return jsonify({
+            "success": False,
+            "error": f"单次最多分类 {MAX_CATEGORIZE_BATCH} 条交易"
+        }), 400
+
+    try:
+        results = ai_banker.categorize_transactions(transactions, g.current_user['id'])
+    except Exception as e:
+        print(f"❌ 交易分类接口异常：{str(e)}")
+        print(f"❌ 错误堆栈：\n{traceback.format_exc()}")
+        return jsonify({
+            "success": False,
+            "error": f"服务异常：{str(e)}"
+        }), 500
+
+    return jsonify({
+        "success": True,
+        "results": results
+    })
+
 @ai_bp.route('/ocr/extract', methods=['POST'])
+@token_required
 def ocr_extract():
     """OCR文本提取接口"""
     try:
@@ -327,22 +446,19 @@ def ocr_extract():
         image_file = request.files['image']
         image_data = image_file.read()
         
-        # 使用图像服务提取文本
-        if ai_banker.image_enabled:
-            image = Image.open(io.BytesIO(image_data))
-            text = ai_banker.image_service._extract_text(image)
-            
-            return jsonify({
-                "success": True,
-                "text": text,
-                "text_length": len(text),
-                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ")
-            })
-        else:
+        if not ai_banker.image_enabled:
             return jsonify({
                 "success": False,
                 "error": "图像服务未启用"
             }), 500
+
+        if _wants_async():
+            job_id = job_queue.submit('ocr', _ocr_job, image_data, priority=PRIORITY_BULK,
+                                      dedupe_payload=image_data + f"|{_owner_id()}".encode(),
+                                      owner_id=_owner_id())
+            return _job_accepted(job_id)
+
+        return jsonify({"success": True, **_ocr_job(image_data)})
             
     except Exception as e:
         return jsonify({
@@ -365,7 +481,54 @@ def get_supported_languages():
             "error": "语音服务未启用"
         }), 500
 
+def _encode_events(events):
+    """把事件编码为二进制帧：bytes 为音频帧，dict 为 JSON 帧"""
+    for event in events:
+        if isinstance(event, bytes):
+            yield encode_frame(FRAME_AUDIO, event)
+        else:
+            yield encode_frame(FRAME_JSON, json.dumps(event, ensure_ascii=False).encode('utf-8'))
+
+@ai_bp.route('/tts/stream', methods=['POST'])
+@token_optional
+def tts_stream():
+    """按句子流式返回语音（二进制帧：1 字节类型 + 4 字节长度 + 负载）"""
+    data = request.get_json(silent=True) or {}
+    text = data.get('text', '')
+    language = data.get('language', 'en')
+
+    if not text:
+        return jsonify({
+            "success": False,
+            "error": "请提供 text 参数"
+        }), 400
+
+    if not ai_banker.voice_enabled:
+        return jsonify({
+            "success": False,
+            "error": "语音服务未启用"
+        }), 500
+
+    def generate():
+        start = time.perf_counter()
+        first_audio_ms = None
+        segments = 0
+        for audio in ai_banker.voice_service.stream_speech(text, language):
+            if first_audio_ms is None:
+                first_audio_ms = round((time.perf_counter() - start) * 1000, 2)
+            segments += 1
+            yield encode_frame(FRAME_AUDIO, audio)
+        summary = {
+            "segments": segments,
+            "time_to_first_audio_ms": first_audio_ms,
+            "total_ms": round((time.perf_counter() - start) * 1000, 2)
+        }
+        yield encode_frame(FRAME_JSON, json.dumps(summary).encode('utf-8'))
+
+    return Response(stream_with_context(generate()), mimetype='application/octet-stream')
+
 @ai_bp.route('/validate/id-card', methods=['POST'])
+@token_required
 def validate_id_card():
     """验证身份证图片"""
     try:
@@ -378,18 +541,19 @@ def validate_id_card():
         image_file = request.files['image']
         image_data = image_file.read()
         
-        if ai_banker.image_enabled:
-            result = ai_banker.image_service.validate_id_card(image_data)
-            return jsonify({
-                "success": True,
-                "validation_result": result,
-                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ")
-            })
-        else:
+        if not ai_banker.image_enabled:
             return jsonify({
                 "success": False,
                 "error": "图像服务未启用"
             }), 500
+
+        if _wants_async():
+            job_id = job_queue.submit('id_card', _id_card_job, image_data, priority=PRIORITY_DEFAULT,
+                                      dedupe_payload=image_data + f"|{_owner_id()}".encode(),
+                                      owner_id=_owner_id())
+            return _job_accepted(job_id)
+
+        return jsonify({"success": True, **_id_card_job(image_data)})
             
     except Exception as e:
         return jsonify({
@@ -418,4 +582,83 @@ def system_capabilities():
         "success": True,
         "capabilities": capabilities,
         "system_info": info
-    })
\ No newline at end of file
+    })
+
+
+@ai_bp.route('/jobs/<job_id>', methods=['GET'])
+@token_optional
+def get_job(job_id):
+    """查询异步任务状态，支持 ?wait=秒 长轮询；登录用户提交的任务只向本人返回"""
+    try:
+        wait = min(float(request.args.get('wait', 0)), 30.0)
+    except ValueError:
+        wait = 0.0
+
+    job = job_queue.wait(job_id, wait) if wait > 0 else job_queue.get(job_id)
+    if not job or (job['owner_id'] is not None and job['owner_id'] != _owner_id()):
+        return jsonify({
+            "success": False,
+            "error": "任务不存在或已过期"
+        }), 404
+
+    return jsonify({
+        "success": True,
+        "job": job
+    })
+
+
+def _owner_id():
+    """当前登录用户的 ID，访客为 None"""
+    return g.current_user['id'] if g.current_user else None
+
+
+def _wants_async() -> bool:
+    """客户端通过 async=true（表单或查询参数）请求异步处理"""
+    flag = request.form.get('async') or request.args.get('async') or 'false'
+    return flag.lower() == 'true'
+
+
+def _job_accepted(job_id: str):
+    return jsonify({
+        "success": True,
+        "job_id": job_id,
+        "status_url": f"/api/ai/jobs/{job_id}"
+    }), 202
+
+
+def _voice_job(audio_data: bytes, user_id: str, generate_audio: bool,
+               language: str = None, accuracy: str = None) -> dict:
+    result = ai_banker.chat_voice(audio_data, user_id, generate_audio, language, accuracy)
+
+    audio_response = result.get('audio_response', None)
+    if audio_response is not None and isinstance(audio_response, bytes):
+        audio_response = base64.b64encode(audio_response).decode('utf-8')
+
+    return {
+        "transcribed_text": result.get('transcribed_text', ''),
+        "response": result.get('response', ''),
+        "audio_response": audio_response
+    }
+
+
+def _chat_summary_job(session_id: str) -> dict:
+    """把会话窗口外的旧消息合并进摘要"""
+    return {"folded": chat_store.fold(session_id, ai_banker.summarize_conversation)}
+
+
+def _ocr_job(image_data: bytes) -> dict:
+    image = Image.open(io.BytesIO(image_data))
+    text = ai_banker.image_service._extract_text(image)
+    return {
+        "text": text,
+        "text_length": len(text),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ")
+    }
+
+
+def _id_card_job(image_data: bytes) -> dict:
+    result = ai_banker.image_service.validate_id_card(image_data)
+    return {
+        "validation_result": result,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ")
+    }
@@ -1,20 +1,47 @@
 # backend/services/ai_service.py
 import os
 import json
-from typing import Optional
+import time
+import queue
+import threading
+from typing import Iterator, Optional, Union
 from dotenv import load_dotenv
 from voice_service import VoiceService
+from tts_pool import iter_sentences
 from image_service import ImageService
+from ledger_store import ledger_store
+from spending_analytics import spending_analyzer, load_account_frame, format_report
+from transaction_categorizer import TransactionCategorizer
+from advice_engine import advice_engine, format_advice
+from chat_store import SUMMARY_MAX_CHARS
+from market_facts import market_facts
 
 env_path = os.path.join(os.path.dirname(__file__), '..', '.env')
 load_dotenv(env_path)
 
+# 语音聊天的英文模拟回复（固定文本，启动时预先合成语音；汇率和存款利率由 market_facts 按当前数据生成）
+ENGLISH_DEFAULT_RESPONSE = "Hello! I am your AI banking assistant. Your question is: {question}. I can help you with banking services, investments, loans, and more."
+ENGLISH_RESPONSES = {
+    "loan": "We offer various loan products: personal loans from 4.35%, mortgage loans from 3.85%, business loans from 3.65%.",
+    "investment": "For beginner investors, start with low-risk products like money market funds and fixed deposits.",
+    "credit": "To apply for a credit card, you must be at least 18 with stable income and good credit history.",
+    "card": "To apply for a credit card, you must be at least 18 with stable income and good credit history.",
+    "transfer": "Single transfer limit is 50,000, daily limit is 200,000.",
+    "balance": "Please log in to online banking or mobile banking to check your account balance.",
+    "hello": "Hello! How can I help you today?",
+    "hi": "Hi there! How can I assist you today?",
+}
+
 class AIService:
 
 
     def __init__(self):
         self.voice_service = VoiceService()
         self.image_service = ImageService()
+        self.voice_enabled = (self.voice_service.whisper_available or bool(self.voice_service.gtts)
+                              or self.voice_service.local_tts_available)
+        self.image_enabled = self.image_service.analysis_enabled
+        self.categorizer = TransactionCategorizer(llm=self.complete)
         self.ai_provider = os.getenv('AI_PROVIDER', 'mock')
         self.mock_responses = os.getenv('MOCK_AI_RESPONSES', 'False').lower() == 'true'
         self.gemini_api_key = os.getenv('GEMINI_API_KEY', '')
@@ -28,6 +55,17 @@ class AIService:
 
         # 初始化 AI 客户端
         self._init_ai_client()
+
+        # 后台预先合成固定语音回复
+        if os.getenv('TTS_PREWARM', 'true').lower() == 'true':
+            threading.Thread(
+                target=self.voice_service.warm_tts_cache,
+                args=(sorted(set(ENGLISH_RESPONSES.values()) | {
+                    market_facts.answer(question, 'en') for question in ('exchange rate', 'deposit rate')
+                } - {None}), 'en'),
+                name="tts-prewarm",
+                daemon=True
+            ).start()
         
     def _init_ai_client(self):
         """初始化 AI 客户端"""
@@ -63,13 +101,14 @@ class AIService:
             print("   ⚠️  未配置 AI API KEY，使用模拟响应")
             self.mock_responses = True
 
-    def chat(self, message: str, user_id: str = 'guest') -> str:
+    def chat(self, message: str, user_id: str = 'guest', context: Optional[dict] = None) -> str:
         """
         AI 文本聊天
 
         Args:
             message: 用户消息
             user_id: 用户ID
+            context: 会话上下文 {"summary": 旧对话摘要, "messages": 最近的消息}，见 ChatStore.context
 
         Returns:
             AI 响应
@@ -79,12 +118,17 @@ class AIService:
             if self.mock_responses:
                 return self._get_mock_response(message)
 
+            # 汇率、利率类问题附上当前数据，避免模型给出过时的数字
+            facts = market_facts.answer(message)
+            if facts:
+                context = {**(context or {}), "facts": facts}
+
             # 使用真实的 AI 服务
             if self.ai_provider == 'gemini':
-                return self._chat_with_gemini(message)
+                return self._chat_with_gemini(message, context)
 
             elif self.ai_provider == 'openai':
-                return self._chat_with_openai(message)
+                return self._chat_with_openai(message, context)
 
             else:
                 return self._get_mock_response(message)
@@ -95,9 +139,12 @@ class AIService:
 
     def _get_mock_response(self, message: str) -> str:
         """获取模拟响应"""
+        facts = market_facts.answer(message)
+        if facts:
+            return facts
+
         responses = {
             "default": f"您好！我是您的 AI 银行助手。您的问题是：{message}。我可以帮您解答关于银行业务、理财投资、贷款等方面的问题。",
-            "存款": "当前活期存款利率为 0.3%，定期存款利率根据期限不同而有所差异：1年期 1.5%，2年期 2.1%，3年期 2.75%。",
             "贷款": "我们提供多种贷款产品：个人消费贷款利率 4.35% 起，住房贷款利率 3.85% 起，经营贷款利率 3.65% 起。",
             "投资": "对于新手投资者，建议从低风险产品开始，如货币基金、定期存款等。逐步了解后再尝试债券基金、指数基金等。",
             "信用卡": "申请信用卡需要年满 18 周岁，有稳定的收入来源，良好的信用记录。您可以在线申请或到柜台办理。",
@@ -105,7 +152,6 @@ class AIService:
             "余额": "请登录网银或手机银行查看您的账户余额。",
             "你好": "您好！有什么我可以帮您的吗？",
             "hello": "Hello! How can I help you today?",
-            "汇率": "当前美元兑人民币汇率为 7.24，欧元兑人民币汇率为 7.89。汇率实时波动，请以实际交易为准。",
         }
 
         # 简单的关键词匹配
@@ -115,22 +161,42 @@ class AIService:
 
         return responses["default"]
 
-    def _chat_with_gemini(self, message: str) -> str:
+    @staticmethod
+    def _history_messages(context: Optional[dict]) -> list:
+        """会话上下文转成 OpenAI 格式的消息列表：摘要作为一条系统消息放在最近消息之前"""
+        if not context:
+            return []
+        history = []
+        if context.get("facts"):
+            history.append({"role": "system", "content": f"当前参考数据（回答涉及时以此为准）：{context['facts']}"})
+        if context.get("summary"):
+            history.append({"role": "system", "content": f"此前对话的摘要：\n{context['summary']}"})
+        history.extend({"role": m["role"], "content": m["content"]} for m in context.get("messages", []))
+        return history
+
+    def _chat_with_gemini(self, message: str, context: Optional[dict] = None) -> str:
         """使用 Gemini 进行聊天"""
         try:
-            response = self.gemini_client.generate_content(message)
+            history = self._history_messages(context)
+            prompt = message
+            if history:
+                names = {"system": "背景", "user": "用户", "assistant": "助手"}
+                lines = [f"{names[m['role']]}：{m['content']}" for m in history]
+                prompt = "\n".join(lines + [f"用户：{message}", "助手："])
+            response = self.gemini_client.generate_content(prompt)
             return response.text
         except Exception as e:
             print(f"❌ Gemini 调用失败：{e}")
             return self._get_mock_response(message)
 
-    def _chat_with_openai(self, message: str) -> str:
+    def _chat_with_openai(self, message: str, context: Optional[dict] = None) -> str:
         """使用 OpenAI 进行聊天"""
         try:
             response = self.openai_client.chat.completions.create(
                 model=self.openai_model,
                 messages=[
                     {"role": "system", "content": "你是一个专业的银行 AI 助手。"},
+                    *self._history_messages(context),
                     {"role": "user", "content": message}
                 ]
             )
@@ -139,7 +205,8 @@ class AIService:
             print(f"❌ OpenAI 调用失败：{e}")
             return self._get_mock_response(message)
 
-    def chat_voice(self, audio_data: bytes, user_id: str = 'guest', generate_audio: bool = False) -> dict:
+    def chat_voice(self, audio_data: bytes, user_id: str = 'guest', generate_audio: bool = False,
+                   language: Optional[str] = None, accuracy: Optional[str] = None) -> dict:
         """
         处理语音聊天请求
         
@@ -147,12 +214,14 @@ class AIService:
             audio_data: 音频字节数据（bytes类型）
             user_id: 用户ID
             generate_audio: 是否生成音频响应
+            language: 语言提示（如 en-US），为空时自动检测
+            accuracy: 识别精度档位 fast / balanced / accurate
         """
         try:
-            voice_service = VoiceService()
+            voice_service = self.voice_service
             
-            # ✅ 强制英文识别
-            transcribed_text = voice_service.transcribe_audio(audio_data, language='en-US')
+            # 有语言提示时跳过语言检测
+            transcribed_text = voice_service.transcribe_audio(audio_data, language=language, accuracy=accuracy)
             
             if not transcribed_text:
                 return {
@@ -163,38 +232,18 @@ class AIService:
             
             # ✅ 强制英文回复
             english_system_prompt = "You are a professional banking AI assistant. Please respond in English."
+            facts = market_facts.answer(transcribed_text, 'en')
+            context = {"facts": facts} if facts else None
             
             if self.ai_provider == 'gemini' and hasattr(self, 'gemini_client'):
                 # ✅ 正确传递参数：只传递 message，不传递 system_prompt
-                # 因为 _chat_with_gemini 只接受2个参数
-                ai_response = self._chat_with_gemini(transcribed_text)
+                ai_response = self._chat_with_gemini(transcribed_text, context)
             elif self.ai_provider == 'openai' and hasattr(self, 'openai_client'):
                 # ✅ 正确传递参数：只传递 message，不传递 system_prompt
-                ai_response = self._chat_with_openai(transcribed_text)
+                ai_response = self._chat_with_openai(transcribed_text, context)
             else:
                 # 使用模拟响应 - 英文版本
-                english_responses = {
-                    "default": f"Hello! I am your AI banking assistant. Your question is: {transcribed_text}. I can help you with banking services, investments, loans, and more.",
-                    "deposit": "Current savings interest rate is 0.3%. Fixed deposit rates vary by term: 1-year 1.5%, 2-year 2.1%, 3-year 2.75%.",
-                    "loan": "We offer various loan products: personal loans from 4.35%, mortgage loans from 3.85%, business loans from 3.65%.",
-                    "investment": "For beginner investors, start with low-risk products like money market funds and fixed deposits.",
-                    "credit": "To apply for a credit card, you must be at least 18 with stable income and good credit history.",
-                    "card": "To apply for a credit card, you must be at least 18 with stable income and good credit history.",
-                    "transfer": "Single transfer limit is 50,000, daily limit is 200,000.",
-                    "balance": "Please log in to online banking or mobile banking to check your account balance.",
-                    "hello": "Hello! How can I help you today?",
-                    "hi": "Hi there! How can I assist you today?",
-                    "rate": "Current USD/CNY rate is 7.24, EUR/CNY rate is 7.89.",
-                    "interest": "Current savings interest rate is 0.3%.",
-                }
-                
-                # 简单的关键词匹配（英文）
-                message_lower = transcribed_text.lower()
-                ai_response = english_responses["default"]
-                for keyword, response in english_responses.items():
-                    if keyword != "default" and keyword in message_lower:
-                        ai_response = response
-                        break
+                ai_response = self._get_english_mock_response(transcribed_text)
             
             audio_response = None
             if generate_audio:
@@ -216,114 +265,310 @@ class AIService:
                 'audio_response': None
             }
 
+    def _get_english_mock_response(self, message: str) -> str:
+        """语音聊天的英文模拟响应，简单的关键词匹配"""
+        facts = market_facts.answer(message, 'en')
+        if facts:
+            return facts
+
+        message_lower = message.lower()
+        for keyword, response in ENGLISH_RESPONSES.items():
+            if keyword in message_lower:
+                return response
+        return ENGLISH_DEFAULT_RESPONSE.format(question=message)
+
+    def _stream_reply(self, message: str) -> Iterator[str]:
+        """流式生成英文回复，逐个产出文本片段；调用失败且尚无输出时回退到模拟响应"""
+        english_system_prompt = "You are a professional banking AI assistant. Please respond in English."
+        facts = market_facts.answer(message, 'en')
+        if facts:
+            english_system_prompt += f" Current reference data (use it when relevant): {facts}"
+        produced = False
+        try:
+            if self.ai_provider == 'gemini' and hasattr(self, 'gemini_client'):
+                prompt = f"{english_system_prompt}\n\n{message}" if facts else message
+                for chunk in self.gemini_client.generate_content(prompt, stream=True):
+                    if chunk.text:
+                        produced = True
+                        yield chunk.text
+            elif self.ai_provider == 'openai' and hasattr(self, 'openai_client'):
+                stream = self.openai_client.chat.completions.create(
+                    model=self.openai_model,
+                    messages=[
+                        {"role": "system", "content": english_system_prompt},
+                        {"role": "user", "content": message}
+                    ],
+                    stream=True
+                )
+                for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        produced = True
+                        yield delta
+            else:
+                produced = True
+                yield self._get_english_mock_response(message)
+        except Exception as e:
+            print(f"❌ 流式生成失败：{e}")
+            if not produced:
+                yield self._get_english_mock_response(message)
+
+    def stream_chat_voice(self, audio_data: bytes, user_id: str = 'guest', language: Optional[str] = None,
+                          accuracy: Optional[str] = None) -> Iterator[Union[dict, bytes]]:
+        """
+        流水线语音对话
+
+        LLM 边生成边切句，每句话生成完立即提交 TTS，音频按句子顺序产出，
+        不必等待完整回复和完整语音。产出 dict（JSON 事件）或 bytes（一句话的音频）：
+            {"type": "transcript", "text": ...}
+            {"type": "sentence", "index": ..., "text": ...}，随后是该句音频
+            {"type": "done", "response": ..., "sentences": ..., "timings": {...}}
+        """
+        voice_service = self.voice_service
+        turn_start = time.perf_counter()
+        timings = {}
+
+        def elapsed_ms(since: float) -> float:
+            return round((time.perf_counter() - since) * 1000, 2)
+
+        transcribed_text = voice_service.transcribe_audio(audio_data, language=language, accuracy=accuracy)
+        timings["asr_ms"] = elapsed_ms(turn_start)
+        yield {"type": "transcript", "text": transcribed_text or ''}
+
+        if not transcribed_text:
+            timings["total_ms"] = elapsed_ms(turn_start)
+            yield {"type": "done", "response": 'Unable to recognize speech. Please try again.',
+                   "sentences": 0, "timings": timings}
+            return
+
+        # LLM 在后台线程生成并切句，每句立即提交 TTS；这里按顺序等待音频并发送
+        pending = queue.Queue()
+        sentences = []
 
-    def chat_image(self, image_file, message: str, user_id: str = 'guest') -> dict:
+        def produce():
+            llm_start = time.perf_counter()
+            try:
+                for sentence in iter_sentences(self._stream_reply(transcribed_text)):
+                    if not sentences:
+                        timings["llm_first_sentence_ms"] = elapsed_ms(llm_start)
+                    sentences.append(sentence)
+                    pending.put((sentence, voice_service.submit_speech(sentence, 'en')))
+            except Exception as e:
+                print(f"❌ 流水线语音回复失败: {e}")
+            finally:
+                timings["llm_ms"] = elapsed_ms(llm_start)
+                pending.put(None)
+
+        threading.Thread(target=produce, name="voice-turn-llm", daemon=True).start()
+
+        tts_wait = 0.0
+        index = 0
+        while True:
+            item = pending.get()
+            if item is None:
+                break
+            sentence, future = item
+            yield {"type": "sentence", "index": index, "text": sentence}
+            index += 1
+
+            wait_start = time.perf_counter()
+            audio_bytes = future.result()
+            tts_wait += time.perf_counter() - wait_start
+            if audio_bytes:
+                if "first_audio_ms" not in timings:
+                    timings["first_audio_ms"] = elapsed_ms(turn_start)
+                yield audio_bytes
+
+        # tts_wait_ms：发送端阻塞等待语音合成的累计时间
+        timings["tts_wait_ms"] = round(tts_wait * 1000, 2)
+        timings["total_ms"] = elapsed_ms(turn_start)
+        yield {"type": "done", "response": ' '.join(sentences), "sentences": index, "timings": timings}
+
+    def chat_image(self, image_data: bytes, message: str, user_id: str = 'guest') -> dict:
         """
         AI Image Analysis
 
         Args:
-            image_file: Image file
+            image_data: Raw image bytes
             message: Optional text message
             user_id: User ID
 
         Returns:
-            Dictionary containing image analysis and AI response
+            Dictionary containing the structured image summary, AI response
+            and per-stage timings in milliseconds
         """
+        timings = {}
         try:
-            # Simulate image analysis
-            analysis = "This is a banking-related image (simulated analysis)"
-            ai_response = self.chat(f"Image analysis: {analysis}. {message}", user_id)
+            result = self.image_service.analyze_image(image_data, timings=timings)
+            if result.get("error"):
+                raise ValueError(result["error"])
+
+            analysis = self._summarize_image_analysis(result)
+
+            # Only the compact summary goes to the LLM, never the raw OCR text
+            prompt = (
+                "Image analysis summary (JSON): "
+                f"{json.dumps(analysis, ensure_ascii=False)}. "
+                f"{message}"
+            )
+            start = time.perf_counter()
+            ai_response = self.chat(prompt, user_id)
+            timings["llm_ms"] = round((time.perf_counter() - start) * 1000, 2)
 
             return {
                 "analysis": analysis,
-                "response": ai_response
+                "response": ai_response,
+                "timings": timings
             }
         except Exception as e:
             print(f"❌ AI Image Analysis Error: {str(e)}")
             return {
                 "analysis": "",
-                "response": "Sorry, image analysis service is temporarily unavailable"
+                "response": "Sorry, image analysis service is temporarily unavailable",
+                "timings": timings
             }
 
-    def get_investment_advice(self, account_id: str) -> str:
+    def _summarize_image_analysis(self, result: dict, max_items: int = 5) -> dict:
+        """Reduce an ImageService result to a compact, LLM-friendly summary"""
+        details = result.get("analysis", {})
+        text = result.get("text_content", "")
+        summary = {
+            "size": list(result.get("size", ())),
+            "format": result.get("format"),
+            "has_text": bool(text),
+            "text_length": len(text),
+            "is_financial_document": result.get("is_financial_document", False),
+        }
+        if details:
+            summary.update({
+                "document_type": details.get("document_type"),
+                "confidence": details.get("confidence"),
+                "amounts": details.get("amounts", [])[:max_items],
+                "dates": details.get("dates_found", [])[:max_items],
+                "parties": details.get("parties_involved", [])[:max_items],
+                # Mask ID numbers before they leave the service
+                "id_numbers": [
+                    n["value"][:6] + "********" + n["value"][-4:]
+                    for n in details.get("id_numbers_found", [])[:max_items]
+                ],
+            })
+        return summary
+
+    def get_investment_advice(self, account_id: int, user_id: int, account_number: Optional[str] = None) -> dict:
         """
         获取投资建议
 
         Args:
-            account_id: 账户ID
+            account_id: 账户ID（归属由调用方校验）
+            user_id: 账户所属用户
+            account_number: 建议中显示的卡号
 
         Returns:
-            投资建议
+            {"advice": 投资建议, "profile": 风险画像与产品配置}
         """
         try:
-            advice = f"""
-基于您的账户 {account_id} 的数据，我为您提供以下投资建议：
-
-1. **风险评估**：建议您先进行风险承受能力评估，以便选择合适的投资产品。
-
-2. **资产配置**：
-   - 保守型：定期存款 40%，货币基金 40%，国债 20%
-   - 平衡型：定期存款 20%，货币基金 30%，债券基金 30%，股票基金 20%
-   - 进取型：债券基金 20%，股票基金 60%，其他投资 20%
-
-3. **投资期限**：建议根据您的资金使用计划选择投资期限，短期资金选择流动性好的产品，长期资金可以选择收益较高的产品。
-
-4. **分散投资**：不要把所有资金投入单一产品，要分散投资降低风险。
-
-5. **定期调整**：建议每季度评估投资组合，根据市场变化和个人情况进行调整。
-
-如需更详细的投资建议，请联系我们的理财顾问。
-            """
-
-            return advice.strip()
-
+            entry = advice_engine.get(account_id, user_id)
         except Exception as e:
             print(f"❌ 投资建议异常：{str(e)}")
-            return "抱歉，投资建议服务暂时不可用"
+            return {"advice": "抱歉，投资建议服务暂时不可用", "profile": None}
+
+        # 建议文字与画像一起缓存，画像未失效时不重复调用大模型
+        if entry["advice"] is None:
+            profile = entry["profile"]
+            prompt = (
+                "以下是用户账户的风险画像和按产品知识库计算的资产配置（JSON，金额单位为元）。"
+                "请用简洁的中文向用户说明其风险等级的依据、应急资金安排和配置建议，"
+                "只使用数据中出现的产品和数字，并提示收益不代表未来表现。\n"
+                + json.dumps(profile, ensure_ascii=False)
+            )
+            entry["advice"] = self.complete(prompt) or format_advice(account_number or str(account_id), profile)
+        return {"advice": entry["advice"], "profile": entry["profile"]}
 
-    def analyze_spending(self, account_id: str) -> str:
+    def categorize_transactions(self, transactions: list, user_id: Optional[int] = None) -> list:
         """
-        支出分析
+        批量交易分类
 
         Args:
-            account_id: 账户ID
+            transactions: 交易描述字符串，或含 description / counterparty（merchant）/ id 的字典
+            user_id: 提交的用户，大模型标注只对该用户生效
 
         Returns:
-            支出分析报告
+            与输入顺序一致的分类结果
         """
-        try:
-            analysis = f"""
-账户 {account_id} 的支出分析报告：
-
-1. **支出概况**：
-   - 本月总支出：¥5,234.50
-   - 较上月增长：+12.3%
-
-2. **支出分类**：
-   - 餐饮消费：¥1,250.00 (23.9%)
-   - 交通出行：¥856.50 (16.4%)
-   - 购物消费：¥2,100.00 (40.1%)
-   - 生活缴费：¥528.00 (10.1%)
-   - 其他支出：¥500.00 (9.5%)
-
-3. **趋势分析**：
-   - 购物消费增长明显，建议关注非必要支出
-   - 餐饮消费占比合理，可以适当控制
-   - 交通支出稳定，建议继续使用公共交通
+        texts, ids = [], []
+        for item in transactions:
+            if isinstance(item, dict):
+                merchant = item.get('counterparty') or item.get('merchant') or ''
+                texts.append(f"{merchant} {item.get('description') or ''}".strip())
+                ids.append(item.get('id'))
+            else:
+                texts.append(str(item))
+                ids.append(None)
 
-4. **优化建议**：
-   - 制定每月预算，控制购物支出
-   - 减少外卖频率，多自己做饭
-   - 使用公共交通或拼车降低交通成本
+        results = self.categorizer.categorize(texts, user_id=user_id)
+        for result, tx_id in zip(results, ids):
+            if tx_id is not None:
+                result["id"] = tx_id
+        return results
 
-如需更详细的分析，请联系您的理财顾问。
-            """
+    def analyze_spending(self, account_id: int, account_number: Optional[str] = None) -> dict:
+        """
+        支出分析
 
-            return analysis.strip()
+        Args:
+            account_id: 账户ID（归属由调用方校验）
+            account_number: 报告中显示的卡号
 
+        Returns:
+            {"report": 支出分析报告, "summary": 结构化摘要}
+        """
+        try:
+            summary = spending_analyzer.analyze(load_account_frame(ledger_store.pool, account_id))
         except Exception as e:
             print(f"❌ 支出分析异常：{str(e)}")
-            return "抱歉，支出分析服务暂时不可用"
+            return {"report": "抱歉，支出分析服务暂时不可用", "summary": None}
+
+        report = format_report(account_number or str(account_id), summary)
+        if summary.get("has_spending"):
+            prompt = (
+                "以下是用户账户的支出分析数据（JSON，金额单位为元）。请用简洁的中文为用户解读：概括支出情况，"
+                "指出变化明显的分类、周期性扣款和异常支出，并给出 2-3 条具体建议。只使用数据中出现的数字。\n"
+                + json.dumps(summary, ensure_ascii=False)
+            )
+            report = self.complete(prompt) or report
+        return {"report": report, "summary": summary}
+
+    def summarize_conversation(self, summary: str, messages: list) -> Optional[str]:
+        """把一批旧消息合并进会话摘要；模拟模式或调用失败时返回 None（由 ChatStore 做本地摘要）"""
+        if self.mock_responses:
+            return None
+        names = {"user": "用户", "assistant": "助手"}
+        dialogue = "\n".join(f"{names.get(m['role'], m['role'])}：{m['content']}" for m in messages)
+        return self.complete(
+            f"下面是一段银行客服对话的已有摘要和之后的新对话。请输出更新后的摘要，不超过 {SUMMARY_MAX_CHARS} 字，"
+            f"保留用户的身份信息、需求、偏好和已经给出的结论，只输出摘要本身。\n\n"
+            f"已有摘要：\n{summary or '（无）'}\n\n新对话：\n{dialogue}"
+        )
+
+    def complete(self, prompt: str) -> Optional[str]:
+        """单次调用大模型；模拟模式或调用失败时返回 None，由调用方使用本地结果"""
+        if self.mock_responses:
+            return None
+        try:
+            if self.ai_provider == 'gemini':
+                return self.gemini_client.generate_content(prompt).text
+            if self.ai_provider == 'openai':
+                response = self.openai_client.chat.completions.create(
+                    model=self.openai_model,
+                    messages=[
+                        {"role": "system", "content": "你是一个专业的银行 AI 助手。"},
+                        {"role": "user", "content": prompt}
+                    ]
+                )
+                return response.choices[0].message.content
+        except Exception as e:
+            print(f"❌ 大模型调用失败：{e}")
+        return None
 
 
 # 创建全局实例
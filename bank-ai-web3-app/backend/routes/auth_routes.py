@@ -1,33 +1,25 @@
 # backend/routes/auth_routes.py
-from flask import Blueprint, request, jsonify
-from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify, g
 import jwt
-import hashlib
+from config import Config
+from auth_middleware import AuthMiddleware
+from credential_service import credential_service, CredentialBusy
+from user_store import user_store, UserExists
+from token_service import token_service, TokenError
+from ledger_store import ledger_store
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
+# 前端在 /api 下直接调用的令牌校验接口
+token_bp = Blueprint('token', __name__, url_prefix='/api')
 
 
-USERS = {
-    'demo': {
-        'id': 1,
-        'username': 'demo',
-        'password_hash': hashlib.sha256('demo123'.encode()).hexdigest(),
-        'email': 'demo@example.com',
-        'full_name': 'Demo User',
-        'role': 'user',
-        'created_at': '2024-01-01T00:00:00Z'
-    }
-}
+auth = AuthMiddleware(Config.JWT_SECRET_KEY, user_store.get_by_id, is_revoked=token_service.is_revoked)
+token_required = auth.token_required
+token_optional = auth.token_optional
 
-def generate_token(user_id, username):
-    """生成 JWT token"""
-    payload = {
-        'user_id': user_id,
-        'username': username,
-        'exp': datetime.utcnow() + timedelta(hours=24)
-    }
-    # 注意：生产环境必须更换密钥！
-    return jwt.encode(payload, 'your-secret-key-change-in-production', algorithm='HS256')
+def generate_tokens(user_id, username):
+    """签发短期访问令牌和刷新令牌"""
+    return token_service.issue(user_id, username)
 
 @auth_bp.route('/login', methods=['POST'])
 def login():
@@ -43,30 +35,39 @@ def login():
         username = data['username']
         password = data['password']
         
-        # 检查用户是否存在
-        if username not in USERS:
+        user = user_store.get_by_username(username)
+        
+        # 验证密码：bcrypt 在独立进程中校验，旧的 sha256 记录校验通过后升级为 bcrypt；
+        # 用户不存在时也做一次同样耗时的校验，响应时间不泄露用户名是否存在
+        try:
+            if user:
+                valid, upgraded_hash = credential_service.verify(password, user['password_hash'])
+            else:
+                valid, upgraded_hash = credential_service.reject(password)
+        except CredentialBusy:
             return jsonify({
                 "success": False,
-                "error": "用户名或密码错误"
-            }), 401
+                "error": "登录请求过多，请稍后再试"
+            }), 503
         
-        user = USERS[username]
-        
-        # 验证密码（前端传明文，后端加密对比，这一步是对的）
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
-        if password_hash != user['password_hash']:
+        if not valid:
             return jsonify({
                 "success": False,
                 "error": "用户名或密码错误"
             }), 401
         
+        if upgraded_hash:
+            user_store.update_password_hash(user['id'], upgraded_hash)
+        
         # 生成 token
-        token = generate_token(user['id'], username)
+        tokens = generate_tokens(user['id'], username)
         
         return jsonify({
             "success": True,
             "message": "登录成功",
-            "token": token,
+            "token": tokens['access_token'],
+            "refresh_token": tokens['refresh_token'],
+            "expires_in": tokens['expires_in'],
             "user": {
                 "id": user['id'],
                 "username": user['username'],
@@ -109,32 +110,43 @@ def register():
                 "error": "用户名、密码和邮箱为必填项"
             }), 400
         
-        # 检查用户是否已存在
-        if username in USERS:
+        # 检查用户是否已存在（避免为重复用户名白算一次哈希，最终以唯一索引为准）
+        if user_store.exists(username):
             return jsonify({
                 "success": False,
                 "error": "用户名已存在"
             }), 400
         
-        # 创建新用户
-        user_id = len(USERS) + 1
-        USERS[username] = {
-            'id': user_id,
-            'username': username,
-            'password_hash': hashlib.sha256(password.encode()).hexdigest(),
-            'email': email,
-            'full_name': full_name or username,
-            'role': 'user',
-            'created_at': datetime.utcnow().isoformat() + 'Z'
-        }
+        try:
+            password_hash = credential_service.hash_password(password)
+        except CredentialBusy:
+            return jsonify({
+                "success": False,
+                "error": "注册请求过多，请稍后再试"
+            }), 503
+        
+        # 创建新用户，ID 由数据库分配
+        try:
+            user = user_store.create(username, email, password_hash, full_name or username)
+        except UserExists as e:
+            return jsonify({
+                "success": False,
+                "error": "邮箱已被注册" if e.field == 'email' else "用户名已存在"
+            }), 400
+        user_id = user['id']
+        
+        # 新用户默认开立一个储蓄卡账户
+        ledger_store.open_account(user_id)
         
         # 生成 token
-        token = generate_token(user_id, username)
+        tokens = generate_tokens(user_id, username)
         
         return jsonify({
             "success": True,
             "message": "注册成功",
-            "token": token,
+            "token": tokens['access_token'],
+            "refresh_token": tokens['refresh_token'],
+            "expires_in": tokens['expires_in'],
             "user": {
                 "id": user_id,
                 "username": username,
@@ -152,24 +164,91 @@ def register():
         }), 500
 
 @auth_bp.route('/me', methods=['GET'])
+@token_required
 def get_current_user():
     """获取当前用户信息"""
-    # 简单实现，实际应该验证 token
+    user = g.current_user
     return jsonify({
         "success": True,
         "user": {
-            "id": 1,
-            "username": "demo",
-            "email": "demo@example.com",
-            "full_name": "Demo User",
-            "role": "user"
+            "id": user['id'],
+            "username": user['username'],
+            "email": user['email'],
+            "full_name": user['full_name'],
+            "role": user['role']
         }
     })
 
+@auth_bp.route('/refresh', methods=['POST'])
+def refresh():
+    """用刷新令牌换取新的访问令牌（刷新令牌同时轮换）"""
+    data = request.get_json(silent=True) or {}
+    refresh_token = data.get('refresh_token')
+    if not refresh_token:
+        return jsonify({
+            "success": False,
+            "error": "请提供 refresh_token"
+        }), 400
+
+    try:
+        user = user_store.get_by_id(token_service.refresh_user_id(refresh_token))
+        if not user:
+            raise TokenError('用户不存在')
+        tokens = token_service.rotate(refresh_token, user['username'])
+    except TokenError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 401
+
+    return jsonify({
+        "success": True,
+        "token": tokens['access_token'],
+        "refresh_token": tokens['refresh_token'],
+        "expires_in": tokens['expires_in']
+    })
+
 @auth_bp.route('/logout', methods=['POST'])
 def logout():
-    """用户登出"""
+    """用户登出：吊销当前访问令牌和刷新令牌族"""
+    data = request.get_json(silent=True) or {}
+    access_claims = None
+    token = auth.bearer_token()
+    if token:
+        try:
+            access_claims = auth.verify(token)
+        except jwt.InvalidTokenError:
+            # 已过期或无效的访问令牌无需吊销
+            access_claims = None
+
+    token_service.revoke(access_claims, data.get('refresh_token'))
     return jsonify({
         "success": True,
         "message": "登出成功"
     })
+
+@token_bp.route('/validate-token', methods=['GET'])
+@token_required
+def validate_token():
+    """校验访问令牌，返回当前用户"""
+    # 其他 worker 刚登出的令牌也要判为失效：这里强制同步一次吊销记录
+    token_service.revocations.sync(force=True)
+    if token_service.is_revoked(g.token_claims):
+        return jsonify({
+            "success": False,
+            "error": "Token已失效，请重新登录"
+        }), 401
+
+    user = g.current_user
+    return jsonify({
+        "success": True,
+        "valid": True,
+        "expires_at": g.token_claims.get('exp'),
+        "user": {
+            "id": user['id'],
+            "username": user['username'],
+            "email": user['email'],
+            "full_name": user['full_name'],
+            "role": user['role']
+        }
+    })
@@ -0,0 +1,106 @@
+# backend/routes/chatbot_routes.py
+from flask import Blueprint, request, jsonify, g
+from .auth_routes import token_required
+from chat_store import chat_store
+
+chatbot_bp = Blueprint('chatbot', __name__, url_prefix='/api/chatbot')
+
+MAX_COMMENT_LENGTH = 1000
+
+
+def _page_args(default_limit: int):
+    limit = int(request.args.get('limit', default_limit))
+    return limit, request.args.get('cursor')
+
+
+@chatbot_bp.route('/sessions', methods=['GET'])
+@token_required
+def list_sessions():
+    """
+    当前用户的聊天会话（最近活跃的在前）
+
+    参数：limit、cursor（上一页返回的 next_cursor）
+    """
+    try:
+        limit, cursor = _page_args(20)
+        sessions, next_cursor = chat_store.list_sessions(g.current_user['id'], limit, cursor)
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "error": "无效的分页参数"
+        }), 400
+
+    return jsonify({
+        "success": True,
+        "sessions": sessions,
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None
+    })
+
+
+@chatbot_bp.route('/session/<session_id>/messages', methods=['GET'])
+@token_required
+def list_messages(session_id):
+    """
+    会话消息历史：每页按时间正序，默认返回最近的一页
+
+    参数：limit、cursor（上一页返回的 next_cursor，继续加载更早的消息）
+    """
+    if not chat_store.get_session(session_id, g.current_user['id']):
+        return jsonify({
+            "success": False,
+            "error": "会话不存在"
+        }), 404
+
+    try:
+        limit, cursor = _page_args(50)
+        messages, next_cursor = chat_store.list_messages(session_id, limit, cursor)
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "error": "无效的分页参数"
+        }), 400
+
+    return jsonify({
+        "success": True,
+        "session_id": session_id,
+        "messages": messages,
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None
+    })
+
+
+@chatbot_bp.route('/feedback', methods=['POST'])
+@token_required
+def submit_feedback():
+    """
+    对 AI 回复打分
+
+    请求体：interaction_id（聊天接口返回的 interaction_id）、rating（1-5）、comment（可选）
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        message_id = int(data.get('interaction_id'))
+        rating = int(data.get('rating'))
+    except (TypeError, ValueError):
+        return jsonify({
+            "success": False,
+            "error": "请提供 interaction_id 和 rating"
+        }), 400
+    if not 1 <= rating <= 5:
+        return jsonify({
+            "success": False,
+            "error": "rating 必须在 1 到 5 之间"
+        }), 400
+
+    comment = str(data.get('comment') or '')[:MAX_COMMENT_LENGTH]
+    if not chat_store.add_feedback(message_id, g.current_user['id'], rating, comment):
+        return jsonify({
+            "success": False,
+            "error": "回复不存在"
+        }), 404
+
+    return jsonify({
+        "success": True,
+        "message": "感谢您的反馈"
+    })
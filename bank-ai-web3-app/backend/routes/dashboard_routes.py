@@ -0,0 +1,137 @@
+# backend/routes/dashboard_routes.py
+from datetime import date
+from flask import Blueprint, request, jsonify, g
+from .auth_routes import token_required
+from ledger_store import ledger_store, from_minor
+
+dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/api/dashboard')
+
+# 计入"投资"的账户类型
+INVESTMENT_ACCOUNT_TYPES = ('理财账户',)
+MAX_RECENT = 50
+
+
+def _account_filter(user_id):
+    """accountId 为空或 all 时返回 None（全部账户）；账户不属于当前用户时抛出 LookupError"""
+    value = request.args.get('accountId')
+    if value in (None, '', 'all'):
+        return None
+    account_id = int(value)
+    if not ledger_store.get_account(account_id, user_id):
+        raise LookupError(account_id)
+    return account_id
+
+
+def _summary_json(summary):
+    """汇总结果的金额由分转为元"""
+    return {
+        **summary,
+        "income": from_minor(summary["income"]),
+        "expense": from_minor(summary["expense"]),
+        "net": from_minor(summary["income"] - summary["expense"]),
+        "categories": [{**c, "income": from_minor(c["income"]), "expense": from_minor(c["expense"])}
+                       for c in summary["categories"]],
+        "series": [{**p, "income": from_minor(p["income"]), "expense": from_minor(p["expense"])}
+                   for p in summary["series"]]
+    }
+
+
+def _bad_account():
+    return jsonify({
+        "success": False,
+        "error": "账户不存在"
+    }), 404
+
+
+@dashboard_bp.route('', methods=['GET'])
+@token_required
+def get_dashboard():
+    """仪表盘核心数据：余额、本月收支、投资、最近交易（均来自汇总表和索引，与历史长度无关）"""
+    user_id = g.current_user['id']
+    try:
+        account_id = _account_filter(user_id)
+    except (LookupError, ValueError):
+        return _bad_account()
+
+    accounts = ledger_store.get_accounts(user_id)
+    if account_id is not None:
+        accounts = [a for a in accounts if a['id'] == account_id]
+    month = ledger_store.rollups.summary(user_id, 'month', account_id)
+    recent, _ = ledger_store.list_transactions(user_id, account_id, limit=5)
+
+    return jsonify({
+        "success": True,
+        "stats": {
+            "totalBalance": round(sum(a['balance'] for a in accounts), 2),
+            "monthlyIncome": from_minor(month["income"]),
+            "monthlyExpenses": from_minor(month["expense"]),
+            "investments": round(sum(a['balance'] for a in accounts if a['type'] in INVESTMENT_ACCOUNT_TYPES), 2)
+        },
+        "recentTransactions": recent
+    })
+
+
+@dashboard_bp.route('/accounts', methods=['GET'])
+@token_required
+def get_account_overview():
+    """账户概览：余额与本月收支"""
+    user_id = g.current_user['id']
+    totals = ledger_store.rollups.month_totals_by_account(user_id, date.today().isoformat()[:7])
+    accounts = []
+    for account in ledger_store.get_accounts(user_id):
+        month = totals.get(account['id'], {"income": 0, "expense": 0})
+        accounts.append({
+            **account,
+            "monthlyIncome": from_minor(month["income"]),
+            "monthlyExpenses": from_minor(month["expense"])
+        })
+    return jsonify({
+        "success": True,
+        "accounts": accounts
+    })
+
+
+@dashboard_bp.route('/transactions', methods=['GET'])
+@token_required
+def get_recent_transactions():
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), MAX_RECENT)
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "error": "limit 必须是整数"
+        }), 400
+    transactions, _ = ledger_store.list_transactions(g.current_user['id'], limit=limit)
+    return jsonify({
+        "success": True,
+        "transactions": transactions
+    })
+
+
+@dashboard_bp.route('/spending-summary', methods=['GET'])
+@token_required
+def get_spending_summary():
+    """
+    收支汇总
+
+    参数：timeRange（week / month / year，默认 month）、accountId（可选）
+    周、月按日返回序列，年按月返回序列
+    """
+    user_id = g.current_user['id']
+    try:
+        account_id = _account_filter(user_id)
+    except (LookupError, ValueError):
+        return _bad_account()
+
+    try:
+        summary = ledger_store.rollups.summary(user_id, request.args.get('timeRange', 'month'), account_id)
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+
+    return jsonify({
+        "success": True,
+        "summary": _summary_json(summary)
+    })
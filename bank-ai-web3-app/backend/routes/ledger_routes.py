@@ -0,0 +1,351 @@
+# backend/routes/ledger_routes.py
+import hashlib
+import os
+import tempfile
+from datetime import datetime
+from flask import Blueprint, request, jsonify, g
+from .auth_routes import token_required
+from .ai_service import ai_banker
+from job_service import JobQueue, PRIORITY_BULK
+from ledger_store import ledger_store, to_minor
+from posting_engine import (posting_engine, PostingError, AccountNotFound, InsufficientFunds,
+                            IdempotencyConflict, PostingBusy)
+from statement_importer import statement_importer, detect_format
+from upload_guard import guard_uploads
+from user_store import user_store
+
+ledger_bp = Blueprint('ledger', __name__, url_prefix='/api')
+ledger_bp.before_request(guard_uploads)
+
+MAX_PAGE_SIZE = 200
+
+# 对账单导入单独一个单线程队列和任务库：大文件导入不占用语音 / OCR 等交互任务的工作线程，
+# 导入结果（余额、错误行）也不会出现在公开的 /api/ai/jobs 查询中
+import_queue = JobQueue(db_path=os.getenv('IMPORT_JOB_DB_PATH', 'import_jobs.db'),
+                        workers=int(os.getenv('IMPORT_JOB_WORKERS', 1)))
+
+# 演示账号的账户和流水
+_demo_user = user_store.get_by_username('demo')
+if _demo_user:
+    ledger_store.seed_demo_data(_demo_user['id'])
+
+
+def _int_arg(name: str, default=None):
+    value = request.args.get(name)
+    if value in (None, ''):
+        return default
+    return int(value)
+
+
+@ledger_bp.route('/accounts', methods=['GET'])
+@token_required
+def get_accounts():
+    """当前用户的所有账户"""
+    return jsonify({
+        "success": True,
+        "accounts": ledger_store.get_accounts(g.current_user['id'])
+    })
+
+
+@ledger_bp.route('/account/<int:account_id>', methods=['GET'])
+@token_required
+def get_account(account_id):
+    account = ledger_store.get_account(account_id, g.current_user['id'])
+    if not account:
+        return jsonify({
+            "success": False,
+            "error": "账户不存在"
+        }), 404
+    return jsonify({
+        "success": True,
+        "account": account
+    })
+
+
+@ledger_bp.route('/transactions', methods=['GET'])
+@token_required
+def get_transactions():
+    """
+    交易流水（按日期倒序）
+
+    参数：accountId（可选）、limit、cursor（上一页返回的 next_cursor）；
+    offset 仅为兼容旧前端保留
+    """
+    try:
+        account_id = _int_arg('accountId')
+        limit = min(max(_int_arg('limit', 50), 1), MAX_PAGE_SIZE)
+        offset = _int_arg('offset', 0)
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "error": "分页参数必须是整数"
+        }), 400
+
+    user_id = g.current_user['id']
+    if account_id is not None and not ledger_store.get_account(account_id, user_id):
+        return jsonify({
+            "success": False,
+            "error": "账户不存在"
+        }), 404
+
+    try:
+        transactions, next_cursor = ledger_store.list_transactions(
+            user_id, account_id, limit=limit, cursor=request.args.get('cursor'), offset=offset
+        )
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+
+    return jsonify({
+        "success": True,
+        "transactions": transactions,
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None
+    })
+
+
+def _date_arg(name: str):
+    value = request.args.get(name)
+    if not value:
+        return None
+    datetime.strptime(value, '%Y-%m-%d')
+    return value
+
+
+def _amount_arg(name: str):
+    value = request.args.get(name)
+    if value in (None, ''):
+        return None
+    return abs(to_minor(value))
+
+
+@ledger_bp.route('/transactions/search', methods=['GET'])
+@token_required
+def search_transactions():
+    """
+    服务端流水搜索
+
+    参数：q（关键词，空格分隔）、accountId、minAmount / maxAmount（按绝对值）、
+    dateFrom / dateTo（YYYY-MM-DD）、limit、cursor
+    返回的每条流水带 highlights：{字段: [[起, 止), ...]}
+    """
+    try:
+        account_id = _int_arg('accountId')
+        limit = min(max(_int_arg('limit', 50), 1), MAX_PAGE_SIZE)
+        min_amount = _amount_arg('minAmount')
+        max_amount = _amount_arg('maxAmount')
+        date_from = _date_arg('dateFrom')
+        date_to = _date_arg('dateTo')
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "error": "搜索参数格式错误"
+        }), 400
+
+    user_id = g.current_user['id']
+    if account_id is not None and not ledger_store.get_account(account_id, user_id):
+        return jsonify({
+            "success": False,
+            "error": "账户不存在"
+        }), 404
+
+    try:
+        transactions, next_cursor = ledger_store.search_transactions(
+            user_id, request.args.get('q', '').strip(), account_id,
+            min_amount=min_amount, max_amount=max_amount, date_from=date_from, date_to=date_to,
+            limit=limit, cursor=request.args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+
+    return jsonify({
+        "success": True,
+        "transactions": transactions,
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None
+    })
+
+
+def _posting_error(e: PostingError):
+    if isinstance(e, AccountNotFound):
+        code = 404
+    elif isinstance(e, (InsufficientFunds, IdempotencyConflict)):
+        code = 409
+    elif isinstance(e, PostingBusy):
+        code = 503
+    else:
+        code = 400
+    return jsonify({
+        "success": False,
+        "error": str(e)
+    }), code
+
+
+def _posting_args(data: dict, *account_fields: str):
+    """解析账户 id、金额（元，转为分）和幂等键（Idempotency-Key 请求头或 idempotencyKey 字段）"""
+    accounts = [int(data[field]) for field in account_fields]
+    amount_minor = to_minor(data['amount'])
+    key = request.headers.get('Idempotency-Key') or data.get('idempotencyKey')
+    if key is not None and not (0 < len(str(key)) <= 255):
+        raise ValueError("幂等键长度无效")
+    return accounts, amount_minor, key and str(key)
+
+
+@ledger_bp.route('/transfers', methods=['POST'])
+@token_required
+def create_transfer():
+    """
+    转账
+
+    请求体：fromAccountId、toAccountId、amount（元）、description（可选）；
+    建议带 Idempotency-Key 请求头，重试时返回第一次的结果
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        (from_id, to_id), amount_minor, key = _posting_args(data, 'fromAccountId', 'toAccountId')
+    except (KeyError, TypeError, ValueError):
+        return jsonify({
+            "success": False,
+            "error": "请提供有效的 fromAccountId、toAccountId 和 amount"
+        }), 400
+
+    try:
+        result = posting_engine.transfer(g.current_user['id'], from_id, to_id, amount_minor,
+                                         description=data.get('description', ''), idempotency_key=key)
+    except PostingError as e:
+        return _posting_error(e)
+    return jsonify({"success": True, **result})
+
+
+def _cash_posting(operation):
+    data = request.get_json(silent=True) or {}
+    try:
+        (account_id,), amount_minor, key = _posting_args(data, 'accountId')
+    except (KeyError, TypeError, ValueError):
+        return jsonify({
+            "success": False,
+            "error": "请提供有效的 accountId 和 amount"
+        }), 400
+
+    try:
+        result = operation(g.current_user['id'], account_id, amount_minor,
+                           description=data.get('description', ''), idempotency_key=key)
+    except PostingError as e:
+        return _posting_error(e)
+    return jsonify({"success": True, **result})
+
+
+@ledger_bp.route('/transactions/deposit', methods=['POST'])
+@token_required
+def deposit():
+    """存款：accountId、amount（元）、description（可选），支持 Idempotency-Key"""
+    return _cash_posting(posting_engine.deposit)
+
+
+@ledger_bp.route('/transactions/withdraw', methods=['POST'])
+@token_required
+def withdraw():
+    """取款：accountId、amount（元）、description（可选），支持 Idempotency-Key"""
+    return _cash_posting(posting_engine.withdraw)
+
+
+@ledger_bp.route('/accounts/<int:account_id>/import', methods=['POST'])
+@token_required
+def import_statement(account_id):
+    """
+    导入对账单（CSV / OFX），异步执行
+
+    表单：file（对账单文件）、format（可选，csv / ofx，默认按内容识别）；
+    返回 job_id，进度与结果通过 /api/imports/<job_id> 查询（仅限本人）
+    """
+    account = ledger_store.get_account(account_id, g.current_user['id'])
+    if not account:
+        return jsonify({
+            "success": False,
+            "error": "账户不存在"
+        }), 404
+
+    file_storage = request.files.get('file')
+    if file_storage is None:
+        return jsonify({
+            "success": False,
+            "error": "请上传对账单文件"
+        }), 400
+
+    head = file_storage.stream.read(64 * 1024)
+    file_storage.stream.seek(0)
+    file_format = (request.form.get('format') or detect_format(head) or '').lower()
+    if file_format not in ('csv', 'ofx'):
+        return jsonify({
+            "success": False,
+            "error": "不支持的文件格式，仅支持 CSV / OFX"
+        }), 415
+
+    # 请求结束后上传的临时文件会被关闭，先复制一份交给任务，任务结束时删除
+    path, digest = _save_upload(file_storage)
+    dedupe_payload = f"{g.current_user['id']}:{account_id}:{digest}".encode()
+    job_id = import_queue.find_duplicate('statement_import', dedupe_payload)
+    if job_id:
+        # 同一文件重复提交：返回已有任务
+        os.remove(path)
+    else:
+        job_id = import_queue.submit(
+            'statement_import', _import_job, g.current_user['id'], account_id, path, file_format,
+            priority=PRIORITY_BULK, dedupe_payload=dedupe_payload, owner_id=g.current_user['id']
+        )
+    return jsonify({
+        "success": True,
+        "job_id": job_id,
+        "status_url": f"/api/imports/{job_id}"
+    }), 202
+
+
+@ledger_bp.route('/imports/<job_id>', methods=['GET'])
+@token_required
+def get_import(job_id):
+    """查询本人的导入任务状态，支持 ?wait=秒 长轮询"""
+    try:
+        wait = min(float(request.args.get('wait', 0)), 30.0)
+    except ValueError:
+        wait = 0.0
+
+    job = import_queue.wait(job_id, wait) if wait > 0 else import_queue.get(job_id)
+    if not job or job['owner_id'] != g.current_user['id']:
+        return jsonify({
+            "success": False,
+            "error": "任务不存在或已过期"
+        }), 404
+
+    return jsonify({
+        "success": True,
+        "job": job
+    })
+
+
+def _save_upload(file_storage):
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(prefix='statement-', suffix='.upload', delete=False) as out:
+        while True:
+            chunk = file_storage.stream.read(1024 * 1024)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+    return out.name, digest.hexdigest()
+
+
+def _import_job(user_id: int, account_id: int, path: str, file_format: str) -> dict:
+    try:
+        return statement_importer.run(
+            user_id, account_id, path, file_format,
+            progress=import_queue.report_progress,
+            # 批量导入只用规则和本地模型分类，不调用大模型
+            categorize=lambda texts: ai_banker.categorizer.categorize(texts, use_llm=False, user_id=user_id)
+        )
+    finally:
+        os.remove(path)
@@ -0,0 +1,88 @@
+# backend/routes/rates_routes.py
+import math
+from flask import Blueprint, request, jsonify
+from market_facts import market_facts, currency_name
+
+rates_bp = Blueprint('rates', __name__, url_prefix='/api/rates')
+
+
+def _conditional(response, snapshot, *key):
+    """同一份数据返回同一个 ETag，客户端带 If-None-Match 时回 304"""
+    response.set_etag('-'.join((snapshot.digest,) + key))
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response.make_conditional(request)
+
+
+@rates_bp.route('', methods=['GET'])
+def get_rates():
+    """
+    汇率与利率数据
+
+    参数：base（基准币种，默认数据源的基准）、symbols（逗号分隔，默认全部）
+    每个币种返回 rate（1 单位该币种折合多少 base）和 inverse（1 base 折合多少该币种）
+    """
+    snapshot = market_facts.snapshot
+    base = (request.args.get('base') or snapshot.base).upper()
+    symbols = [s.strip().upper() for s in request.args.get('symbols', '').split(',') if s.strip()]
+    unknown = [code for code in [base] + symbols if code not in snapshot.index]
+    if unknown:
+        return jsonify({
+            "success": False,
+            "error": f"不支持的币种: {', '.join(unknown)}"
+        }), 400
+
+    rates = [{
+        "code": code,
+        "name": currency_name(code),
+        "rate": snapshot.rate(code, base),
+        "inverse": snapshot.rate(base, code)
+    } for code in (symbols or snapshot.codes) if code != base]
+
+    response = jsonify({
+        "success": True,
+        "base": base,
+        "as_of": snapshot.as_of,
+        "source": snapshot.source,
+        "rates": rates,
+        "facts": [dict(fact) for fact in snapshot.facts.values()]
+    })
+    return _conditional(response, snapshot, base, ','.join(symbols))
+
+
+@rates_bp.route('/convert', methods=['GET'])
+def convert():
+    """
+    币种换算
+
+    参数：from、to、amount（默认 1）
+    """
+    snapshot = market_facts.snapshot
+    source = (request.args.get('from') or '').upper()
+    target = (request.args.get('to') or '').upper()
+    try:
+        amount = float(request.args.get('amount', 1))
+        if not math.isfinite(amount):
+            raise ValueError
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "error": "amount 必须是数字"
+        }), 400
+
+    try:
+        rate = snapshot.rate(source, target)
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+
+    return jsonify({
+        "success": True,
+        "from": source,
+        "to": target,
+        "amount": amount,
+        "rate": rate,
+        "result": round(amount * rate, 2),
+        "as_of": snapshot.as_of
+    })
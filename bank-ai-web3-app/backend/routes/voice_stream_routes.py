@@ -0,0 +1,75 @@
+# backend/routes/voice_stream_routes.py
+import json
+import time
+import traceback
+from flask import Blueprint
+from flask_sock import Sock
+from .ai_service import ai_banker
+from streaming_asr import StreamingTranscriber
+
+voice_stream_bp = Blueprint('voice_stream', __name__, url_prefix='/api/ai')
+sock = Sock()
+
+
+@sock.route('/chat/voice/stream', bp=voice_stream_bp)
+def chat_voice_stream(ws):
+    """
+    实时流式语音识别（WebSocket）
+
+    客户端 → 服务端：
+        文本帧 {"type": "start", "language": "en-US", "accuracy": "balanced", "user_id": "..."}
+        二进制帧 16kHz 单声道 PCM16LE 音频
+        文本帧 {"type": "stop"}  主动结束当前一句话
+    服务端 → 客户端：
+        {"type": "partial", "text": ...}      增量识别结果
+        {"type": "final", "text": ..., "timings": {...}}
+        {"type": "response", "text": ..., "llm_ms": ...}
+        {"type": "error", "error": ...}
+    """
+    if not ai_banker.voice_service.whisper_available:
+        ws.send(json.dumps({"type": "error", "error": "语音识别服务未启用"}))
+        return
+
+    transcriber = None
+    user_id = 'guest'
+
+    while True:
+        message = ws.receive()
+        if message is None:
+            break
+
+        try:
+            if isinstance(message, str):
+                control = json.loads(message)
+                if control.get('type') == 'start':
+                    user_id = control.get('user_id', 'guest')
+                    transcriber = StreamingTranscriber(
+                        ai_banker.voice_service.whisper_models,
+                        language=control.get('language') or None,
+                        accuracy=control.get('accuracy') or None
+                    )
+                    continue
+                if control.get('type') == 'stop' and transcriber:
+                    events = [transcriber.finish()]
+                else:
+                    continue
+            else:
+                if transcriber is None:
+                    transcriber = StreamingTranscriber(ai_banker.voice_service.whisper_models)
+                events = transcriber.feed(message)
+
+            for event in events:
+                ws.send(json.dumps(event, ensure_ascii=False))
+                # 一句话结束立即调用 LLM，无需等待客户端上传完整录音
+                if event["type"] == "final" and event["text"]:
+                    start = time.perf_counter()
+                    response = ai_banker.chat(event["text"], user_id)
+                    ws.send(json.dumps({
+                        "type": "response",
+                        "text": response,
+                        "llm_ms": round((time.perf_counter() - start) * 1000, 2)
+                    }, ensure_ascii=False))
+        except Exception as e:
+            print(f"❌ 流式语音识别异常：{str(e)}")
+            print(f"❌ 错误堆栈：\n{traceback.format_exc()}")
+            ws.send(json.dumps({"type": "error", "error": str(e)}, ensure_ascii=False))
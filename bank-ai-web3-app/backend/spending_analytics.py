@@ -0,0 +1,250 @@
+# backend/spending_analytics.py
+"""
+账户支出分析
+
+流水按列加载为 DataFrame，分类汇总、环比、周期性扣款识别和异常支出检测
+全部用 pandas groupby / NumPy 向量运算完成，不逐行循环。
+输出为精简的结构化摘要（金额单位：元），交给大模型组织成文字，或直接用模板生成报告。
+"""
+from datetime import date
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from database import ConnectionPool
+from ledger_rollups import INTERNAL_CATEGORIES, UNCATEGORIZED
+
+# 周期性扣款：相邻两次间隔（天）的中位数落在这些区间内
+CADENCES = {'weekly': (6, 8), 'monthly': (27, 33), 'quarterly': (85, 95), 'yearly': (355, 375)}
+RECURRING_MIN_COUNT = 3
+RECURRING_MAX_AMOUNT_CV = 0.15   # 金额变异系数上限
+ANOMALY_Z = 3.5                  # 稳健 z 分数阈值（中位数 / MAD）
+ANOMALY_LOOKBACK_DAYS = 90
+CATEGORY_WINDOW_DAYS = 90
+TOP_N = 5
+
+_COLUMNS = ['date', 'amount_minor', 'category', 'description', 'counterparty']
+
+
+def load_account_frame(pool: ConnectionPool, account_id: int) -> pd.DataFrame:
+    """一个账户的全部流水（按日期升序）"""
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = None  # 元组比 sqlite3.Row 构建 DataFrame 更快
+        rows = cursor.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM transactions WHERE account_id = ? ORDER BY date, id", (account_id,)
+        ).fetchall()
+    frame = pd.DataFrame.from_records(rows, columns=_COLUMNS)
+    frame['date'] = pd.to_datetime(frame['date'], format='%Y-%m-%d')
+    frame['amount_minor'] = frame['amount_minor'].astype('int64')
+    frame['category'] = frame['category'].fillna(UNCATEGORIZED)
+    return frame
+
+
+def _yuan(minor) -> float:
+    return round(float(minor) / 100, 2)
+
+
+def _change_pct(current, previous) -> Optional[float]:
+    return round((current - previous) / previous * 100, 1) if previous else None
+
+
+class SpendingAnalyzer:
+
+    def analyze(self, frame: pd.DataFrame, today: Optional[date] = None) -> Dict:
+        today = pd.Timestamp(today or date.today()).normalize()
+        frame = frame[~frame['category'].isin(INTERNAL_CATEGORIES)]
+        spend = frame[frame['amount_minor'] < 0].assign(amount=lambda f: -f['amount_minor'])
+        income = frame[frame['amount_minor'] > 0]
+
+        if spend.empty:
+            return {"as_of": today.date().isoformat(), "transactions": int(len(frame)), "has_spending": False}
+
+        return {
+            "as_of": today.date().isoformat(),
+            "transactions": int(len(frame)),
+            "has_spending": True,
+            **self._monthly(spend, income, today),
+            "categories": self._categories(spend, today),
+            "category_changes": self._category_changes(spend, today),
+            "recurring": self._recurring(spend, today),
+            "anomalies": self._anomalies(spend, today),
+        }
+
+    @staticmethod
+    def _monthly(spend: pd.DataFrame, income: pd.DataFrame, today: pd.Timestamp) -> Dict:
+        current = today.to_period('M')
+        months = pd.period_range(end=current, periods=7, freq='M')
+        spent = spend.groupby(spend['date'].dt.to_period('M'))['amount'].sum().reindex(months, fill_value=0)
+        earned = income.groupby(income['date'].dt.to_period('M'))['amount_minor'].sum().reindex(months, fill_value=0)
+
+        # 本月至今与上月同期对比；上月天数较少时（如 3 月 31 日对比 2 月）截止到上月最后一天
+        previous_start = (current - 1).start_time
+        previous_cutoff = min(previous_start + pd.Timedelta(days=today.day - 1), (current - 1).end_time.normalize())
+        mtd_previous = spend.loc[spend['date'].between(previous_start, previous_cutoff), 'amount'].sum()
+
+        last, before = spent.iloc[-2], spent.iloc[-3]
+        last_income = earned.iloc[-2]
+        return {
+            "month_to_date": {
+                "spent": _yuan(spent.iloc[-1]),
+                "previous_same_period": _yuan(mtd_previous),
+                "change_pct": _change_pct(spent.iloc[-1], mtd_previous)
+            },
+            "last_month": {
+                "month": str(current - 1),
+                "spent": _yuan(last),
+                "income": _yuan(last_income),
+                "change_pct": _change_pct(last, before),
+                "savings_rate_pct": round((last_income - last) / last_income * 100, 1) if last_income else None
+            },
+            "monthly_spent": [{"month": str(m), "spent": _yuan(v)} for m, v in spent.iloc[:-1].items()]
+        }
+
+    @staticmethod
+    def _categories(spend: pd.DataFrame, today: pd.Timestamp) -> list:
+        recent = spend[spend['date'] > today - pd.Timedelta(days=CATEGORY_WINDOW_DAYS)]
+        totals = recent.groupby('category')['amount'].agg(['sum', 'size']).sort_values('sum', ascending=False)
+        share = totals['sum'] / totals['sum'].sum() * 100 if len(totals) else totals['sum']
+        return [
+            {"category": name, "spent": _yuan(row['sum']), "count": int(row['size']), "share_pct": round(pct, 1)}
+            for (name, row), pct in zip(totals.head(TOP_N).iterrows(), share.head(TOP_N))
+        ]
+
+    @staticmethod
+    def _category_changes(spend: pd.DataFrame, today: pd.Timestamp) -> list:
+        """最近两个完整月份之间，变化金额最大的分类"""
+        current = today.to_period('M')
+        last, before = current - 1, current - 2
+        month = spend['date'].dt.to_period('M')
+        in_window = month.isin([last, before])
+        if not in_window.any():
+            return []
+        pivot = (spend.loc[in_window, 'amount'].groupby([spend.loc[in_window, 'category'], month[in_window]]).sum()
+                 .unstack(fill_value=0).reindex(columns=[before, last], fill_value=0))
+        delta = pivot[last] - pivot[before]
+        movers = delta.abs().sort_values(ascending=False).head(TOP_N).index
+        return [
+            {"category": name, "previous": _yuan(pivot.at[name, before]), "current": _yuan(pivot.at[name, last]),
+             "change_pct": _change_pct(pivot.at[name, last], pivot.at[name, before])}
+            for name in movers if delta[name] != 0
+        ]
+
+    @staticmethod
+    def _recurring(spend: pd.DataFrame, today: pd.Timestamp) -> list:
+        """同一商户金额稳定、间隔规律的扣款（订阅、房租、还款等）"""
+        # 商户键：优先对方户名，没有时用去掉订单号等数字的描述
+        key = spend['counterparty'].where(
+            spend['counterparty'].notna(), spend['description'].str.replace(r'[\d#\s]+', '', regex=True)
+        )
+        codes, merchants = pd.factorize(key)
+        valid = codes >= 0
+        days = spend['date'].to_numpy('datetime64[D]').astype('int64')[valid]
+        amounts = spend['amount'].to_numpy('float64')[valid]
+        codes = codes[valid]
+        if not len(codes):
+            return []
+
+        # 按（商户, 日期）排序后，同一商户相邻两笔的间隔
+        order = np.lexsort((days, codes))
+        codes, days, amounts = codes[order], days[order], amounts[order]
+        rows = spend.index.to_numpy()[valid][order]
+        same = np.r_[False, codes[1:] == codes[:-1]]
+        gaps = np.diff(days, prepend=days[0]).astype('float64')
+
+        n = len(merchants)
+        count = np.bincount(codes, minlength=n)
+        amount_mean = np.bincount(codes, weights=amounts, minlength=n) / count
+        amount_var = np.bincount(codes, weights=amounts ** 2, minlength=n) / count - amount_mean ** 2
+        gap_count = np.bincount(codes[same], minlength=n)
+        gap_mean = np.bincount(codes[same], weights=gaps[same], minlength=n) / np.maximum(gap_count, 1)
+        gap_var = (np.bincount(codes[same], weights=gaps[same] ** 2, minlength=n) / np.maximum(gap_count, 1)
+                   - gap_mean ** 2)
+        gap_median = (pd.Series(gaps[same]).groupby(codes[same]).median()
+                      .reindex(range(n)).to_numpy())
+        last_pos = np.flatnonzero(np.r_[codes[1:] != codes[:-1], True])  # 每个商户最后一笔
+        last_day = np.empty(n, dtype='int64')
+        last_day[codes[last_pos]] = days[last_pos]
+
+        cadence = np.select([(gap_median >= lo) & (gap_median <= hi) for lo, hi in CADENCES.values()],
+                            list(CADENCES), default='')
+        today_day = today.to_datetime64().astype('datetime64[D]').astype('int64')
+        mask = ((count >= RECURRING_MIN_COUNT) & (cadence != '')
+                & (last_day + gap_median * 1.5 >= today_day)
+                & (np.sqrt(np.maximum(amount_var, 0)) <= amount_mean * RECURRING_MAX_AMOUNT_CV)
+                & (np.sqrt(np.maximum(gap_var, 0)) <= gap_median * 0.25))
+
+        found = np.flatnonzero(mask)
+        found = found[np.argsort(-amount_mean[found])][:TOP_N]
+        last_rows = np.empty(n, dtype=rows.dtype)
+        last_rows[codes[last_pos]] = rows[last_pos]
+        results = []
+        for code in found:
+            last = spend.loc[last_rows[code]]
+            next_due = np.datetime64(int(last_day[code] + round(gap_median[code])), 'D')
+            results.append({
+                "merchant": merchants[code], "category": last['category'], "cadence": str(cadence[code]),
+                "amount": _yuan(amount_mean[code]), "occurrences": int(count[code]),
+                "next_expected": str(next_due)
+            })
+        return results
+
+    @staticmethod
+    def _anomalies(spend: pd.DataFrame, today: pd.Timestamp) -> list:
+        """近期明显高于该分类常见水平的单笔支出（稳健 z 分数）"""
+        by_category = spend.groupby('category')['amount']
+        median = by_category.transform('median')
+        mad = (spend['amount'] - median).abs().groupby(spend['category']).transform('median')
+        # MAD 为 0（金额都相同）时用中位数的 10% 兜底，且不低于 1 元
+        scale = np.maximum(np.maximum(1.4826 * mad, median * 0.1), 100)
+        score = (spend['amount'] - median) / scale
+        recent = spend['date'] > today - pd.Timedelta(days=ANOMALY_LOOKBACK_DAYS)
+        flagged = spend.assign(score=score, typical=median)[recent & (score > ANOMALY_Z)]
+        flagged = flagged.sort_values('score', ascending=False).head(TOP_N)
+        return [
+            {"date": row['date'].date().isoformat(), "description": row['description'], "category": row['category'],
+             "amount": _yuan(row['amount']), "typical": _yuan(row['typical']), "score": round(row['score'], 1)}
+            for _, row in flagged.iterrows()
+        ]
+
+
+def format_report(account_number: str, summary: Dict) -> str:
+    """未接入大模型时的模板报告"""
+    if not summary.get("has_spending"):
+        return f"账户 {account_number} 暂无支出记录，暂时无法生成支出分析。"
+
+    mtd, last = summary["month_to_date"], summary["last_month"]
+    lines = [f"账户 {account_number} 的支出分析报告（截至 {summary['as_of']}）：", "", "1. **支出概况**："]
+    lines.append(f"   - 本月至今支出：¥{mtd['spent']:,.2f}" + (
+        f"（上月同期 ¥{mtd['previous_same_period']:,.2f}，{mtd['change_pct']:+.1f}%）" if mtd['change_pct'] is not None else ""))
+    lines.append(f"   - {last['month']} 支出：¥{last['spent']:,.2f}" + (
+        f"，环比 {last['change_pct']:+.1f}%" if last['change_pct'] is not None else ""))
+    if last['savings_rate_pct'] is not None:
+        lines.append(f"   - {last['month']} 收入 ¥{last['income']:,.2f}，储蓄率 {last['savings_rate_pct']:.1f}%")
+
+    if summary["categories"]:
+        lines += ["", f"2. **支出分类**（近 {CATEGORY_WINDOW_DAYS} 天）："]
+        lines += [f"   - {c['category']}：¥{c['spent']:,.2f} ({c['share_pct']:.1f}%)" for c in summary["categories"]]
+
+    changes = [c for c in summary["category_changes"] if c['change_pct'] is not None]
+    if changes:
+        lines += ["", "3. **变化较大的分类**（最近两个完整月份）："]
+        lines += [f"   - {c['category']}：¥{c['previous']:,.2f} → ¥{c['current']:,.2f}（{c['change_pct']:+.1f}%）"
+                  for c in changes]
+
+    if summary["recurring"]:
+        lines += ["", "4. **周期性扣款**："]
+        cadence_names = {'weekly': '每周', 'monthly': '每月', 'quarterly': '每季度', 'yearly': '每年'}
+        lines += [f"   - {r['merchant']}：{cadence_names[r['cadence']]}约 ¥{r['amount']:,.2f}，下次预计 {r['next_expected']}"
+                  for r in summary["recurring"]]
+
+    if summary["anomalies"]:
+        lines += ["", "5. **异常支出提醒**："]
+        lines += [f"   - {a['date']} {a['description']}：¥{a['amount']:,.2f}（{a['category']}通常约 ¥{a['typical']:,.2f}）"
+                  for a in summary["anomalies"]]
+
+    return "\n".join(lines)
+
+
+spending_analyzer = SpendingAnalyzer()
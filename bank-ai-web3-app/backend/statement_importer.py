@@ -0,0 +1,477 @@
+# backend/statement_importer.py
+"""
+对账单批量导入（CSV / OFX）
+
+- 流式解析：按块读取文件，内存占用与文件大小无关；解析结果分批写入连接上的临时表
+- 去重：每行按内容（OFX 用 FITID）计算 64 位哈希，同一文件内相同的行按出现次序编号，
+  (账户, 哈希, 序号) 记录在 import_hashes 表中，重复导入同一份或有重叠的对账单不会重复记账
+- 写入：每批一个写事务（流水、导入哈希、余额一起提交，汇总表在同一事务内用聚合 SQL 更新），
+  批次之间记账引擎可以正常提交；进程中途退出时已提交的批次完整一致
+- 复式记账：每批是一个 journal，净额记入该币种的导入清算账户（SYS-IMPORT-币种），分录合计为 0
+"""
+import codecs
+import csv
+import hashlib
+import html
+import io
+import os
+import re
+import time
+import uuid
+from datetime import date
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from ledger_store import LedgerStore, ledger_store, to_minor, from_minor
+from posting_engine import MAX_AMOUNT_MINOR, SYSTEM_USER_ID, PostingEngine, posting_engine
+
+# 每个写事务导入的行数（也是解析时每批写入临时表的行数）
+IMPORT_BATCH_ROWS = int(os.getenv('STATEMENT_IMPORT_BATCH', 10000))
+# 进度最多每隔这么久写一次任务表
+PROGRESS_INTERVAL_SECONDS = 0.5
+# 两批写入之间最多等待在线记账提交的时间（秒）
+POSTING_YIELD_SECONDS = 1.0
+MAX_REPORTED_ERRORS = 20
+HEADER_SCAN_ROWS = 20
+MAX_DESCRIPTION_LENGTH = 500
+MAX_ABS_AMOUNT_MINOR = MAX_AMOUNT_MINOR
+OFX_CHUNK_CHARS = 1024 * 1024
+
+# 表头别名（忽略大小写）
+HEADER_ALIASES = {
+    'date': ('date', 'transaction date', 'posting date', 'posted date', '日期', '交易日期', '记账日期', '交易时间'),
+    'amount': ('amount', 'transaction amount', '金额', '交易金额', '发生额'),
+    'debit': ('debit', 'withdrawal', 'withdrawals', '支出', '支出金额', '借方金额'),
+    'credit': ('credit', 'deposit', 'deposits', '收入', '收入金额', '贷方金额'),
+    'description': ('description', 'memo', 'details', 'narrative', '摘要', '交易摘要', '描述', '备注', '用途'),
+    'counterparty': ('counterparty', 'payee', 'merchant', 'name', '对方户名', '交易对方', '对方', '商户', '商户名称'),
+    'category': ('category', '分类', '类别'),
+}
+_ALIASES = {alias: field for field, aliases in HEADER_ALIASES.items() for alias in aliases}
+
+_DATE = re.compile(r'\s*(\d{4})[-/.年]?(\d{1,2})[-/.月]?(\d{1,2})')
+_US_DATE = re.compile(r'\s*(\d{1,2})/(\d{1,2})/(\d{4})')
+_PLAIN_AMOUNT = re.compile(r'-?\d{1,15}(?:\.\d{1,2})?')
+_AMOUNT_NOISE = re.compile(r'[\s,¥￥$()元]|CNY|RMB', re.I)
+_OFX_TRANSACTION = re.compile(r'<STMTTRN>(.*?)</STMTTRN>', re.S | re.I)
+_OFX_FIELD = re.compile(r'<(\w+)>([^<\r\n]*)')
+
+# (行号, 日期, 金额（分）, 描述, 对方, 分类, 去重键)
+Row = Tuple[int, str, int, str, Optional[str], Optional[str], str]
+
+
+class StatementError(Exception):
+    """对账单无法导入（格式、表头、余额等）"""
+
+
+def detect_format(head: bytes) -> Optional[str]:
+    """根据文件开头识别 ofx / csv；二进制文件返回 None"""
+    if b'\0' in head:
+        return None
+    text = head.lstrip(b'\xef\xbb\xbf').lstrip().upper()
+    if text.startswith(b'OFXHEADER') or b'<OFX>' in text:
+        return 'ofx'
+    return 'csv'
+
+
+def _encoding(head: bytes) -> str:
+    """UTF-8（可带 BOM），否则按国内网银常见的 GB18030 解码"""
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+        return 'utf-8-sig'
+    except UnicodeDecodeError:
+        return 'gb18030'
+
+
+def _content_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+
+class _RowParser:
+    """字段校验与规范化；日期按原始文本缓存，同一天只解析一次"""
+
+    def __init__(self):
+        self._dates: Dict[str, Optional[str]] = {}
+        self.invalid = 0
+        self.errors: List[Dict] = []
+
+    def reject(self, row_number: int, message: str):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "error": message})
+
+    def date(self, text: Optional[str]) -> Optional[str]:
+        text = text or ''
+        if text in self._dates:
+            return self._dates[text]
+        value = None
+        match = _DATE.match(text)
+        if match:
+            year, month, day = (int(g) for g in match.groups())
+        else:
+            match = _US_DATE.match(text)
+            if match:
+                month, day, year = (int(g) for g in match.groups())
+        if match:
+            try:
+                value = date(year, month, day).isoformat()
+            except ValueError:
+                value = None
+        self._dates[text] = value
+        return value
+
+    @staticmethod
+    def amount(text: Optional[str]) -> Optional[int]:
+        text = (text or '').strip()
+        if not text:
+            return None
+        if _PLAIN_AMOUNT.fullmatch(text):
+            # 常见的纯数字金额不经过 Decimal
+            whole, _, fraction = text.partition('.')
+            value = abs(int(whole)) * 100 + int(fraction.ljust(2, '0'))
+            return -value if whole.startswith('-') else value
+        negative = text.startswith('(') and text.endswith(')')
+        text = _AMOUNT_NOISE.sub('', text)
+        if text.endswith('-'):
+            negative, text = True, text[:-1]
+        try:
+            value = to_minor(text)
+        except ValueError:
+            return None
+        return -value if negative else value
+
+    def build(self, row_number: int, raw_date: Optional[str], amount: Optional[int], description: Optional[str],
+              counterparty: Optional[str], category: Optional[str], key: Optional[str] = None) -> Optional[Row]:
+        day = self.date(raw_date)
+        if day is None:
+            self.reject(row_number, f"无效日期: {(raw_date or '')[:40]}")
+            return None
+        if not amount or abs(amount) > MAX_ABS_AMOUNT_MINOR:
+            self.reject(row_number, "无效金额" if amount is None else f"金额超出范围: {from_minor(amount)}")
+            return None
+        description = (description or '').strip()[:MAX_DESCRIPTION_LENGTH]
+        counterparty = (counterparty or '').strip()[:MAX_DESCRIPTION_LENGTH] or None
+        category = (category or '').strip() or None
+        key = key or f"{day}\x1f{amount}\x1f{description}\x1f{counterparty or ''}"
+        return row_number, day, amount, description, counterparty, category, key
+
+
+def iter_csv(stream: io.TextIOBase, parser: _RowParser) -> Iterator[Row]:
+    """表头前允许有几行账户信息；金额列为 金额，或者 收入 / 支出 两列"""
+    reader = csv.reader(stream)
+    columns: Dict[str, int] = {}
+    found = False
+    for header in reader:
+        columns = {}
+        for index, cell in enumerate(header):
+            field = _ALIASES.get(cell.strip().lower())
+            if field and field not in columns:
+                columns[field] = index
+        found = 'date' in columns and bool({'amount', 'debit', 'credit'} & columns.keys())
+        if found or reader.line_num >= HEADER_SCAN_ROWS:
+            break
+    if not found:
+        raise StatementError("未找到表头：需要 日期 列和 金额（或 收入 / 支出）列")
+
+    width = max(columns.values()) + 1
+    date_col, amount_col = columns['date'], columns.get('amount')
+    debit_col, credit_col = columns.get('debit'), columns.get('credit')
+    description_col, counterparty_col = columns.get('description'), columns.get('counterparty')
+    category_col = columns.get('category')
+
+    for cells in reader:
+        if not cells or not any(cells):
+            continue
+        if len(cells) < width:
+            cells = cells + [''] * (width - len(cells))
+        if amount_col is not None:
+            amount = parser.amount(cells[amount_col])
+        else:
+            credit = parser.amount(cells[credit_col]) if credit_col is not None else None
+            debit = parser.amount(cells[debit_col]) if debit_col is not None else None
+            amount = None if credit is None and debit is None else abs(credit or 0) - abs(debit or 0)
+        row = parser.build(
+            reader.line_num, cells[date_col], amount,
+            cells[description_col] if description_col is not None else '',
+            cells[counterparty_col] if counterparty_col is not None else None,
+            cells[category_col] if category_col is not None else None,
+        )
+        if row is not None:
+            yield row
+
+
+def iter_ofx(stream: io.TextIOBase, parser: _RowParser) -> Iterator[Row]:
+    """逐块读取，只解析完整的 <STMTTRN> 块（OFX 1.x SGML 与 2.x XML 都适用）；行号为第几笔交易"""
+    buffer = ''
+    number = 0
+    while True:
+        chunk = stream.read(OFX_CHUNK_CHARS)
+        buffer += chunk
+        end = 0
+        for match in _OFX_TRANSACTION.finditer(buffer):
+            end = match.end()
+            number += 1
+            fields = {name.upper(): html.unescape(value.strip()) for name, value in _OFX_FIELD.findall(match.group(1))}
+            fitid = fields.get('FITID')
+            row = parser.build(
+                number, fields.get('DTPOSTED'), parser.amount(fields.get('TRNAMT')),
+                fields.get('MEMO') or fields.get('NAME') or fields.get('TRNTYPE', ''),
+                fields.get('NAME'), None, f"fitid\x1f{fitid}" if fitid else None,
+            )
+            if row is not None:
+                yield row
+        buffer = buffer[end:]
+        if not chunk:
+            return
+        # 没有未结束的交易块时只保留末尾（标签可能跨块）
+        start = buffer.upper().rfind('<STMTTRN>')
+        buffer = buffer[start:] if start >= 0 else buffer[-16:]
+
+
+class StatementImporter:
+
+    def __init__(self, ledger: Optional[LedgerStore] = None, engine: Optional[PostingEngine] = None):
+        self.ledger = ledger or ledger_store
+        self.engine = engine or posting_engine
+        self.pool = self.ledger.pool
+        self._init_schema()
+
+    def _init_schema(self):
+        with self.pool.connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS import_hashes (
+                    account_id INTEGER NOT NULL,
+                    content_hash INTEGER NOT NULL,
+                    ordinal INTEGER NOT NULL,
+                    PRIMARY KEY (account_id, content_hash, ordinal)
+                ) WITHOUT ROWID
+            """)
+
+    def run(self, user_id: int, account_id: int, path: str, file_format: Optional[str] = None,
+            progress: Optional[Callable[[Dict], None]] = None,
+            categorize: Optional[Callable[[List[str]], List[Dict]]] = None) -> Dict:
+        """
+        导入一个对账单文件
+
+        Args:
+            file_format: csv / ofx，为空时按文件内容识别
+            progress: 进度回调（节流后调用）
+            categorize: 为没有分类的行批量分类，返回与输入对应的 {"category", "source"}
+
+        Returns:
+            导入摘要：总行数、导入 / 重复 / 无效行数、前若干条错误、导入后余额
+        """
+        started = time.time()
+        account = self.ledger.get_account(account_id, user_id)
+        if account is None:
+            raise StatementError("账户不存在")
+        clearing_id = self.engine.system_account(account['currency'], 'IMPORT')
+        total_bytes = os.path.getsize(path)
+        state = {"stage": "parsing", "rows": 0, "imported": 0, "duplicates": 0, "invalid": 0,
+                 "bytes_read": 0, "total_bytes": total_bytes}
+        last_report = [0.0]
+
+        def report(force: bool = False):
+            if progress and (force or time.monotonic() - last_report[0] >= PROGRESS_INTERVAL_SECONDS):
+                last_report[0] = time.monotonic()
+                progress(dict(state))
+
+        with open(path, 'rb') as raw, self.pool.connection() as conn:
+            head = raw.read(64 * 1024)
+            raw.seek(0)
+            file_format = file_format or detect_format(head)
+            if file_format not in ('csv', 'ofx'):
+                raise StatementError("不支持的文件格式，仅支持 CSV / OFX")
+            text = io.TextIOWrapper(raw, encoding=_encoding(head), errors='replace', newline='')
+            parser = _RowParser()
+            rows = iter_csv(text, parser) if file_format == 'csv' else iter_ofx(text, parser)
+
+            conn.execute('DROP TABLE IF EXISTS temp.import_staging')
+            conn.execute("""
+                CREATE TEMP TABLE import_staging (
+                    seq INTEGER PRIMARY KEY,
+                    date TEXT NOT NULL,
+                    amount_minor INTEGER NOT NULL,
+                    description TEXT NOT NULL,
+                    counterparty TEXT,
+                    category TEXT,
+                    content_hash INTEGER NOT NULL,
+                    ordinal INTEGER NOT NULL DEFAULT 1,
+                    duplicate INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            try:
+                # 1. 解析并分批写入临时表
+                batch: List[Row] = []
+                for row in rows:
+                    batch.append(row)
+                    if len(batch) >= IMPORT_BATCH_ROWS:
+                        self._stage(conn, batch, categorize)
+                        state["rows"] += len(batch)
+                        batch = []
+                        state["invalid"], state["bytes_read"] = parser.invalid, raw.tell()
+                        report()
+                if batch:
+                    self._stage(conn, batch, categorize)
+                    state["rows"] += len(batch)
+                state["invalid"], state["bytes_read"] = parser.invalid, total_bytes
+                state["rows"] += parser.invalid
+                staged = state["rows"] - parser.invalid
+
+                # 2. 文件内相同行按出现次序编号，与之前导入过的比对
+                state["stage"] = "deduplicating"
+                report(force=True)
+                net = self._deduplicate(conn, account_id)
+                # 整体为负的对账单提前拒绝，不写入任何一批；每批写入时还会在写锁内按可用余额校验
+                balance = conn.execute('SELECT balance_minor FROM accounts WHERE id = ?', (account_id,)).fetchone()[0]
+                if balance + net < 0:
+                    raise StatementError(
+                        f"导入后余额为负（{from_minor(balance + net):.2f} 元），请确认对账单包含期初余额"
+                    )
+
+                # 3. 分批写入流水
+                state["stage"] = "writing"
+                now = time.time()
+                for low in range(1, staged + 1, IMPORT_BATCH_ROWS):
+                    high = low + IMPORT_BATCH_ROWS - 1
+                    inserted = self._write_batch(conn, account, clearing_id, low, high, now)
+                    state["imported"] += inserted
+                    state["duplicates"] = min(high, staged) - state["imported"]
+                    self.engine.refresh([account_id], {user_id})
+                    report()
+                    self._yield_to_postings()
+            finally:
+                conn.execute('DROP TABLE IF EXISTS temp.import_staging')
+            balance = conn.execute('SELECT balance_minor FROM accounts WHERE id = ?', (account_id,)).fetchone()[0]
+
+        print(f"✅ 对账单导入完成：账户 {account_id}，导入 {state['imported']} 行，重复 {state['duplicates']} 行，"
+              f"无效 {parser.invalid} 行，耗时 {time.time() - started:.1f} 秒")
+        return {
+            "accountId": account_id,
+            "format": file_format,
+            "rows": state["rows"],
+            "imported": state["imported"],
+            "duplicates": state["duplicates"],
+            "invalid": parser.invalid,
+            "errors": parser.errors,
+            "balance": from_minor(balance),
+            "elapsedMs": round((time.time() - started) * 1000)
+        }
+
+    @staticmethod
+    def _stage(conn, batch: List[Row], categorize):
+        if categorize:
+            missing = [i for i, row in enumerate(batch) if row[5] is None]
+            if missing:
+                texts = [f"{batch[i][4] or ''} {batch[i][3]}".strip() for i in missing]
+                for i, result in zip(missing, categorize(texts)):
+                    if result.get("source") != 'fallback':
+                        batch[i] = batch[i][:5] + (result["category"],) + batch[i][6:]
+        conn.execute('BEGIN')
+        conn.executemany(
+            'INSERT INTO temp.import_staging (date, amount_minor, description, counterparty, category, content_hash) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            [(day, amount, description, counterparty, category, _content_hash(key))
+             for _, day, amount, description, counterparty, category, key in batch]
+        )
+        conn.commit()
+
+    @staticmethod
+    def _deduplicate(conn, account_id: int) -> int:
+        """标记重复行，返回其余行的金额合计"""
+        conn.execute('BEGIN')
+        conn.execute('CREATE INDEX temp.idx_import_staging_hash ON import_staging(content_hash, seq)')
+        conn.execute("""
+            UPDATE import_staging SET ordinal = ranked.n
+            FROM (SELECT seq, ROW_NUMBER() OVER (PARTITION BY content_hash ORDER BY seq) AS n
+                  FROM import_staging) AS ranked
+            WHERE import_staging.seq = ranked.seq AND ranked.n > 1
+        """)
+        conn.execute("""
+            UPDATE import_staging SET duplicate = 1
+            WHERE EXISTS (SELECT 1 FROM main.import_hashes h WHERE h.account_id = ?
+                          AND h.content_hash = import_staging.content_hash AND h.ordinal = import_staging.ordinal)
+        """, (account_id,))
+        net = conn.execute('SELECT COALESCE(SUM(amount_minor), 0) FROM import_staging WHERE duplicate = 0').fetchone()[0]
+        conn.commit()
+        return net
+
+    def _yield_to_postings(self):
+        """两批之间等在线记账先提交：SQLite 的忙等待会退避休眠，不让出的话它们可能一直抢不到写锁"""
+        deadline = time.monotonic() + POSTING_YIELD_SECONDS
+        while self.engine.pending() and time.monotonic() < deadline:
+            time.sleep(0.002)
+
+    def _write_batch(self, conn, account: Dict, clearing_id: int, low: int, high: int, now: float) -> int:
+        """
+        一个写事务：流水、汇总表、导入哈希和余额一起提交，中途退出也不会不一致；返回写入行数
+
+        本批流水与清算账户的对冲分录共用一个 journal_id。事务内持有记账引擎的账户锁，
+        余额扣除已冻结的支出后不能为负，否则整批回滚
+        """
+        account_id = account['id']
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            with self.engine.external_write([account_id]) as held:
+                inserted = self._write_rows(conn, account, clearing_id, low, high, now, held[account_id])
+                conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        return inserted
+
+    def _write_rows(self, conn, account: Dict, clearing_id: int, low: int, high: int, now: float,
+                    held: int) -> int:
+        account_id, user_id = account['id'], account['userId']
+        # 持有写锁后再比对一次，并发导入有重叠的对账单时不会重复记账
+        conn.execute("""
+            UPDATE import_staging SET duplicate = 1
+            WHERE seq BETWEEN ? AND ? AND duplicate = 0
+              AND EXISTS (SELECT 1 FROM main.import_hashes h WHERE h.account_id = ?
+                          AND h.content_hash = import_staging.content_hash AND h.ordinal = import_staging.ordinal)
+        """, (low, high, account_id))
+        inserted, net = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(amount_minor), 0) FROM import_staging '
+            'WHERE seq BETWEEN ? AND ? AND duplicate = 0', (low, high)
+        ).fetchone()
+        if inserted:
+            cursor = conn.execute(
+                'UPDATE accounts SET balance_minor = balance_minor + ? WHERE id = ? AND balance_minor + ? >= ?',
+                (net, account_id, net, held)
+            )
+            if cursor.rowcount == 0:
+                balance = conn.execute('SELECT balance_minor FROM accounts WHERE id = ?', (account_id,)).fetchone()[0]
+                raise StatementError(
+                    f"余额不足：可用 {from_minor(balance - held):.2f} 元，本批合计 {from_minor(net):.2f} 元，"
+                    f"已停止导入（已导入的部分再次导入时会自动跳过）"
+                )
+            journal_id = uuid.uuid4().hex
+            conn.execute("""
+                INSERT INTO transactions (account_id, user_id, date, amount_minor, type, category, description,
+                                          counterparty, journal_id, created_at)
+                SELECT ?, ?, date, amount_minor, CASE WHEN amount_minor >= 0 THEN 'income' ELSE 'expense' END,
+                       category, description, counterparty, ?, ?
+                FROM import_staging WHERE seq BETWEEN ? AND ? AND duplicate = 0 ORDER BY seq
+            """, (account_id, user_id, journal_id, now, low, high))
+            if net:
+                conn.execute(
+                    'INSERT INTO transactions (account_id, user_id, date, amount_minor, type, category, '
+                    'description, counterparty, journal_id, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (clearing_id, SYSTEM_USER_ID, date.today().isoformat(), -net, 'import', 'import',
+                     f"对账单导入 {account['accountNumber']}", account['accountNumber'], journal_id, now)
+                )
+                conn.execute('UPDATE accounts SET balance_minor = balance_minor - ? WHERE id = ?',
+                             (net, clearing_id))
+            conn.execute("""
+                INSERT INTO import_hashes (account_id, content_hash, ordinal)
+                SELECT ?, content_hash, ordinal FROM import_staging WHERE seq BETWEEN ? AND ? AND duplicate = 0
+            """, (account_id, low, high))
+            self.ledger.rollups.apply_select(
+                conn,
+                'SELECT ? AS account_id, ? AS user_id, date, category, amount_minor '
+                'FROM temp.import_staging WHERE seq BETWEEN ? AND ? AND duplicate = 0',
+                (account_id, user_id, low, high)
+            )
+        return inserted
+
+
+statement_importer = StatementImporter()
@@ -0,0 +1,162 @@
+# backend/streaming_asr.py
+import os
+import re
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from voice_activity import SAMPLE_RATE, FRAME_MS, PADDING_MS, SpeechTracker
+
+# 每积累多少秒新音频做一次增量识别
+PARTIAL_STEP_SECONDS = float(os.getenv('STREAM_ASR_STEP_SECONDS', 1.0))
+# 增量识别的窗口长度；超过后在最近的停顿处把较早的部分定稿
+WINDOW_SECONDS = float(os.getenv('STREAM_ASR_WINDOW_SECONDS', 15.0))
+# 可以切开窗口的最短停顿
+PAUSE_MS = int(os.getenv('STREAM_ASR_PAUSE_MS', 200))
+# 没有停顿时前后两个窗口重叠的长度，重叠部分的文字去重后拼接
+OVERLAP_SECONDS = float(os.getenv('STREAM_ASR_OVERLAP_SECONDS', 1.0))
+# 语音之后持续静音多久判定为一句话结束
+END_OF_UTTERANCE_MS = int(os.getenv('STREAM_ASR_EOU_MS', 700))
+
+# 去重比对的单位：汉字逐字，其他按词
+_UNITS = re.compile(r'[\u3400-\u9fff]|[^\s\u3400-\u9fff]+')
+_PUNCT = re.compile(r'[^\w]+')
+
+
+def merge_overlap(committed: str, text: str) -> str:
+    """拼接两个重叠窗口的识别结果：去掉 text 开头与 committed 结尾重复的字词"""
+    if not committed:
+        return text
+    head = list(_UNITS.finditer(text))
+    tail = [_PUNCT.sub('', m.group()).lower() for m in _UNITS.finditer(committed)]
+    words = [_PUNCT.sub('', m.group()).lower() for m in head]
+    for k in range(min(len(tail), len(words)), 0, -1):
+        if tail[-k:] == words[:k]:
+            text = text[head[k - 1].end():]
+            break
+    return f"{committed} {text.strip()}".strip()
+
+
+class StreamingTranscriber:
+    """
+    流式语音识别会话
+
+    输入 16kHz 单声道 PCM16LE 音频帧，按窗口做增量识别，检测到一句话结束时输出最终结果。
+    窗口过长时在最近一次停顿处切开（不会切断字词），没有停顿时前后窗口重叠一段并对文字去重；
+    VAD 状态随音频增量更新，每帧只计算新到的部分。输出均为事件字典：
+        {"type": "partial", "text": ...}
+        {"type": "final", "text": ..., "timings": {...}}
+    """
+
+    def __init__(self, whisper_models, language: Optional[str] = None, accuracy: Optional[str] = None):
+        self.whisper_models = whisper_models
+        self.language = language
+        self.accuracy = accuracy
+        self._reset()
+
+    def _reset(self):
+        self._chunks: List[np.ndarray] = []
+        self._vad = SpeechTracker()
+        self._since_partial = 0
+        self._committed_text = ''
+        self._overlapped = False
+        self._last_partial = ''
+        self._speech_started_at = None
+        self._audio_seconds = 0.0
+        self._asr_seconds = 0.0
+
+    def _samples(self) -> np.ndarray:
+        if len(self._chunks) > 1:
+            self._chunks = [np.concatenate(self._chunks)]
+        return self._chunks[0] if self._chunks else np.zeros(0, dtype=np.float32)
+
+    def _drop(self, samples: np.ndarray, n_frames: int) -> np.ndarray:
+        """丢弃缓冲区开头的 n_frames 帧，保持音频与 VAD 状态对齐"""
+        self._vad.drop(n_frames)
+        self._chunks = [samples[n_frames * self._vad.frame_len:]]
+        return self._chunks[0]
+
+    def _text(self, tail: str) -> str:
+        if self._overlapped:
+            return merge_overlap(self._committed_text, tail)
+        return f"{self._committed_text} {tail}".strip()
+
+    def _transcribe(self, samples: np.ndarray, accuracy: Optional[str]) -> str:
+        start = time.perf_counter()
+        result = self.whisper_models.transcribe(samples, language=self.language, accuracy=accuracy)
+        self._asr_seconds += time.perf_counter() - start
+        # 第一次识别出语言后固定下来，后续窗口跳过语言检测
+        if not self.language and result.get("language"):
+            self.language = result["language"]
+        return result["text"]
+
+    def feed(self, pcm: bytes) -> List[Dict]:
+        """输入一帧音频，返回产生的事件"""
+        if not pcm:
+            return []
+        frame = np.frombuffer(pcm[: len(pcm) // 2 * 2], dtype='<i2').astype(np.float32) / 32768.0
+        self._chunks.append(frame)
+        self._vad.push(frame)
+        self._since_partial += len(frame)
+        self._audio_seconds += len(frame) / SAMPLE_RATE
+
+        events = []
+        samples = self._samples()
+        bounds = self._vad.bounds()
+        if bounds is None:
+            # 只有静音：保留最近 1 秒作为噪声参考，避免缓冲无限增长
+            keep = 1000 // FRAME_MS
+            if self._vad.frames > keep:
+                self._drop(samples, self._vad.frames - keep)
+            return events
+
+        if self._speech_started_at is None:
+            self._speech_started_at = time.perf_counter()
+
+        trailing_ms = (len(samples) - bounds[1]) * 1000 / SAMPLE_RATE + PADDING_MS
+        if trailing_ms >= END_OF_UTTERANCE_MS:
+            events.append(self.finish())
+            return events
+
+        # 窗口过长：将较早部分定稿，之后只对剩余部分增量识别
+        if len(samples) > WINDOW_SECONDS * SAMPLE_RATE:
+            overlap = int(OVERLAP_SECONDS * 1000) // FRAME_MS
+            pause = self._vad.last_pause(self._vad.frames - overlap, PAUSE_MS // FRAME_MS)
+            if pause is not None:
+                # 在停顿中间切开，两边互不重叠
+                cut = pause * self._vad.frame_len
+                self._committed_text = self._text(self._transcribe(samples[:cut], self.accuracy))
+                self._overlapped = False
+                samples = self._drop(samples, pause)
+            else:
+                # 一直没有停顿：整个窗口定稿，保留末尾一段与下一个窗口重叠，拼接时去掉重复的字词
+                self._committed_text = self._text(self._transcribe(samples, self.accuracy))
+                self._overlapped = True
+                samples = self._drop(samples, self._vad.frames - overlap)
+
+        if self._since_partial >= PARTIAL_STEP_SECONDS * SAMPLE_RATE:
+            self._since_partial = 0
+            text = self._text(self._transcribe(samples, 'fast'))
+            if text and text != self._last_partial:
+                self._last_partial = text
+                events.append({"type": "partial", "text": text})
+
+        return events
+
+    def finish(self) -> Dict:
+        """结束当前一句话：对剩余音频做最终识别，返回 final 事件并重置会话"""
+        samples = self._samples()
+        bounds = self._vad.bounds()
+        tail = self._transcribe(samples[bounds[0]:bounds[1]], self.accuracy) if bounds else ''
+        text = self._text(tail)
+
+        timings = {
+            "audio_s": round(self._audio_seconds, 3),
+            "asr_ms": round(self._asr_seconds * 1000, 2),
+        }
+        if self._speech_started_at is not None:
+            timings["utterance_ms"] = round((time.perf_counter() - self._speech_started_at) * 1000, 2)
+
+        self._reset()
+        return {"type": "final", "text": text, "timings": timings}
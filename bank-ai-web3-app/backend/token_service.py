@@ -0,0 +1,268 @@
+# backend/token_service.py
+import hashlib
+import math
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+import jwt
+
+from config import Config
+from database import ConnectionPool, get_pool
+
+# 从共享库同步吊销记录的间隔（其他 worker 的登出最多延迟这么久生效）
+REVOCATION_SYNC_SECONDS = float(os.getenv('REVOCATION_SYNC_SECONDS', 1.0))
+# 清理过期吊销记录、重建布隆过滤器的间隔
+REVOCATION_PURGE_SECONDS = float(os.getenv('REVOCATION_PURGE_SECONDS', 3600))
+# 布隆过滤器规模：预期条目数与误判率
+BLOOM_CAPACITY = int(os.getenv('REVOCATION_BLOOM_CAPACITY', 100000))
+BLOOM_ERROR_RATE = float(os.getenv('REVOCATION_BLOOM_ERROR_RATE', 0.001))
+
+
+class TokenError(Exception):
+    """刷新令牌无效、过期、已吊销或被重复使用"""
+
+
+class BloomFilter:
+    """定长位数组布隆过滤器，k 个哈希位取自同一个 sha256 摘要"""
+
+    def __init__(self, capacity: int = BLOOM_CAPACITY, error_rate: float = BLOOM_ERROR_RATE):
+        self.bits = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, min(8, int(round(self.bits / capacity * math.log(2)))))
+        self._array = bytearray((self.bits + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.sha256(key.encode('utf-8')).digest()
+        for i in range(self.hashes):
+            yield int.from_bytes(digest[i * 4:i * 4 + 4], 'big') % self.bits
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self._array[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class RevocationIndex:
+    """
+    已吊销 jti 的内存索引
+
+    布隆过滤器做快速否定判断（绝大多数请求到此为止），命中时再查精确集合。
+    吊销记录写入共享库，各 worker 按自增 seq 增量同步（seq 不会复用，清理旧记录后也不会漏掉新登出），
+    不需要每个请求访问数据库；运行中定期清理过期记录并重建布隆过滤器。
+    """
+
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+        self._lock = threading.Lock()
+        self._bloom = BloomFilter()
+        self._expires: Dict[str, float] = {}
+        self._last_seq = 0
+        self._last_sync = 0.0
+        self._last_purge = 0.0
+
+    def add(self, jti: str, expires_at: float):
+        with self.pool.connection() as conn:
+            conn.execute('INSERT OR IGNORE INTO revoked_tokens (jti, expires_at) VALUES (?, ?)', (jti, expires_at))
+        with self._lock:
+            self._bloom.add(jti)
+            self._expires[jti] = expires_at
+
+    def sync(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_sync < REVOCATION_SYNC_SECONDS:
+            return
+        self._last_sync = now
+        if now - self._last_purge >= REVOCATION_PURGE_SECONDS:
+            self.purge_expired()
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                'SELECT seq, jti, expires_at FROM revoked_tokens WHERE seq > ? ORDER BY seq',
+                (self._last_seq,)
+            ).fetchall()
+        if not rows:
+            return
+        with self._lock:
+            for row in rows:
+                self._bloom.add(row['jti'])
+                self._expires[row['jti']] = row['expires_at']
+            self._last_seq = rows[-1]['seq']
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        if not jti:
+            return False
+        self.sync()
+        with self._lock:
+            if jti not in self._bloom:
+                return False
+            return jti in self._expires
+
+    def purge_expired(self):
+        """删除已过期的吊销记录，并重建布隆过滤器"""
+        self._last_purge = time.monotonic()
+        now = time.time()
+        with self.pool.connection() as conn:
+            conn.execute('DELETE FROM revoked_tokens WHERE expires_at <= ?', (now,))
+        # 在锁外重建，换入前补上重建期间新增的条目
+        with self._lock:
+            snapshot = dict(self._expires)
+        expires = {jti: exp for jti, exp in snapshot.items() if exp > now}
+        bloom = BloomFilter()
+        for jti in expires:
+            bloom.add(jti)
+        with self._lock:
+            for jti, exp in self._expires.items():
+                if jti not in snapshot:
+                    expires[jti] = exp
+                    bloom.add(jti)
+            self._expires = expires
+            self._bloom = bloom
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"revoked": len(self._expires), "bloom_bits": self._bloom.bits, "last_seq": self._last_seq}
+
+
+class TokenService:
+    """
+    访问令牌 + 轮换刷新令牌
+
+    - 访问令牌短期有效，只做内存校验（签名 + 吊销索引）
+    - 刷新令牌一次性使用，每次刷新签发新令牌；旧令牌被重复使用时吊销整个令牌族
+    """
+
+    def __init__(self, pool: Optional[ConnectionPool] = None, secret: str = Config.JWT_SECRET_KEY,
+                 access_expires: timedelta = Config.JWT_ACCESS_TOKEN_EXPIRES,
+                 refresh_expires: timedelta = Config.JWT_REFRESH_TOKEN_EXPIRES):
+        self.pool = pool or get_pool()
+        self.secret = secret
+        self.access_expires = access_expires
+        self.refresh_expires = refresh_expires
+        self._init_schema()
+        with self.pool.connection() as conn:
+            conn.execute('DELETE FROM refresh_tokens WHERE expires_at <= ?', (time.time(),))
+        self.revocations = RevocationIndex(self.pool)
+        self.revocations.purge_expired()
+        self.revocations.sync(force=True)
+
+    def _init_schema(self):
+        with self.pool.connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS refresh_tokens (
+                    jti TEXT PRIMARY KEY,
+                    family TEXT NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    used_at REAL,
+                    revoked INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_refresh_family ON refresh_tokens(family)')
+        with self.pool.transaction() as conn:
+            columns = [row['name'] for row in conn.execute('PRAGMA table_info(revoked_tokens)')]
+            migrate = bool(columns) and 'seq' not in columns
+            if migrate:
+                # 旧表按 rowid 同步，清理后 rowid 可能被复用；迁移到自增 seq
+                conn.execute('ALTER TABLE revoked_tokens RENAME TO revoked_tokens_old')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS revoked_tokens (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    jti TEXT NOT NULL UNIQUE,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            if migrate:
+                conn.execute('INSERT INTO revoked_tokens (jti, expires_at) '
+                             'SELECT jti, expires_at FROM revoked_tokens_old ORDER BY rowid')
+                conn.execute('DROP TABLE revoked_tokens_old')
+
+    def _encode(self, claims: Dict) -> str:
+        return jwt.encode(claims, self.secret, algorithm='HS256')
+
+    def issue(self, user_id: int, username: str, family: Optional[str] = None, conn=None) -> Dict:
+        """签发一对访问令牌和刷新令牌"""
+        now = datetime.now(timezone.utc)
+        access_exp = now + self.access_expires
+        refresh_exp = now + self.refresh_expires
+        refresh_jti = uuid.uuid4().hex
+        family = family or uuid.uuid4().hex
+
+        access_token = self._encode({
+            'user_id': user_id,
+            'username': username,
+            'type': 'access',
+            'jti': uuid.uuid4().hex,
+            'exp': access_exp
+        })
+        refresh_token = self._encode({
+            'user_id': user_id,
+            'type': 'refresh',
+            'jti': refresh_jti,
+            'fam': family,
+            'exp': refresh_exp
+        })
+
+        params = (refresh_jti, family, user_id, refresh_exp.timestamp())
+        sql = 'INSERT INTO refresh_tokens (jti, family, user_id, expires_at) VALUES (?, ?, ?, ?)'
+        if conn is not None:
+            conn.execute(sql, params)
+        else:
+            with self.pool.connection() as pooled:
+                pooled.execute(sql, params)
+
+        return {
+            'access_token': access_token,
+            'refresh_token': refresh_token,
+            'expires_in': int(self.access_expires.total_seconds())
+        }
+
+    def _decode_refresh(self, refresh_token: str) -> Dict:
+        try:
+            claims = jwt.decode(refresh_token, self.secret, algorithms=['HS256'])
+        except jwt.ExpiredSignatureError:
+            raise TokenError('刷新令牌已过期')
+        except jwt.InvalidTokenError:
+            raise TokenError('刷新令牌无效')
+        if claims.get('type') != 'refresh':
+            raise TokenError('刷新令牌无效')
+        return claims
+
+    def rotate(self, refresh_token: str, username: str) -> Dict:
+        """用刷新令牌换取新的一对令牌；旧刷新令牌立即失效"""
+        claims = self._decode_refresh(refresh_token)
+        with self.pool.transaction() as conn:
+            row = conn.execute('SELECT * FROM refresh_tokens WHERE jti = ?', (claims['jti'],)).fetchone()
+            if row is None or row['revoked']:
+                raise TokenError('刷新令牌已失效')
+            if row['used_at'] is not None:
+                # 已使用过的刷新令牌再次出现，视为被盗用：吊销整个令牌族
+                conn.execute('UPDATE refresh_tokens SET revoked = 1 WHERE family = ?', (row['family'],))
+                conn.commit()
+                raise TokenError('刷新令牌已被使用，请重新登录')
+            conn.execute('UPDATE refresh_tokens SET used_at = ? WHERE jti = ?', (time.time(), claims['jti']))
+            return self.issue(row['user_id'], username, family=row['family'], conn=conn)
+
+    def revoke(self, access_claims: Optional[Dict] = None, refresh_token: Optional[str] = None):
+        """登出：吊销访问令牌的 jti 以及刷新令牌所在的令牌族"""
+        if access_claims and access_claims.get('jti'):
+            self.revocations.add(access_claims['jti'], float(access_claims.get('exp', time.time())))
+        if refresh_token:
+            try:
+                claims = self._decode_refresh(refresh_token)
+            except TokenError:
+                return
+            with self.pool.connection() as conn:
+                conn.execute('UPDATE refresh_tokens SET revoked = 1 WHERE family = ?', (claims['fam'],))
+
+    def refresh_user_id(self, refresh_token: str) -> int:
+        return int(self._decode_refresh(refresh_token)['user_id'])
+
+    def is_revoked(self, claims: Dict) -> bool:
+        return self.revocations.is_revoked(claims.get('jti'))
+
+
+token_service = TokenService()
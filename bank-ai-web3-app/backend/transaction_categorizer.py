@@ -0,0 +1,342 @@
+# backend/transaction_categorizer.py
+import importlib.util
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from database import ConnectionPool, get_pool
+
+# 模型置信度低于该值的交易交给大模型
+MODEL_MIN_CONFIDENCE = float(os.getenv('CATEGORIZER_MIN_CONFIDENCE', 0.55))
+# 每次大模型请求最多包含的描述条数
+LLM_BATCH_SIZE = int(os.getenv('CATEGORIZER_LLM_BATCH', 100))
+CACHE_SIZE = int(os.getenv('CATEGORIZER_CACHE_SIZE', 50000))
+# 大模型新标注这么多条后重新训练本地模型
+REFIT_EVERY = int(os.getenv('CATEGORIZER_REFIT_EVERY', 200))
+# 大模型标注只对提交描述的用户生效；至少这么多个不同用户得到相同标注后才进入共享的训练集
+SHARED_LABEL_MIN_USERS = int(os.getenv('CATEGORIZER_SHARED_MIN_USERS', 3))
+
+OTHER = '其他'
+
+# scikit-learn 只在第一次需要本地模型时导入；未安装时跳过这一层
+SKLEARN_AVAILABLE = importlib.util.find_spec('sklearn') is not None
+
+# 分类 -> 商户 / 关键词（中英文，匹配时忽略大小写）
+RULES: Dict[str, Sequence[str]] = {
+    '餐饮': ['美团外卖', '饿了么', '星巴克', '瑞幸', '肯德基', '麦当劳', '必胜客', '海底捞', '喜茶', '奈雪', '餐厅',
+           '餐饮', '饭店', '外卖', '咖啡', '奶茶', 'starbucks', 'mcdonald', 'kfc', 'restaurant', 'cafe', 'coffee',
+           'burger', 'pizza'],
+    '交通': ['滴滴', '高德打车', '曹操出行', '地铁', '公交', '加油', '中国石化', '中国石油', '中石化', '中石油', '停车',
+           '高速', '12306', '铁路', '航空', '机票', 'uber', 'lyft', 'shell', 'taxi', 'parking', 'metro'],
+    '购物': ['京东', '淘宝', '天猫', '拼多多', '唯品会', '苏宁', '盒马', '永辉', '沃尔玛', '家乐福', '超市', '便利店',
+           '商城', '网购', 'amazon', 'apple store', 'walmart', 'costco', 'ikea', 'uniqlo', 'supermarket'],
+    '住房': ['房租', '租金', '物业', '链家', '自如', '贝壳', '房贷', 'rent', 'mortgage', 'property'],
+    '生活缴费': ['电费', '水费', '燃气', '国家电网', '供电', '自来水', '暖气', 'utility', 'electric'],
+    '通讯': ['话费', '中国移动', '中国联通', '中国电信', '宽带', '流量', 'mobile', 'telecom', 'broadband'],
+    '娱乐': ['电影', '猫眼', '淘票票', '视频会员', '爱奇艺', '腾讯视频', '优酷', '哔哩哔哩', 'b站', '网易云音乐',
+           'qq音乐', '游戏', 'ktv', 'netflix', 'spotify', 'steam', 'cinema', 'youtube'],
+    '运动': ['健身', '乐刻', '超级猩猩', '游泳', '瑜伽', '球馆', 'gym', 'fitness', 'yoga'],
+    '医疗': ['医院', '药房', '药店', '诊所', '体检', '牙科', '医保', 'pharmacy', 'hospital', 'clinic', 'dental'],
+    '教育': ['学费', '培训', '课程', '教育', '书店', '网课', '考试', 'tuition', 'course', 'school', 'udemy'],
+    '旅行': ['酒店', '携程', '去哪儿', '飞猪', '民宿', '景区', '门票', 'booking', 'airbnb', 'hotel', 'expedia'],
+    '工资': ['工资', '薪资', '薪水', '奖金', '代发', 'salary', 'payroll', 'wage', 'bonus'],
+    '理财': ['理财', '基金', '股票', '证券', '利息', '分红', '收益', '国债', 'dividend', 'interest', 'fund', 'stock'],
+    '转账': ['转账', '汇款', '红包', '微信转账', '支付宝转账', 'transfer', 'remittance', 'venmo', 'paypal'],
+}
+CATEGORIES = list(RULES) + [OTHER]
+
+# 本地模型的补充训练样本（关键词之外的常见说法）
+TRAINING_EXAMPLES: Dict[str, Sequence[str]] = {
+    '餐饮': ['午餐', '晚餐', '早餐', '烧烤', '火锅', '面馆', '小吃', '食堂', 'lunch', 'dinner', 'bakery', 'sushi'],
+    '交通': ['打车', '出租车', '网约车', '火车票', '共享单车', '油费', 'bus fare', 'train ticket', 'gas station'],
+    '购物': ['服装', '鞋子', '数码', '家电', '日用品', '化妆品', 'clothing', 'electronics', 'store', 'shop'],
+    '住房': ['房屋租赁', '押金', '装修', '家政', 'apartment', 'housing'],
+    '生活缴费': ['水电费', '燃气费', '缴费', 'water bill', 'power bill', 'gas bill'],
+    '通讯': ['手机充值', '套餐费', 'phone bill', 'internet'],
+    '娱乐': ['演唱会', '剧院', '酒吧', '桌游', '会员续费', 'concert', 'theater', 'bar', 'music'],
+    '运动': ['运动', '羽毛球', '篮球', '跑步', 'sports', 'swimming'],
+    '医疗': ['挂号', '门诊', '药品', '医疗', 'medicine', 'doctor'],
+    '教育': ['教材', '辅导班', '学习', 'books', 'education', 'training'],
+    '旅行': ['旅游', '度假', '住宿', 'travel', 'resort', 'flight'],
+    '工资': ['劳务费', '报酬', '津贴', 'income', 'paycheck'],
+    '理财': ['投资', '定期存款', '赎回', 'investment', 'savings'],
+    '转账': ['收款', '付款给', '还款', 'payment to', 'received from'],
+    OTHER: ['手续费', '其他', '未知', 'fee', 'misc'],
+}
+
+_NOISE = re.compile(r'[\d#*_\-—/\\|:：,，.。()（）\[\]【】]+')
+_SPACES = re.compile(r'\s+')
+
+
+def normalize(description: str) -> str:
+    """缓存键：小写，去掉订单号、日期等数字和标点"""
+    return _SPACES.sub(' ', _NOISE.sub(' ', (description or '').lower())).strip()
+
+
+def _edge(char: str) -> str:
+    return r'a-z' if char.isalpha() else r'\d' if char.isdigit() else ''
+
+
+def _keyword_pattern(keyword: str) -> str:
+    escaped = re.escape(keyword.lower())
+    if not keyword.isascii():
+        return escaped
+    # 英文关键词按整词匹配，避免 refund 命中 fund；数字关键词不匹配订单号中间的数字
+    before, after = _edge(keyword[0]), _edge(keyword[-1])
+    return (rf'(?<![{before}])' if before else '') + escaped + (rf'(?![{after}])' if after else '')
+
+
+def raw_rules(rules: Dict[str, Sequence[str]] = RULES) -> Dict[str, Sequence[str]]:
+    """normalize 会改掉的关键词（如 12306），只能在原文上匹配"""
+    raw = {category: [k for k in keywords if normalize(k) != k.lower()] for category, keywords in rules.items()}
+    return {category: keywords for category, keywords in raw.items() if keywords}
+
+
+class RuleTable:
+    """所有关键词编译进一个正则，每条描述只扫描一次；命中多个时取最靠前的"""
+
+    def __init__(self, rules: Dict[str, Sequence[str]] = RULES):
+        self.categories = list(rules)
+        if not rules:
+            self._pattern = None
+            return
+        groups = [
+            f"(?P<c{i}>{'|'.join(_keyword_pattern(k) for k in sorted(keywords, key=len, reverse=True))})"
+            for i, keywords in enumerate(rules.values())
+        ]
+        self._pattern = re.compile('|'.join(groups))
+
+    def match(self, text: str) -> Optional[str]:
+        if self._pattern is None:
+            return None
+        found = self._pattern.search(text)
+        return self.categories[int(found.lastgroup[1:])] if found else None
+
+
+class TransactionCategorizer:
+    """
+    批量交易分类
+
+    依次使用：数字等关键词匹配原文 -> 缓存 -> 规则表 -> 本人的大模型标注 -> 本地 TF-IDF（字符 n-gram）+ 逻辑回归
+    -> 大模型（仅低置信度的剩余部分，去重后合并成少量批量请求）。
+    大模型的结果按用户持久化，只用于该用户；多个用户得到相同标注后才作为本地模型的训练样本，
+    单个用户无法通过构造描述影响其他人的分类。
+    """
+
+    def __init__(self, llm: Optional[Callable[[str], Optional[str]]] = None, pool: Optional[ConnectionPool] = None):
+        self.llm = llm
+        self.pool = pool or get_pool()
+        self.rules = RuleTable()
+        self.raw_rules = RuleTable(raw_rules())
+        self._cache: "OrderedDict[str, Tuple[str, float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._new_labels = 0
+        self.stats = {"cache": 0, "rule": 0, "model": 0, "llm": 0, "fallback": 0, "llm_calls": 0}
+        self._init_schema()
+
+    def _init_schema(self):
+        with self.pool.connection() as conn:
+            columns = [row['name'] for row in conn.execute('PRAGMA table_info(category_labels)')]
+            if columns and 'user_id' not in columns:
+                # 旧表的标注无法区分来自哪个用户，直接丢弃，需要时大模型会重新标注
+                conn.execute('DROP TABLE category_labels')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS category_labels (
+                    user_id INTEGER NOT NULL,
+                    normalized TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (user_id, normalized)
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_category_labels_text ON category_labels(normalized, category)')
+
+    # ---------- 缓存 ----------
+
+    def _cache_get(self, key: str) -> Optional[Tuple[str, float, str]]:
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit is not None:
+                self._cache.move_to_end(key)
+            return hit
+
+    def _cache_put(self, key: str, value: Tuple[str, float, str]):
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def _stored_labels(self, user_id: int, keys: List[str]) -> Dict[str, str]:
+        labels = {}
+        with self.pool.connection() as conn:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT normalized, category FROM category_labels "
+                    f"WHERE user_id = ? AND normalized IN ({','.join('?' * len(chunk))})",
+                    [user_id, *chunk]
+                ).fetchall()
+                labels.update((row['normalized'], row['category']) for row in rows)
+        return labels
+
+    # ---------- 本地模型 ----------
+
+    def _training_set(self) -> Tuple[List[str], List[str]]:
+        texts, labels = [], []
+        for source in (RULES, TRAINING_EXAMPLES):
+            for category, examples in source.items():
+                texts += [normalize(e) for e in examples]
+                labels += [category] * len(examples)
+        with self.pool.connection() as conn:
+            for row in conn.execute(
+                'SELECT normalized, category FROM category_labels GROUP BY normalized, category '
+                'HAVING COUNT(DISTINCT user_id) >= ?', (SHARED_LABEL_MIN_USERS,)
+            ):
+                texts.append(row['normalized'])
+                labels.append(row['category'])
+        return texts, labels
+
+    def _get_model(self):
+        if not SKLEARN_AVAILABLE:
+            return None
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self._fit()
+        return self._model
+
+    def _fit(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import make_pipeline
+
+        texts, labels = self._training_set()
+        model = make_pipeline(
+            TfidfVectorizer(analyzer='char_wb', ngram_range=(1, 3), sublinear_tf=True),
+            LogisticRegression(C=20, solver='liblinear')
+        )
+        model.fit(texts, labels)
+        return model
+
+    def refit(self):
+        """用最新的大模型标注重新训练（在后台线程调用）"""
+        model = self._fit()
+        with self._model_lock:
+            self._model = model
+
+    # ---------- 大模型 ----------
+
+    def _ask_llm(self, texts: List[str]) -> Dict[str, str]:
+        """一次请求标注一批描述，返回 {描述: 分类}；解析失败的条目不返回"""
+        numbered = "\n".join(f"{i + 1}. {text}" for i, text in enumerate(texts))
+        prompt = (
+            f"请把下面的银行交易描述分别归入以下分类之一：{'、'.join(CATEGORIES)}。\n"
+            '只返回 JSON 对象，键为序号，值为分类名称，例如 {"1": "餐饮", "2": "交通"}。\n\n' + numbered
+        )
+        self.stats["llm_calls"] += 1
+        reply = self.llm(prompt) if self.llm else None
+        if not reply:
+            return {}
+        match = re.search(r'\{.*\}', reply, re.S)
+        try:
+            parsed = json.loads(match.group(0)) if match else {}
+        except json.JSONDecodeError:
+            return {}
+        results = {}
+        for index, category in parsed.items():
+            if str(index).isdigit() and 0 < int(index) <= len(texts) and category in CATEGORIES:
+                results[texts[int(index) - 1]] = category
+        return results
+
+    def _label_with_llm(self, texts: List[str], user_id: Optional[int]) -> Dict[str, str]:
+        labels = {}
+        for start in range(0, len(texts), LLM_BATCH_SIZE):
+            labels.update(self._ask_llm(texts[start:start + LLM_BATCH_SIZE]))
+        if labels and user_id is not None:
+            now = time.time()
+            with self.pool.connection() as conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO category_labels (user_id, normalized, category, created_at) '
+                    'VALUES (?, ?, ?, ?)',
+                    [(user_id, text, category, now) for text, category in labels.items()]
+                )
+            self._new_labels += len(labels)
+            if self._new_labels >= REFIT_EVERY:
+                self._new_labels = 0
+                threading.Thread(target=self.refit, name='categorizer-refit', daemon=True).start()
+        return labels
+
+    # ---------- 对外接口 ----------
+
+    def categorize(self, descriptions: Sequence[str], use_llm: bool = True,
+                   user_id: Optional[int] = None) -> List[Dict]:
+        """
+        批量分类
+
+        Args:
+            user_id: 提交描述的用户；大模型标注按用户保存，为 None 时不读取也不保存标注
+
+        Returns:
+            与输入一一对应的 {"category", "confidence", "source"}，
+            source 为 cache / rule / model / llm / fallback
+        """
+        texts = [(d or '').lower() for d in descriptions]
+        ruled = {text: self.raw_rules.match(text) for text in dict.fromkeys(texts)}
+        keys = [normalize(text) for text in texts]
+        resolved: Dict[str, Tuple[str, float, str]] = {}
+        pending = []
+        for key in dict.fromkeys(key for text, key in zip(texts, keys) if not ruled[text]):
+            # 缓存只保存规则和本地模型的结果，对所有用户相同
+            hit = self._cache_get(key)
+            if hit is not None:
+                resolved[key] = (hit[0], hit[1], 'cache')
+                continue
+            category = self.rules.match(key) if key else OTHER
+            if category:
+                resolved[key] = (category, 1.0, 'rule')
+                self._cache_put(key, resolved[key])
+            else:
+                pending.append(key)
+
+        if pending and user_id is not None:
+            stored = self._stored_labels(user_id, pending)
+            for key, category in stored.items():
+                resolved[key] = (category, 1.0, 'llm')
+            pending = [key for key in pending if key not in stored]
+
+        residue = []
+        model = self._get_model() if pending else None
+        if pending and model is None:
+            for key in pending:
+                resolved[key] = (OTHER, 0.0, 'fallback')
+            residue = pending
+        elif pending:
+            probabilities = model.predict_proba(pending)
+            best = probabilities.argmax(axis=1)
+            for key, index, row in zip(pending, best, probabilities):
+                category, confidence = model.classes_[index], float(row[index])
+                if confidence >= MODEL_MIN_CONFIDENCE:
+                    resolved[key] = (category, round(confidence, 3), 'model')
+                    self._cache_put(key, resolved[key])
+                else:
+                    # 大模型不可用或没有给出结果时归入「其他」
+                    resolved[key] = (OTHER, 0.0, 'fallback')
+                    residue.append(key)
+
+        if residue and use_llm and self.llm:
+            for key, category in self._label_with_llm(residue, user_id).items():
+                resolved[key] = (category, 1.0, 'llm')
+
+        results = []
+        for text, key in zip(texts, keys):
+            category, confidence, source = (ruled[text], 1.0, 'rule') if ruled[text] else resolved[key]
+            self.stats[source] += 1
+            results.append({"category": category, "confidence": confidence, "source": source})
+        return results
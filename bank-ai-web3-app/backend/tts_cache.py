@@ -0,0 +1,134 @@
+# backend/tts_cache.py
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+MB = 1024 * 1024
+
+
+class TTSCache:
+    """TTS 音频缓存：内存热点层（LRU）+ 有容量上限的磁盘层"""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_disk_bytes: Optional[int] = None,
+                 max_memory_bytes: Optional[int] = None):
+        self.cache_dir = cache_dir or os.getenv('TTS_CACHE_DIR', 'tts_cache')
+        self.max_disk_bytes = max_disk_bytes or int(os.getenv('TTS_CACHE_DISK_BYTES', 200 * MB))
+        self.max_memory_bytes = max_memory_bytes or int(os.getenv('TTS_CACHE_MEMORY_BYTES', 16 * MB))
+
+        self._hot = OrderedDict()
+        self._hot_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._disk_bytes = sum(
+            entry.stat().st_size for entry in os.scandir(self.cache_dir) if entry.name.endswith('.audio')
+        )
+
+    @staticmethod
+    def make_key(text: str, language: str, engine: str, voice: str = 'default') -> str:
+        return hashlib.sha256(f"{engine}\0{voice}\0{language}\0{text}".encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.audio")
+
+    def get(self, text: str, language: str, engine: str, voice: str = 'default') -> Optional[bytes]:
+        key = self.make_key(text, language, engine, voice)
+
+        with self._lock:
+            audio = self._hot.get(key)
+            if audio is not None:
+                self._hot.move_to_end(key)
+                self.hits += 1
+                return audio
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                audio = f.read()
+            # 更新访问时间，供磁盘层按 LRU 淘汰
+            os.utime(path, None)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self._remember(key, audio)
+        return audio
+
+    def put(self, text: str, language: str, engine: str, audio: bytes, voice: str = 'default'):
+        if not audio:
+            return
+        key = self.make_key(text, language, engine, voice)
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+
+        try:
+            existed = os.path.exists(path)
+            with open(tmp_path, 'wb') as f:
+                f.write(audio)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"❌ TTS 缓存写入失败: {e}")
+            return
+
+        with self._lock:
+            if not existed:
+                self._disk_bytes += len(audio)
+            self._remember(key, audio)
+            over_limit = self._disk_bytes > self.max_disk_bytes
+
+        if over_limit:
+            self._evict_disk()
+
+    def _remember(self, key: str, audio: bytes):
+        """放入内存热点层（调用方持有锁）"""
+        if len(audio) > self.max_memory_bytes:
+            return
+        old = self._hot.pop(key, None)
+        if old is not None:
+            self._hot_bytes -= len(old)
+        self._hot[key] = audio
+        self._hot_bytes += len(audio)
+        while self._hot_bytes > self.max_memory_bytes:
+            _, evicted = self._hot.popitem(last=False)
+            self._hot_bytes -= len(evicted)
+
+    def _evict_disk(self):
+        """按最近访问时间淘汰磁盘条目，降到上限的 90%"""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.audio'):
+                stat = entry.stat()
+                entries.append((stat.st_atime if stat.st_atime > stat.st_mtime else stat.st_mtime,
+                                stat.st_size, entry.path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_disk_bytes * 0.9)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+            except OSError:
+                pass
+
+        with self._lock:
+            self._disk_bytes = total
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_entries": len(self._hot),
+                "memory_bytes": self._hot_bytes,
+                "disk_bytes": self._disk_bytes
+            }
@@ -0,0 +1,99 @@
+# backend/tts_pool.py
+import os
+import re
+import struct
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Iterable, Iterator, List, Optional
+
+# 句子切分：中英文句末标点及换行，标点保留在句尾
+_SENTENCE_END = re.compile(r'(?<=[。！？；!?;])|(?<=\.)(?=\s)|\n+')
+
+# 流式响应的二进制帧：1 字节类型 + 4 字节大端长度 + 负载
+FRAME_AUDIO = b'A'
+FRAME_JSON = b'J'
+
+
+def encode_frame(frame_type: bytes, payload: bytes) -> bytes:
+    return frame_type + struct.pack('>I', len(payload)) + payload
+
+
+def split_sentences(text: str, min_chars: int = 4) -> List[str]:
+    """把回复切成句子；过短的片段并入前一句，避免合成大量零碎音频"""
+    sentences = []
+    for part in _SENTENCE_END.split(text):
+        part = part.strip() if part else ''
+        if not part:
+            continue
+        if sentences and len(part) < min_chars:
+            sentences[-1] = f"{sentences[-1]} {part}"
+        else:
+            sentences.append(part)
+    return sentences
+
+
+def iter_sentences(chunks: Iterable[str], min_chars: int = 4) -> Iterator[str]:
+    """把流式生成的文本片段拼接后逐句产出；最后一段可能还没写完，留到下一个片段再判断"""
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk
+        tail = _SENTENCE_END.split(buffer)[-1]
+        if len(tail) == len(buffer):
+            continue
+        for sentence in split_sentences(buffer[:len(buffer) - len(tail)], min_chars):
+            yield sentence
+        buffer = tail
+    for sentence in split_sentences(buffer, min_chars):
+        yield sentence
+
+
+class LocalTTSPool:
+    """
+    离线 TTS：一个长期存活的 pyttsx3 引擎，由单个工作线程串行合成
+
+    espeak 等驱动的状态是进程级的，同一进程里多个引擎并行合成会互相串音，
+    所以不做并行；句子仍逐句提交，第一句合成完即可开始播放
+    """
+
+    def __init__(self, pyttsx3_module):
+        self.pyttsx3 = pyttsx3_module
+        self._engine = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="local-tts",
+            initializer=self._init_engine
+        )
+        print("✅ 本地TTS引擎已启动")
+
+    def _init_engine(self):
+        self._engine = self.pyttsx3.init()
+
+    def _synthesize(self, text: str) -> Optional[bytes]:
+        engine = self._engine
+        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp_file:
+            tmp_file_path = tmp_file.name
+        try:
+            engine.save_to_file(text, tmp_file_path)
+            engine.runAndWait()
+            with open(tmp_file_path, 'rb') as f:
+                return f.read()
+        except Exception as e:
+            print(f"❌ 本地TTS合成失败: {e}")
+            return None
+        finally:
+            try:
+                os.unlink(tmp_file_path)
+            except OSError:
+                pass
+
+    def submit(self, text: str) -> Future:
+        return self._executor.submit(self._synthesize, text)
+
+    def synthesize(self, text: str) -> Optional[bytes]:
+        return self.submit(text).result()
+
+    def synthesize_sentences(self, sentences: List[str]) -> Iterator[Optional[bytes]]:
+        """按顺序排队合成所有句子并逐句产出（第一句完成即可开始播放）"""
+        futures = [self.submit(sentence) for sentence in sentences]
+        for future in futures:
+            yield future.result()
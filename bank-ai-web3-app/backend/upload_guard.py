@@ -0,0 +1,215 @@
+# backend/upload_guard.py
+import os
+import wave
+import shutil
+import subprocess
+from tempfile import SpooledTemporaryFile
+from typing import Optional, Tuple
+
+from flask import Request, request, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge
+from PIL import Image
+
+MB = 1024 * 1024
+
+MAX_AUDIO_BYTES = int(os.getenv('UPLOAD_MAX_AUDIO_BYTES', 10 * MB))
+MAX_IMAGE_BYTES = int(os.getenv('UPLOAD_MAX_IMAGE_BYTES', 8 * MB))
+MAX_ID_CARD_BYTES = int(os.getenv('UPLOAD_MAX_ID_CARD_BYTES', 5 * MB))
+MAX_IMAGE_PIXELS = int(os.getenv('UPLOAD_MAX_IMAGE_PIXELS', 25_000_000))
+MAX_AUDIO_SECONDS = float(os.getenv('UPLOAD_MAX_AUDIO_SECONDS', 120))
+MAX_STATEMENT_BYTES = int(os.getenv('UPLOAD_MAX_STATEMENT_BYTES', 200 * MB))
+
+# 解压炸弹保护：超过上限时 PIL 直接抛出 DecompressionBombError
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+# 表单字段等非文件部分的额外余量
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+# endpoint -> (文件字段, 媒体类别, 字节上限)
+UPLOAD_RULES = {
+    'ai.chat_voice': ('audio', 'audio', MAX_AUDIO_BYTES),
+    'ai.chat_image': ('image', 'image', MAX_IMAGE_BYTES),
+    'ai.ocr_extract': ('image', 'image', MAX_IMAGE_BYTES),
+    'ai.validate_id_card': ('image', 'image', MAX_ID_CARD_BYTES),
+    'ledger.import_statement': ('file', 'statement', MAX_STATEMENT_BYTES),
+}
+
+# 全局请求体上限（兜底没有 Content-Length 的分块上传）；对账单导入只在自己的接口放宽
+MAX_CONTENT_LENGTH = max(limit for _, kind, limit in UPLOAD_RULES.values() if kind != 'statement') + FORM_OVERHEAD_BYTES
+
+IMAGE_FORMATS = {'png', 'jpeg', 'gif', 'webp', 'bmp', 'tiff'}
+AUDIO_FORMATS = {'wav', 'webm', 'ogg', 'mp3', 'mp4', 'flac'}
+
+
+class UploadRejected(Exception):
+    """上传文件未通过校验"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class _BoundedSpooledFile(SpooledTemporaryFile):
+    """写入超过上限时立即中止解析，避免把超大文件落盘或放进内存"""
+
+    def __init__(self, limit: int):
+        super().__init__(max_size=500 * 1024, mode='rb+')
+        self._limit = limit
+        self._written = 0
+
+    def write(self, data):
+        self._written += len(data)
+        if self._written > self._limit:
+            raise RequestEntityTooLarge(f"上传文件超过 {self._limit // MB} MB 上限")
+        return super().write(data)
+
+
+class GuardedRequest(Request):
+    """按 endpoint 限制上传文件大小的流式 multipart 解析"""
+
+    @property
+    def max_content_length(self):
+        rule = UPLOAD_RULES.get(self.endpoint)
+        if rule is not None and rule[1] == 'statement':
+            return rule[2] + FORM_OVERHEAD_BYTES
+        return super().max_content_length
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        rule = UPLOAD_RULES.get(self.endpoint)
+        if rule is None:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        return _BoundedSpooledFile(rule[2])
+
+
+def sniff_format(head: bytes) -> Optional[str]:
+    """根据文件头魔数识别格式"""
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return 'wav'
+    if head.startswith(b'BM'):
+        return 'bmp'
+    if head[:4] in (b'II*\x00', b'MM\x00*'):
+        return 'tiff'
+    if head.startswith(b'\x1a\x45\xdf\xa3'):
+        return 'webm'
+    if head.startswith(b'OggS'):
+        return 'ogg'
+    if head.startswith(b'fLaC'):
+        return 'flac'
+    if head[4:8] == b'ftyp':
+        return 'mp4'
+    if head.startswith(b'ID3') or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return 'mp3'
+    return None
+
+
+def check_image_header(stream) -> Tuple[int, int]:
+    """只解析图像头部获取尺寸，不解码像素"""
+    try:
+        with Image.open(stream) as image:
+            width, height = image.size
+    except Image.DecompressionBombError:
+        raise UploadRejected("图像像素过多", 413)
+    except Exception:
+        raise UploadRejected("无法识别的图像文件", 415)
+
+    if width * height > MAX_IMAGE_PIXELS:
+        raise UploadRejected(f"图像像素过多（{width}x{height}），上限 {MAX_IMAGE_PIXELS} 像素", 413)
+    return width, height
+
+
+def probe_audio_duration(stream, audio_format: str) -> Optional[float]:
+    """探测音频时长（秒）；无法探测时返回 None"""
+    if audio_format == 'wav':
+        try:
+            with wave.open(stream, 'rb') as wav:
+                return wav.getnframes() / float(wav.getframerate())
+        except (wave.Error, EOFError, ZeroDivisionError):
+            return None
+
+    ffprobe = shutil.which('ffprobe')
+    if not ffprobe:
+        return None
+    try:
+        proc = subprocess.run(
+            [ffprobe, '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', '-i', 'pipe:0'],
+            input=stream.read(), capture_output=True, timeout=5
+        )
+        return float(proc.stdout.strip())
+    except (subprocess.SubprocessError, ValueError, OSError):
+        return None
+
+
+def validate_upload(file_storage, kind: str) -> str:
+    """
+    校验已流式落盘的上传文件：魔数 → 图像像素 / 音频时长
+
+    Returns:
+        识别出的文件格式
+    """
+    stream = file_storage.stream
+    stream.seek(0)
+    head = stream.read(32)
+    stream.seek(0)
+
+    if not head:
+        raise UploadRejected("上传文件为空")
+
+    if kind == 'statement':
+        # 对账单是文本（CSV / OFX），具体格式由导入器识别
+        if b'\0' in head:
+            raise UploadRejected("不支持的文件格式，仅支持: csv, ofx", 415)
+        return 'text'
+
+    file_format = sniff_format(head)
+    allowed = IMAGE_FORMATS if kind == 'image' else AUDIO_FORMATS
+    if file_format not in allowed:
+        raise UploadRejected(f"不支持的文件格式，仅支持: {', '.join(sorted(allowed))}", 415)
+
+    try:
+        if kind == 'image':
+            check_image_header(stream)
+        else:
+            duration = probe_audio_duration(stream, file_format)
+            if duration is not None and duration > MAX_AUDIO_SECONDS:
+                raise UploadRejected(f"音频时长 {duration:.1f} 秒，超过 {MAX_AUDIO_SECONDS:.0f} 秒上限", 413)
+    finally:
+        stream.seek(0)
+
+    return file_format
+
+
+def guard_uploads():
+    """蓝图 before_request：在进入视图前拒绝超限或异常的上传"""
+    rule = UPLOAD_RULES.get(request.endpoint)
+    if rule is None or request.method != 'POST':
+        return None
+
+    field, kind, limit = rule
+
+    # 声明的请求体已超限：不读取请求体，直接拒绝
+    if request.content_length is not None and request.content_length > limit + FORM_OVERHEAD_BYTES:
+        return jsonify({
+            "success": False,
+            "error": f"上传文件超过 {limit // MB} MB 上限"
+        }), 413
+
+    try:
+        file_storage = request.files.get(field)
+        if file_storage is None:
+            return None  # 缺少文件时交给视图返回原有的提示
+        validate_upload(file_storage, kind)
+    except RequestEntityTooLarge as e:
+        return jsonify({"success": False, "error": e.description}), 413
+    except UploadRejected as e:
+        return jsonify({"success": False, "error": e.message}), e.status_code
+
+    return None
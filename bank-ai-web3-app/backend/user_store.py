@@ -0,0 +1,153 @@
+# backend/user_store.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional
+
+from database import ConnectionPool, get_pool
+
+# 用户资料缓存：条数上限与有效期（其他 worker 的修改最多延迟这么久可见）
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))
+USER_CACHE_TTL_SECONDS = float(os.getenv('USER_CACHE_TTL', 60))
+
+
+class UserExists(Exception):
+    """用户名或邮箱已被占用"""
+
+    def __init__(self, field: str):
+        super().__init__(field)
+        self.field = field
+
+
+class UserStore:
+    """
+    基于 SQLite 的用户存储
+
+    - username / email 唯一索引，ID 由数据库自增分配
+    - 按 id 的读穿透缓存，鉴权时大多数请求不访问数据库
+    """
+
+    def __init__(self, pool: Optional[ConnectionPool] = None):
+        self.pool = pool or get_pool()
+        self._cache: "OrderedDict[int, tuple]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._init_schema()
+
+    def _init_schema(self):
+        with self.pool.connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT NOT NULL,
+                    email TEXT NOT NULL,
+                    password_hash TEXT NOT NULL,
+                    full_name TEXT NOT NULL,
+                    role TEXT NOT NULL DEFAULT 'user',
+                    created_at TEXT NOT NULL
+                )
+            """)
+            conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users(username)')
+            conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email ON users(email COLLATE NOCASE)')
+
+    def seed_demo_user(self):
+        """首次启动时写入演示账号（旧格式哈希，首次登录后自动升级为 bcrypt）"""
+        with self.pool.connection() as conn:
+            conn.execute(
+                'INSERT OR IGNORE INTO users (username, email, password_hash, full_name, role, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                ('demo', 'demo@example.com', hashlib.sha256('demo123'.encode()).hexdigest(),
+                 'Demo User', 'user', '2024-01-01T00:00:00Z')
+            )
+
+    def _cache_get(self, user_id: int) -> Optional[Dict]:
+        with self._cache_lock:
+            entry = self._cache.get(user_id)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at <= time.monotonic():
+                del self._cache[user_id]
+                return None
+            self._cache.move_to_end(user_id)
+            return user
+
+    def _cache_put(self, user: Dict):
+        with self._cache_lock:
+            self._cache[user['id']] = (time.monotonic() + USER_CACHE_TTL_SECONDS, user)
+            self._cache.move_to_end(user['id'])
+            while len(self._cache) > USER_CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def _invalidate(self, user_id: int):
+        with self._cache_lock:
+            self._cache.pop(user_id, None)
+
+    def get_by_id(self, user_id) -> Optional[Dict]:
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+
+        user = self._cache_get(user_id)
+        if user is not None:
+            return user
+
+        with self.pool.connection() as conn:
+            row = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
+        if row is None:
+            return None
+        user = dict(row)
+        self._cache_put(user)
+        return user
+
+    def get_by_username(self, username: str) -> Optional[Dict]:
+        """登录时使用，始终读库以拿到最新的密码哈希"""
+        with self.pool.connection() as conn:
+            row = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
+        if row is None:
+            return None
+        user = dict(row)
+        self._cache_put(user)
+        return user
+
+    def create(self, username: str, email: str, password_hash: str, full_name: str, role: str = 'user') -> Dict:
+        """创建用户，用户名或邮箱重复时抛出 UserExists"""
+        created_at = datetime.utcnow().isoformat() + 'Z'
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.execute(
+                    'INSERT INTO users (username, email, password_hash, full_name, role, created_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (username, email, password_hash, full_name, role, created_at)
+                )
+        except sqlite3.IntegrityError as e:
+            raise UserExists('email' if 'email' in str(e) else 'username')
+
+        user = {
+            'id': cursor.lastrowid,
+            'username': username,
+            'email': email,
+            'password_hash': password_hash,
+            'full_name': full_name,
+            'role': role,
+            'created_at': created_at
+        }
+        self._cache_put(user)
+        return user
+
+    def update_password_hash(self, user_id: int, password_hash: str):
+        with self.pool.connection() as conn:
+            conn.execute('UPDATE users SET password_hash = ? WHERE id = ?', (password_hash, user_id))
+        self._invalidate(user_id)
+
+    def exists(self, username: str) -> bool:
+        with self.pool.connection() as conn:
+            return conn.execute('SELECT 1 FROM users WHERE username = ?', (username,)).fetchone() is not None
+
+
+user_store = UserStore()
+user_store.seed_demo_user()
@@ -0,0 +1,188 @@
+# backend/voice_activity.py
+import io
+import os
+import wave
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+SAMPLE_RATE = 16000  # Whisper 的输入采样率
+
+FRAME_MS = int(os.getenv('VAD_FRAME_MS', 30))
+PADDING_MS = int(os.getenv('VAD_PADDING_MS', 200))
+MIN_SPEECH_MS = int(os.getenv('VAD_MIN_SPEECH_MS', 250))
+# 绝对能量下限（dBFS），低于此值一律视为静音
+ABSOLUTE_FLOOR_DB = float(os.getenv('VAD_ABSOLUTE_FLOOR_DB', -50))
+# 相对噪声底的能量阈值（dB）
+NOISE_MARGIN_DB = float(os.getenv('VAD_NOISE_MARGIN_DB', 10))
+# 相对峰值的动态范围（dB）
+DYNAMIC_RANGE_DB = float(os.getenv('VAD_DYNAMIC_RANGE_DB', 25))
+
+
+def decode_wav(audio_data: bytes) -> Optional[np.ndarray]:
+    """把 PCM WAV 解码为 16kHz 单声道 float32；不是 PCM WAV 时返回 None"""
+    try:
+        with wave.open(io.BytesIO(audio_data), 'rb') as wav:
+            channels = wav.getnchannels()
+            sample_width = wav.getsampwidth()
+            rate = wav.getframerate()
+            frames = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError):
+        return None
+
+    if sample_width == 2:
+        samples = np.frombuffer(frames, dtype='<i2').astype(np.float32) / 32768.0
+    elif sample_width == 4:
+        samples = np.frombuffer(frames, dtype='<i4').astype(np.float32) / 2147483648.0
+    elif sample_width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    else:
+        return None
+
+    if channels > 1:
+        samples = samples[: len(samples) // channels * channels].reshape(-1, channels).mean(axis=1)
+
+    if rate != SAMPLE_RATE and len(samples):
+        target_len = int(round(len(samples) * SAMPLE_RATE / rate))
+        samples = np.interp(
+            np.linspace(0, len(samples) - 1, target_len),
+            np.arange(len(samples)),
+            samples
+        ).astype(np.float32)
+
+    return samples
+
+
+def _frame_features(frames: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """每帧的能量（dBFS）与过零率"""
+    rms = np.sqrt(np.mean(frames * frames, axis=1) + 1e-12)
+    energy_db = 20.0 * np.log10(rms)
+    # 过零率：清辅音能量低但过零率高，避免被当作静音剪掉
+    zcr = np.mean(np.abs(np.diff(np.signbit(frames), axis=1)), axis=1)
+    return energy_db, zcr
+
+
+def _speech_mask(energy_db: np.ndarray, zcr: np.ndarray) -> np.ndarray:
+    """按整段的噪声底和峰值定阈值，返回每帧是否为语音"""
+    noise_floor = np.percentile(energy_db, 10)
+    # 整段都是语音时噪声底估计偏高，用峰值往下的动态范围兜底
+    peak = np.max(energy_db)
+    threshold = max(ABSOLUTE_FLOOR_DB, min(noise_floor + NOISE_MARGIN_DB, peak - DYNAMIC_RANGE_DB))
+    voiced = energy_db > threshold
+    unvoiced = (energy_db > threshold - 6) & (zcr > 0.25) & (zcr < 0.6)
+    return voiced | unvoiced
+
+
+def _speech_bounds(speech: np.ndarray, frame_len: int, n_samples: int) -> Optional[Tuple[int, int]]:
+    """语音帧足够长时返回加上前后留白的起止采样点"""
+    if np.count_nonzero(speech) * FRAME_MS < MIN_SPEECH_MS:
+        return None
+    indices = np.flatnonzero(speech)
+    pad = PADDING_MS // FRAME_MS
+    first = max(0, indices[0] - pad)
+    last = min(len(speech), indices[-1] + 1 + pad)
+    return first * frame_len, min(n_samples, last * frame_len)
+
+
+def detect_speech(samples: np.ndarray, sample_rate: int = SAMPLE_RATE) -> Tuple[Optional[Tuple[int, int]], Dict]:
+    """
+    基于短时能量 + 过零率的轻量 VAD
+
+    Returns:
+        (起止采样点, 统计信息)；未检测到语音时起止为 None
+    """
+    frame_len = max(1, sample_rate * FRAME_MS // 1000)
+    n_frames = len(samples) // frame_len
+    duration = len(samples) / float(sample_rate)
+    stats = {"duration_s": round(duration, 3), "speech_s": 0.0, "trimmed_s": 0.0}
+
+    if n_frames == 0:
+        return None, stats
+
+    frames = samples[: n_frames * frame_len].reshape(n_frames, frame_len)
+    speech = _speech_mask(*_frame_features(frames))
+    stats["speech_s"] = round(int(np.count_nonzero(speech)) * FRAME_MS / 1000.0, 3)
+
+    bounds = _speech_bounds(speech, frame_len, len(samples))
+    if bounds is None:
+        return None, stats
+    stats["trimmed_s"] = round(duration - (bounds[1] - bounds[0]) / float(sample_rate), 3)
+    return bounds, stats
+
+
+class SpeechTracker:
+    """
+    流式 VAD：与 detect_speech 判定一致，但每帧的能量和过零率只在音频到达时计算一次
+
+    缓冲区从第 0 帧开始按帧对齐；调用方丢弃开头的音频时用 drop 同步丢弃对应的帧
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE):
+        self.frame_len = max(1, sample_rate * FRAME_MS // 1000)
+        self._energy = np.zeros(0, dtype=np.float64)
+        self._zcr = np.zeros(0, dtype=np.float64)
+        self._remainder = np.zeros(0, dtype=np.float32)
+
+    @property
+    def frames(self) -> int:
+        return len(self._energy)
+
+    @property
+    def samples(self) -> int:
+        return self.frames * self.frame_len + len(self._remainder)
+
+    def push(self, samples: np.ndarray):
+        if len(self._remainder):
+            samples = np.concatenate([self._remainder, samples])
+        n_frames = len(samples) // self.frame_len
+        if n_frames:
+            energy_db, zcr = _frame_features(samples[: n_frames * self.frame_len].reshape(n_frames, self.frame_len))
+            self._energy = np.concatenate([self._energy, energy_db])
+            self._zcr = np.concatenate([self._zcr, zcr])
+        self._remainder = samples[n_frames * self.frame_len:]
+
+    def drop(self, n_frames: int):
+        """丢弃最早的 n_frames 帧"""
+        self._energy = self._energy[n_frames:]
+        self._zcr = self._zcr[n_frames:]
+
+    def speech(self) -> np.ndarray:
+        if not self.frames:
+            return np.zeros(0, dtype=bool)
+        return _speech_mask(self._energy, self._zcr)
+
+    def bounds(self) -> Optional[Tuple[int, int]]:
+        """当前缓冲区内语音的起止采样点；没有语音时为 None"""
+        if not self.frames:
+            return None
+        return _speech_bounds(self.speech(), self.frame_len, self.samples)
+
+    def last_pause(self, before_frame: int, min_frames: int) -> Optional[int]:
+        """
+        before_frame 之前最后一段不短于 min_frames 的停顿（前面有语音）的中间帧；没有时为 None
+
+        在停顿中间切开音频不会切断字词
+        """
+        speech = self.speech()[:before_frame]
+        voiced = np.flatnonzero(speech)
+        if not len(voiced):
+            return None
+        trailing = len(speech) - 1 - voiced[-1]
+        if trailing >= min_frames:
+            return int(voiced[-1] + 1 + trailing // 2)
+        # 相邻语音帧之间的间隔即停顿
+        gaps = np.diff(voiced) - 1
+        candidates = np.flatnonzero(gaps >= min_frames)
+        if len(candidates):
+            i = candidates[-1]
+            return int(voiced[i] + 1 + gaps[i] // 2)
+        return None
+
+
+def trim_silence(samples: np.ndarray, sample_rate: int = SAMPLE_RATE) -> Tuple[Optional[np.ndarray], Dict]:
+    """裁剪首尾静音；没有语音时返回 None"""
+    bounds, stats = detect_speech(samples, sample_rate)
+    if bounds is None:
+        return None, stats
+    start, end = bounds
+    return samples[start:end], stats
@@ -3,10 +3,15 @@ import os
 import base64
 import tempfile
 import io
-from typing import Optional, Tuple
+from typing import Iterator, Optional, Tuple
 from dotenv import load_dotenv
 import subprocess
 import json
+from concurrent.futures import Future, ThreadPoolExecutor
+from tts_cache import TTSCache
+from tts_pool import LocalTTSPool, split_sentences
+from voice_activity import decode_wav, trim_silence
+from whisper_models import WhisperModelManager
 
 load_dotenv()
 
@@ -14,6 +19,7 @@ class VoiceService:
     def __init__(self):
         self._init_speech_recognition()
         self._init_text_to_speech()
+        self.tts_cache = TTSCache()
         print("✅ 免费语音服务初始化完成")
     
     def _init_speech_recognition(self):
@@ -25,10 +31,8 @@ class VoiceService:
             
             # 检查是否安装了Whisper
             try:
-                import whisper
-                # 下载小模型（首次运行会下载）
-                # tiny, base, small
-                self.whisper_model = whisper.load_model("base")
+                # tiny / base / small 多档模型，按需加载（首次使用时下载）
+                self.whisper_models = WhisperModelManager()
                 self.whisper_available = True
                 print("✅ Whisper语音识别已启用（本地模型）")
             except ImportError:
@@ -41,31 +45,51 @@ class VoiceService:
     
     def _init_text_to_speech(self):
         """初始化免费文本转语音"""
-        try:
-            # 方案1: 使用gTTS（Google免费版，有速率限制但可用）
-            from gtts import gTTS
-            self.gtts = gTTS
-            print("✅ gTTS免费TTS已启用")
-            
-            # 方案2: 本地TTS备选（需要安装额外的包）
-            self.local_tts_available = False
+        self.gtts = None
+        self.local_tts_available = False
+        self.local_tts_pool = None
+        # gTTS 串行提交（有速率限制），但可以与 LLM 生成并行
+        self._tts_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts")
+        
+        # 引擎优先级：auto = gTTS 优先、本地兜底；local = 仅本地（离线节点）；gtts = 仅 gTTS
+        engine_setting = os.getenv('TTS_ENGINE', 'auto').lower()
+        self.tts_engines = {
+            'local': ['pyttsx3'],
+            'gtts': ['gtts'],
+        }.get(engine_setting, ['gtts', 'pyttsx3'])
+        
+        # 方案1: 使用gTTS（Google免费版，有速率限制但可用）
+        if 'gtts' in self.tts_engines:
+            try:
+                from gtts import gTTS
+                self.gtts = gTTS
+                print("✅ gTTS免费TTS已启用")
+            except Exception as e:
+                print(f"❌ gTTS初始化失败: {e}")
+        
+        # 方案2: 本地TTS（长期存活的单个引擎，适用于无网络的节点）
+        if 'pyttsx3' in self.tts_engines:
             try:
-                # 尝试导入本地TTS库
                 import pyttsx3
                 self.pyttsx3 = pyttsx3
+                self.local_tts_pool = LocalTTSPool(pyttsx3)
                 self.local_tts_available = True
                 print("✅ 本地TTS备用方案已准备")
             except ImportError:
-                print("⚠️  本地TTS未安装，仅使用gTTS")
-                
-        except Exception as e:
-            print(f"❌ TTS初始化失败: {e}")
-            self.gtts = None
+                print("⚠️  本地TTS未安装")
     
-    def transcribe_audio(self, audio_data: bytes, language: str = 'en-US', audio_format: str = 'wav') -> Optional[str]:
+    def transcribe_audio(self, audio_data: bytes, language: Optional[str] = None, audio_format: str = 'wav',
+                         accuracy: Optional[str] = None) -> Optional[str]:
+        """
+        语音转文字
 
-    
-    # 验证音频数据
+        Args:
+            audio_data: 音频字节数据
+            language: 语言提示（如 en-US），为空时自动检测语言
+            audio_format: 音频格式
+            accuracy: 精度档位 fast / balanced / accurate，为空时使用默认档位
+        """
+        # 验证音频数据
         if not audio_data or len(audio_data) == 0:
             print("❌ 音频数据为空")
             return "音频数据为空，请重新录制"
@@ -79,29 +103,23 @@ class VoiceService:
         # 方案1: 使用本地Whisper模型
         if self.whisper_available:
             try:
-                # 保存音频为临时文件
-                with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp_file:
-                    tmp_file.write(audio_data)
-                    tmp_file_path = tmp_file.name
+                # 解码为 16kHz 单声道采样，先做 VAD 再送入模型
+                samples = self._load_audio_samples(audio_data)
+                speech, vad_stats = trim_silence(samples)
                 
-                print(f"✅ 音频已保存到临时文件: {tmp_file_path}")
+                if speech is None:
+                    print(f"🔇 未检测到语音（时长 {vad_stats['duration_s']} 秒），跳过转录")
+                    return "未能识别到有效语音"
                 
-                # 使用Whisper转录
-                import whisper
-                whisper_lang = "en" if language.startswith("en") else "zh"
-                print(f"🎯 Whisper使用语言: {whisper_lang}")
-
-                result = self.whisper_model.transcribe(
-                    tmp_file_path, 
-                    language=whisper_lang,
-                    fp16=False  # 禁用FP16，避免CPU警告
-                )
-                text = result["text"].strip()
+                if vad_stats["trimmed_s"] > 0:
+                    print(f"✂️ VAD 裁剪静音 {vad_stats['trimmed_s']} 秒"
+                          f"（原始 {vad_stats['duration_s']} 秒，语音 {vad_stats['speech_s']} 秒）")
                 
-                print(f"✅ Whisper识别结果: {text}")
+                # 使用Whisper转录（按时长/负载/精度选择模型档位）
+                result = self.whisper_models.transcribe(speech, language=language, accuracy=accuracy)
+                text = result["text"]
                 
-                # 清理临时文件
-                os.unlink(tmp_file_path)
+                print(f"✅ Whisper识别结果（{result['tier']}，语言 {result['language']}）: {text}")
                 
                 if not text:
                     return "未能识别到有效语音"
@@ -110,12 +128,6 @@ class VoiceService:
                 
             except Exception as e:
                 print(f"❌ Whisper转录失败: {e}")
-                # 清理临时文件
-                if 'tmp_file_path' in locals():
-                    try:
-                        os.unlink(tmp_file_path)
-                    except:
-                        pass
                 # 降级到方案2
         
         # 方案2: 使用开源语音识别库SpeechRecognition（调用Google免费API）
@@ -133,7 +145,7 @@ class VoiceService:
             with sr.AudioFile(tmp_file_path) as source:
                 audio = recognizer.record(source)
                 # 使用Google Web Speech API（免费但有速率限制）
-                text = recognizer.recognize_google(audio, language=language)
+                text = recognizer.recognize_google(audio, language=language or 'en-US')
             
             os.unlink(tmp_file_path)
             return text
@@ -148,56 +160,136 @@ class VoiceService:
             print(f"❌ 语音识别错误: {e}")
             return None
     
+    def _load_audio_samples(self, audio_data: bytes):
+        """解码音频为 16kHz float32 采样：PCM WAV 直接解析，其他格式交给 Whisper（ffmpeg）"""
+        samples = decode_wav(audio_data)
+        if samples is not None:
+            return samples
+        
+        import whisper
+        with tempfile.NamedTemporaryFile(suffix='.audio', delete=False) as tmp_file:
+            tmp_file.write(audio_data)
+            tmp_file_path = tmp_file.name
+        try:
+            return whisper.load_audio(tmp_file_path)
+        finally:
+            os.unlink(tmp_file_path)
+    
     def text_to_speech(self, text: str, language: str = 'en') -> Optional[bytes]:
-        """将文本转换为语音 - 免费版本"""
+        """将文本转换为语音 - 免费版本（命中缓存时不再合成）"""
+        if not self.gtts and not self.local_tts_available:
+            return None
+        
+        cached = self._cached_speech(text, language)
+        if cached:
+            return cached
+        
+        for engine in self.tts_engines:
+            if engine == 'gtts':
+                audio_bytes = self._synthesize_gtts(text, language)
+            else:
+                audio_bytes = self._synthesize_local(text)
+            if audio_bytes:
+                self.tts_cache.put(text, language, engine, audio_bytes)
+                return audio_bytes
+        return None
+    
+    def stream_speech(self, text: str, language: str = 'en') -> Iterator[bytes]:
+        """
+        按句子流式合成语音
+
+        本地引擎优先时，所有未缓存的句子一次性提交到本地引擎的队列（按顺序串行合成），
+        按原顺序逐句产出，首句合成完成即可发送给客户端。
+        """
+        if not self.gtts and not self.local_tts_available:
+            return
+        
+        queued_local = self.tts_engines[0] == 'pyttsx3' and self.local_tts_pool is not None
+        
+        pending = []
+        for sentence in split_sentences(text):
+            cached = self._cached_speech(sentence, language)
+            if cached:
+                pending.append((sentence, cached))
+            elif queued_local:
+                pending.append((sentence, self.local_tts_pool.submit(sentence)))
+            else:
+                pending.append((sentence, None))
+        
+        for sentence, item in pending:
+            if isinstance(item, bytes):
+                yield item
+                continue
+            if item is None:
+                audio_bytes = self.text_to_speech(sentence, language)
+            else:
+                audio_bytes = item.result()
+                if audio_bytes:
+                    self.tts_cache.put(sentence, language, 'pyttsx3', audio_bytes)
+            if audio_bytes:
+                yield audio_bytes
+    
+    def submit_speech(self, text: str, language: str = 'en') -> Future:
+        """提交一句话的合成任务并立即返回 Future；命中缓存时 Future 已完成"""
+        cached = self._cached_speech(text, language)
+        if cached:
+            future = Future()
+            future.set_result(cached)
+            return future
+        
+        if self.tts_engines[0] == 'pyttsx3' and self.local_tts_pool is not None:
+            future = self.local_tts_pool.submit(text)
+            
+            def _store(done: Future):
+                audio_bytes = done.result()
+                if audio_bytes:
+                    self.tts_cache.put(text, language, 'pyttsx3', audio_bytes)
+            
+            future.add_done_callback(_store)
+            return future
+        
+        return self._tts_executor.submit(self.text_to_speech, text, language)
+    
+    def _cached_speech(self, text: str, language: str) -> Optional[bytes]:
+        for engine in self.tts_engines:
+            cached = self.tts_cache.get(text, language, engine)
+            if cached:
+                return cached
+        return None
+    
+    def _synthesize_gtts(self, text: str, language: str) -> Optional[bytes]:
+        """方案1: 使用gTTS（Google免费版），有速率限制，但小型应用够用"""
         if not self.gtts:
             return None
         
         try:
-            # 方案1: 使用gTTS（Google免费版）
-            # gTTS有速率限制，但小型应用够用
             tts = self.gtts(text=text, lang=language, slow=False)
             
-            # 保存到临时文件
-            with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False, delete_on_close=False) as tmp_file:
-                tmp_file_path = tmp_file.name
-                tts.save(tmp_file_path)
-            
-            # 读取文件内容
-            with open(tmp_file_path, 'rb') as f:
-                audio_bytes = f.read()
-            
-            # 清理临时文件
-            os.unlink(tmp_file_path)
-            
-            return audio_bytes
+            # 直接写入内存，无需临时文件
+            buffer = io.BytesIO()
+            tts.write_to_fp(buffer)
+            return buffer.getvalue()
             
         except Exception as e:
             print(f"❌ gTTS生成失败: {e}")
-            
-            # 方案2: 使用本地TTS备用方案
-            if hasattr(self, 'local_tts_available') and self.local_tts_available:
-                try:
-                    engine = self.pyttsx3.init()
-                    
-                    # 保存到临时文件
-                    with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False, delete_on_close=False) as tmp_file:
-                        tmp_file_path = tmp_file.name
-                    
-                    engine.save_to_file(text, tmp_file_path)
-                    engine.runAndWait()
-                    
-                    with open(tmp_file_path, 'rb') as f:
-                        audio_bytes = f.read()
-                    
-                    os.unlink(tmp_file_path)
-                    return audio_bytes
-                    
-                except Exception as tts_error:
-                    print(f"❌ 本地TTS也失败: {tts_error}")
-            
             return None
     
+    def _synthesize_local(self, text: str) -> Optional[bytes]:
+        """方案2: 使用本地TTS引擎"""
+        if not self.local_tts_pool:
+            return None
+        return self.local_tts_pool.synthesize(text)
+    
+    def warm_tts_cache(self, texts, language: str = 'en'):
+        """预先合成固定回复，之后重复回答无需再次合成"""
+        synthesized = 0
+        for text in texts:
+            if self._cached_speech(text, language):
+                continue
+            if self.text_to_speech(text, language):
+                synthesized += 1
+        print(f"✅ TTS 缓存预热完成：新合成 {synthesized} 条，共 {len(texts)} 条")
+    
     def get_supported_languages(self) -> list:
         """获取支持的语言列表"""
         return [
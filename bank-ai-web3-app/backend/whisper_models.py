@@ -0,0 +1,147 @@
+# backend/whisper_models.py
+import os
+import threading
+from typing import Dict, Optional
+
+# 从快到准排列
+TIER_ORDER = ['tiny', 'base', 'small', 'medium', 'large']
+
+# 请求可指定的精度档位 -> 首选模型
+ACCURACY_TIERS = {
+    'fast': 'tiny',
+    'balanced': 'base',
+    'accurate': 'small',
+}
+
+
+def normalize_language(language: Optional[str]) -> Optional[str]:
+    """'en-US' -> 'en'，'zh-CN' -> 'zh'；None / 'auto' 表示自动检测"""
+    if not language or language.lower() == 'auto':
+        return None
+    return language.split('-')[0].lower()
+
+
+class WhisperModelManager:
+    """
+    Whisper 多档模型管理
+
+    - 模型按需懒加载，CPU 上可选 int8 动态量化
+    - 按音频时长、当前并发数和请求的精度选择档位
+    - 负载过高时降级到更快的档位，而不是排队等待
+    """
+
+    def __init__(self):
+        import whisper
+        self.whisper = whisper
+
+        tiers = os.getenv('WHISPER_TIERS', 'tiny,base,small')
+        self.tiers = [t.strip() for t in tiers.split(',') if t.strip() in TIER_ORDER]
+        self.tiers.sort(key=TIER_ORDER.index)
+        if not self.tiers:
+            self.tiers = ['base']
+
+        self.default_tier = os.getenv('WHISPER_DEFAULT_TIER', 'base')
+        if self.default_tier not in self.tiers:
+            self.default_tier = self.tiers[len(self.tiers) // 2]
+
+        self.quantize = os.getenv('WHISPER_QUANTIZE', 'true').lower() == 'true'
+        # 超过该时长的音频降一档
+        self.long_clip_seconds = float(os.getenv('WHISPER_LONG_CLIP_SECONDS', 30))
+        # 同时进行的转录数达到该值时直接使用最快档位
+        self.busy_threshold = int(os.getenv('WHISPER_BUSY_THRESHOLD', 2))
+
+        self._models: Dict[str, object] = {}
+        self._load_locks = {tier: threading.Lock() for tier in self.tiers}
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+
+        print(f"✅ Whisper 模型档位: {', '.join(self.tiers)}（默认 {self.default_tier}，"
+              f"{'int8 量化' if self.quantize else 'fp32'}，按需加载）")
+
+    def get_model(self, tier: str):
+        model = self._models.get(tier)
+        if model is not None:
+            return model
+
+        with self._load_locks[tier]:
+            model = self._models.get(tier)
+            if model is None:
+                print(f"⏳ 加载 Whisper 模型: {tier}")
+                model = self.whisper.load_model(tier, device='cpu')
+                if self.quantize:
+                    model = self._quantize(model)
+                self._models[tier] = model
+        return model
+
+    def _quantize(self, model):
+        """对 Linear 层做 int8 动态量化（仅 CPU 推理）"""
+        try:
+            import torch
+            # whisper 的 Linear 是 nn.Linear 的子类，量化映射只认精确类型
+            for module in model.modules():
+                if isinstance(module, torch.nn.Linear):
+                    module.__class__ = torch.nn.Linear
+            return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        except Exception as e:
+            print(f"⚠️ Whisper 量化失败，使用 fp32 模型: {e}")
+            return model
+
+    def select_tier(self, duration_s: float, accuracy: Optional[str] = None) -> str:
+        """按精度要求、音频时长和当前负载选择档位"""
+        preferred = ACCURACY_TIERS.get(accuracy or '', self.default_tier)
+        if preferred not in self.tiers:
+            # 取不超过首选档位的最大可用档位
+            candidates = [t for t in self.tiers if TIER_ORDER.index(t) <= TIER_ORDER.index(preferred)]
+            preferred = candidates[-1] if candidates else self.tiers[0]
+
+        index = self.tiers.index(preferred)
+        if duration_s > self.long_clip_seconds and accuracy != 'accurate':
+            index = max(0, index - 1)
+
+        with self._in_flight_lock:
+            busy = self._in_flight >= self.busy_threshold
+        if busy:
+            index = 0
+
+        return self.tiers[index]
+
+    def transcribe(self, samples, language: Optional[str] = None, accuracy: Optional[str] = None) -> Dict:
+        """
+        转录 16kHz float32 采样
+
+        Args:
+            samples: 音频采样
+            language: 语言提示（如 en-US），为空时自动检测
+            accuracy: fast / balanced / accurate
+        """
+        duration_s = len(samples) / 16000.0
+        tier = self.select_tier(duration_s, accuracy)
+        model = self.get_model(tier)
+        whisper_lang = normalize_language(language)
+
+        with self._in_flight_lock:
+            self._in_flight += 1
+        try:
+            # 指定语言时 Whisper 跳过语言检测
+            result = model.transcribe(samples, language=whisper_lang, fp16=False)
+        finally:
+            with self._in_flight_lock:
+                self._in_flight -= 1
+
+        return {
+            "text": result.get("text", "").strip(),
+            "language": result.get("language", whisper_lang),
+            "tier": tier,
+            "duration_s": round(duration_s, 3)
+        }
+
+    def stats(self) -> Dict:
+        with self._in_flight_lock:
+            in_flight = self._in_flight
+        return {
+            "tiers": self.tiers,
+            "loaded": list(self._models.keys()),
+            "default_tier": self.default_tier,
+            "quantized": self.quantize,
+            "in_flight": in_flight
+        }
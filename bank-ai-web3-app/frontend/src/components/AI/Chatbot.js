@@ -22,6 +22,8 @@ const Chatbot = () => {
   const fileInputRef = useRef(null);
   const mediaRecorderRef = useRef(null);
   const audioChunksRef = useRef([]);
+  // 登录用户的对话保存为会话，后续消息带上 session_id 以延续上下文
+  const sessionIdRef = useRef(null);
 
   // automatically roll to the bottom
   useEffect(() => {
@@ -209,10 +211,12 @@ const Chatbot = () => {
       // 使用api.js的统一API调用
       const response = await aiAPI.chat({ 
         message: inputMessage.trim(),
-        user_id: localStorage.getItem('user_id') || 'guest'
+        user_id: localStorage.getItem('user_id') || 'guest',
+        session_id: sessionIdRef.current || undefined
       });
 
       const data = response.data;
+      if (data.session_id) sessionIdRef.current = data.session_id;
       
       const assistantMessage = {
         role: 'assistant',
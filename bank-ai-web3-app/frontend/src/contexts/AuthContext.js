@@ -38,6 +38,7 @@ export function AuthProvider({ children }) {
 
       // 保存到 localStorage
       localStorage.setItem('access_token', data.token);
+      localStorage.setItem('refresh_token', data.refresh_token);
       localStorage.setItem('user', JSON.stringify(data.user));
       
       // 更新状态
@@ -74,7 +75,10 @@ export function AuthProvider({ children }) {
   };
 
   const logout = () => {
+    // 通知后端吊销令牌，失败不影响本地登出
+    authAPI.logout().catch(() => {});
     localStorage.removeItem('access_token');
+    localStorage.removeItem('refresh_token');
     localStorage.removeItem('user');
     setUser(null);
   };
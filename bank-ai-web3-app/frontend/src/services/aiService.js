@@ -7,7 +7,7 @@ class AIService {
 
   async chat(message) {
     try {
-      const response = await aiAPI.chat(message);
+      const response = await aiAPI.chat({ session_id: this.sessionId || undefined, ...message });
       if (response.data.session_id) {
         localStorage.setItem('ai_session_id', response.data.session_id);
         this.sessionId = response.data.session_id;
@@ -54,18 +54,18 @@ class AIService {
     }
   }
 
-  async getChatSessions() {
+  async getChatSessions(cursor = null) {
     try {
-      const response = await aiAPI.getChatSessions();
+      const response = await aiAPI.getChatSessions(cursor);
       return response.data;
     } catch (error) {
       throw error;
     }
   }
 
-  async getChatMessages(sessionId) {
+  async getChatMessages(sessionId, cursor = null) {
     try {
-      const response = await aiAPI.getChatMessages(sessionId);
+      const response = await aiAPI.getChatMessages(sessionId, cursor);
       return response.data;
     } catch (error) {
       throw error;
@@ -30,20 +30,61 @@ api.interceptors.request.use(
   }
 );
 
+// 访问令牌过期时用刷新令牌换新令牌；并发的 401 共用同一次刷新
+let refreshPromise = null;
+const refreshAccessToken = () => {
+  if (!refreshPromise) {
+    const refreshToken = localStorage.getItem('refresh_token');
+    refreshPromise = axios
+      .post(`${API_BASE_URL}/api/auth/refresh`, { refresh_token: refreshToken })
+      .then(({ data }) => {
+        localStorage.setItem('access_token', data.token);
+        localStorage.setItem('refresh_token', data.refresh_token);
+        return data.token;
+      })
+      .finally(() => {
+        refreshPromise = null;
+      });
+  }
+  return refreshPromise;
+};
+
+// 记账请求的幂等键：同一笔操作重试（包括刷新令牌后的重放）时沿用同一个键，后端只记一次账
+const withIdempotencyKey = (data) => ({
+  headers: {
+    'Idempotency-Key': data.idempotencyKey
+      || (window.crypto?.randomUUID ? window.crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`),
+  },
+});
+
 // 响应拦截器：统一错误处理
 api.interceptors.response.use(
   (response) => response,
-  (error) => {
+  async (error) => {
     if (!error.response) {
       toast.error('无法连接到服务器，请检查：1.后端是否启动 2.请求地址是否是外网转发地址');
       return Promise.reject(error);
     }
 
     const { status, data } = error.response;
+    const original = error.config;
+    if (status === 401 && !original._retry && localStorage.getItem('refresh_token')
+        && !original.url.startsWith('/api/auth/')) {
+      original._retry = true;
+      try {
+        const token = await refreshAccessToken();
+        original.headers.Authorization = `Bearer ${token}`;
+        return api(original);
+      } catch (refreshError) {
+        // 刷新失败：按登录过期处理
+      }
+    }
+
     switch (status) {
       case 401:
         if (window.location.pathname !== '/login') {
           localStorage.removeItem('access_token');
+          localStorage.removeItem('refresh_token');
           localStorage.removeItem('user');
           toast.error('登录过期，请重新登录');
           window.location.href = '/login';
@@ -70,7 +111,12 @@ export const authAPI = {
   login: (credentials) => api.post('/api/auth/login', credentials),
   register: (userData) => api.post('/api/auth/register', userData),
   validateToken: () => api.get('/api/validate-token'),
-  logout: () => api.post('/api/auth/logout')
+  // 令牌在调用时读取，调用方随后即可清理本地存储
+  logout: () => api.post(
+    '/api/auth/logout',
+    { refresh_token: localStorage.getItem('refresh_token') },
+    { headers: { Authorization: `Bearer ${localStorage.getItem('access_token')}` } }
+  )
 };
 // -------------------------- 账户API --------------------------
 export const accountAPI = {
@@ -104,25 +150,39 @@ export const transactionAPI = {
     if (!fromAccountId || !toAccountId || !amount) {
       throw new Error('fromAccountId, toAccountId and amount are required for transfer');
     }
-    return api.post('/api/transfers', transferData);
+    return api.post('/api/transfers', transferData, withIdempotencyKey(transferData));
   },
-  // 获取交易列表（支持分页）
-  getTransactions: (limit = 50, offset = 0) => 
-    api.get('/api/transactions', { params: { limit, offset } }),
+  // 获取交易列表（游标分页：cursor 传上一页返回的 next_cursor）
+  getTransactions: (limit = 50, cursor = null, accountId = null) =>
+    api.get('/api/transactions', { params: { limit, cursor, accountId } }),
+  // 服务端搜索：q、accountId、minAmount、maxAmount、dateFrom、dateTo、limit、cursor
+  searchTransactions: (params) => api.get('/api/transactions/search', { params }),
   // 存款
   deposit: (depositData) => {
     if (!depositData?.accountId || !depositData?.amount) {
       throw new Error('accountId and amount are required for deposit');
     }
-    return api.post('/api/transactions/deposit', depositData);
+    return api.post('/api/transactions/deposit', depositData, withIdempotencyKey(depositData));
   },
   // 取款
   withdraw: (withdrawData) => {
     if (!withdrawData?.accountId || !withdrawData?.amount) {
       throw new Error('accountId and amount are required for withdraw');
     }
-    return api.post('/api/transactions/withdraw', withdrawData);
-  }
+    return api.post('/api/transactions/withdraw', withdrawData, withIdempotencyKey(withdrawData));
+  },
+  // 导入对账单（CSV/OFX），返回 job_id，用 getImportStatus 轮询进度和结果
+  importStatement: (accountId, file, format = null) => {
+    if (!accountId || !file) throw new Error('accountId and file are required for statement import');
+    const formData = new FormData();
+    formData.append('file', file);
+    if (format) formData.append('format', format);
+    return api.post(`/api/accounts/${accountId}/import`, formData, {
+      headers: { 'Content-Type': 'multipart/form-data' }
+    });
+  },
+  // 查询导入任务（仅限本人）；wait 为长轮询秒数
+  getImportStatus: (jobId, wait = 0) => api.get(`/api/imports/${jobId}`, { params: { wait } })
 };
 
 // -------------------------- AI API --------------------------
@@ -152,7 +212,8 @@ export const aiAPI = {
     }
     return api.post('/api/ai/chat', {
       message: message.message,
-      user_id: message.user_id || 'guest'
+      user_id: message.user_id || 'guest',
+      session_id: message.session_id
     });
   },
   // AI语音聊天
@@ -201,13 +262,13 @@ export const aiAPI = {
     }
     return api.post('/api/ai/categorize', { transactions });
   },
-  // 获取聊天会话
-  getChatSessions: () => 
-    api.get('/api/chatbot/sessions'),
-  // 获取会话消息
-  getChatMessages: (sessionId) => {
+  // 获取聊天会话（游标分页：cursor 传上一页返回的 next_cursor）
+  getChatSessions: (cursor = null) =>
+    api.get('/api/chatbot/sessions', { params: { cursor } }),
+  // 获取会话消息：默认最近一页，cursor 继续加载更早的消息
+  getChatMessages: (sessionId, cursor = null) => {
     if (!sessionId) throw new Error('sessionId is required');
-    return api.get(`/api/chatbot/session/${sessionId}/messages`);
+    return api.get(`/api/chatbot/session/${sessionId}/messages`, { params: { cursor } });
   },
   // 提交反馈
   submitFeedback: (interactionId, rating, comment) => {
@@ -222,6 +283,18 @@ export const aiAPI = {
   }
 };
 
+// -------------------------- 汇率API --------------------------
+export const ratesAPI = {
+  // 汇率与利率数据：base 为基准币种，symbols 为币种数组（默认全部）
+  getRates: (base = null, symbols = null) =>
+    api.get('/api/rates', { params: { base, symbols: symbols ? symbols.join(',') : undefined } }),
+  // 币种换算
+  convert: (from, to, amount = 1) => {
+    if (!from || !to) throw new Error('from and to are required for conversion');
+    return api.get('/api/rates/convert', { params: { from, to, amount } });
+  }
+};
+
 // -------------------------- 仪表盘API --------------------------
 export const dashboardAPI = {
   // 获取仪表盘核心数据